@@ -0,0 +1,195 @@
+# local read-only http api serving the latest data and analysis as json
+# responses are rendered once per data version and served from memory with etags
+# Copyright Michael Kukar 2020. MIT License.
+
+import json, sqlite3, threading, hashlib, bisect
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from datetime import datetime
+
+import data_cache
+from entry_record import EntryRecord
+
+class ApiServer:
+
+    HISTORY_QUERY = "SELECT DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS from DATA ORDER BY DAY ASC"
+    ENTRY_FIELDS = list(EntryRecord._fields)
+
+    # number of distinct history ranges to keep rendered
+    HISTORY_CACHE_SIZE = 32
+
+
+    # dbFilename      : sqlite database file
+    # dataAnalyzer    : DataAnalyzer used for the analysis endpoint
+    # host            : (optional) interface to listen on
+    # port            : (optional) port to listen on, 0 picks a free port
+    # metricsProvider : (optional) function returning a dict of runtime metrics for /metrics
+    # regionAnalyzer  : (optional) RegionAnalyzer comparing regions for /regions
+    def __init__(self, dbFilename, dataAnalyzer, host='127.0.0.1', port=8080, metricsProvider=None, regionAnalyzer=None):
+        self.dbFilename = dbFilename
+        self.da = dataAnalyzer
+        self.metricsProvider = metricsProvider
+        self.regionAnalyzer = regionAnalyzer
+        # (comparison, response) of the last /regions request, rendered again only when the comparison changes
+        self.regionsResponse = (None, None)
+        self.host = host
+        self.port = port
+        self.httpServer = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.cacheVersion = None
+        # (data version, history entries, their dates) swapped as one, so a request never mixes two refreshes
+        self.historySnapshot = (None, [], [])
+        self.resources = {}
+        self.historyCache = data_cache.LRUCache(self.HISTORY_CACHE_SIZE)
+
+
+    # renders an object into a cached (body, etag) response
+    # data   : json serializable object
+    # return : (bytes body, etag string) tuple
+    @staticmethod
+    def renderResponse(data):
+        body = json.dumps(data).encode('utf-8')
+        return body, '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+    # rebuilds every cached response from the database
+    # NOTE - only runs when the data version has moved since the last refresh
+    # force  : (optional) always refreshes
+    # return : None
+    def refreshCache(self, force=False):
+        version = data_cache.getDataVersion(self.dbFilename)
+        if not force and version == self.cacheVersion:
+            return
+        with self.lock:
+            if not force and version == self.cacheVersion:
+                return
+            conn = sqlite3.connect(self.dbFilename)
+            c = conn.cursor()
+            c.row_factory = EntryRecord.fromRow
+            history = [record.toDict() for record in c.execute(self.HISTORY_QUERY)]
+            conn.close()
+            self.resources = {
+                '/latest' : self.renderResponse(history[-1] if len(history) > 0 else None),
+                '/analysis' : self.renderResponse({
+                    'statistics' : self.da.computeStatistics() if len(history) > 0 else None,
+                    'facts' : self.da.getRankedFacts() if len(history) > 0 else []
+                })
+            }
+            self.historySnapshot = (version, history, [entry['date'] for entry in history])
+            self.historyCache.clear()
+            self.cacheVersion = version
+
+
+    # gets the history between two dates (inclusive) from memory
+    # start  : (optional) YYYY-MM-DD start date string
+    # end    : (optional) YYYY-MM-DD end date string
+    # return : (bytes body, etag string) tuple
+    def getHistoryResponse(self, start=None, end=None):
+        # read once, a refresh on another thread replaces the snapshot instead of changing it
+        version, history, historyDates = self.historySnapshot
+        key = (version, start, end)
+        found, response = self.historyCache.get(key)
+        if found:
+            return response
+        startIdx = 0 if start is None else bisect.bisect_left(historyDates, start)
+        endIdx = len(historyDates) if end is None else bisect.bisect_right(historyDates, end)
+        response = self.renderResponse({'data' : history[startIdx:endIdx]})
+        self.historyCache.put(key, response)
+        return response
+
+
+    # handles a GET request for a path
+    # path   : request path including query string
+    # return : (status code, bytes body, etag string or None) tuple
+    def getResource(self, path):
+        self.refreshCache()
+        url = urlsplit(path)
+        if url.path in self.resources:
+            body, etag = self.resources[url.path]
+            return 200, body, etag
+        if url.path == '/metrics' and self.metricsProvider is not None:
+            # changes constantly, so it is rendered on every request and never cached
+            return 200, self.renderResponse(self.metricsProvider())[0], None
+        if url.path == '/regions' and self.regionAnalyzer is not None:
+            # other regions' databases change without this one, so their versions are checked on every request
+            comparison = self.regionAnalyzer.getComparison()
+            cachedComparison, response = self.regionsResponse
+            if comparison is not cachedComparison:
+                response = self.renderResponse(comparison)
+                self.regionsResponse = (comparison, response)
+            body, etag = response
+            return 200, body, etag
+        if url.path == '/history':
+            query = parse_qs(url.query)
+            dates = []
+            for field in ['start', 'end']:
+                value = query.get(field, [None])[0]
+                if value is not None:
+                    try:
+                        # makes sure date is valid and in YYYY-MM-DD format
+                        value = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+                    except ValueError:
+                        return 400, self.renderResponse({'error' : 'invalid ' + field + ' date, use YYYY-MM-DD'})[0], None
+                dates.append(value)
+            body, etag = self.getHistoryResponse(dates[0], dates[1])
+            return 200, body, etag
+        return 404, self.renderResponse({'error' : 'not found'})[0], None
+
+
+    # starts serving requests on a background thread
+    # return : true on success, false on error
+    def start(self):
+        try:
+            self.refreshCache(force=True)
+            self.httpServer = ThreadingHTTPServer((self.host, self.port), ApiRequestHandler)
+        except Exception as e:
+            return False
+        self.httpServer.daemon_threads = True
+        self.httpServer.api = self
+        # port is resolved when 0 was requested
+        self.port = self.httpServer.server_address[1]
+        self.thread = threading.Thread(target=self.httpServer.serve_forever, daemon=True)
+        self.thread.start()
+        return True
+
+
+    # stops serving requests
+    # return : None
+    def stop(self):
+        if self.httpServer is not None:
+            self.httpServer.shutdown()
+            self.httpServer.server_close()
+            self.httpServer = None
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+
+    # keeps connections alive between dashboard polls
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        try:
+            status, body, etag = self.server.api.getResource(self.path)
+        except Exception as e:
+            status, body, etag = 500, ApiServer.renderResponse({'error' : 'internal error'})[0], None
+        # client already has this version
+        if etag is not None and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    # silences the per-request log line
+    def log_message(self, format, *args):
+        pass
@@ -2,30 +2,129 @@
 # Sends updates and analysis on current state of COVID-19 in San Diego 
 # Copyright Michael Kukar 2020. MIT License.
 
-import sys, os, json, threading, argparse, time
+import sys, os, json, threading, argparse, time, sqlite3
+from datetime import datetime
 
+import data_cache
+# NOTE - the page parser (bs4/lxml), http (requests) and smtp stacks are imported by the
+#        modules below only when first used, so --help and --check start quickly
 from web_reader import WebReader
-from email_texter import EmailTexter
+from email_texter import EmailTexter, SendScheduler
 from data_analyzer import DataAnalyzer
+from data_snapshot import DataSnapshot
+from poll_scheduler import PollScheduler
+from event_bus import EventBus
+from notification_channels import createChannel, isValidChannelConfig
+from data_sources import createSource, isValidSourceConfig
+from entry_record import EntryRecord
+from subscriber_store import SubscriberStore
+from page_archive import PageArchive
+from resource_monitor import ResourceMonitor
+from region_analyzer import RegionAnalyzer
+from message_templates import MessageTemplates
 
 class Covid19Updater:
 
     configData = {}
     phoneNumberEmails = []
+    channels = []
+    scheduler = None
+
+    # used when the config file does not list any channels
+    DEFAULT_CHANNELS = [{'type' : 'smtp'}]
+
+    # digest subscriptions and how many days each one covers
+    DIGEST_DAYS = {
+        'daily' : 1,
+        'weekly' : 7
+    }
+    # seconds between resource samples in the log, 0 turns them off
+    DEFAULT_TELEMETRY_SECS = 3600
+
+    # local hour digests go out at, and the weekday (monday is 0) of weekly digests
+    DEFAULT_DIGEST_HOUR = 18
+    WEEKLY_DIGEST_WEEKDAY = 6
 
     # constructor
     # sets up objects and reads config file
+    # NOTE - with several shards, only shard 0 fetches the page, the others follow the database
     # configFile : json configuration file
     # dbFile     : sqlite database file
-    def __init__(self, configFile, dbFile):
-        self.wr = WebReader(dbFile)
+    # shard      : (optional) (index, count) tuple, keeps only every count-th subscriber starting at index
+    def __init__(self, configFile, dbFile, shard=(0, 1)):
+        self.dbFile = dbFile
+        self.shardIndex, self.shardCount = shard
+        self.follower = self.shardIndex != 0
+        # databases made by older versions store dates only as strings
+        WebReader.migrateDatabase(dbFile)
+        self.snapshotFile = DataSnapshot.getDefaultFilename(dbFile)
+        # rebuilds the snapshot only if the database changed since it was written
+        if DataSnapshot.isStale(dbFile, self.snapshotFile):
+            DataSnapshot.writeFromDatabase(dbFile, self.snapshotFile)
+        self.bus = EventBus()
+        self.wr = WebReader(dbFile, eventBus=self.bus)
         self.et = EmailTexter()
-        self.da = DataAnalyzer(dbFile)
         if not self.parseConfig(configFile):
             # fail construction as the config is invalid
             raise Exception("Invalid config file") 
+        self.da = DataAnalyzer(dbFile, snapshotFilename=self.snapshotFile, **DataAnalyzer.getConfigArguments(self.configData.get('analysis', {})))
+        for warning in self.getDatabaseWarnings(dbFile):
+            print("WARNING: " + warning)
+        self.configData['phone_credentials'] = self.configData['phone_credentials'][self.shardIndex::self.shardCount]
+        # recipients without a digest get every update, the rest are grouped by digest
+        self.phoneNumberEmails = []
+        self.digestEmails = {digest: [] for digest in self.DIGEST_DAYS}
         for phoneData in self.configData["phone_credentials"]:
-            self.phoneNumberEmails.append(self.et.getPhoneNumberEmailAddress(phoneData['number'], phoneData['carrier']))
+            email = self.et.getPhoneNumberEmailAddress(phoneData['number'], phoneData['carrier'])
+            if phoneData.get('digest') is None:
+                self.phoneNumberEmails.append(email)
+            elif email is not None:
+                self.digestEmails[phoneData['digest']].append(email)
+        # subscribers in the database are read a page at a time on each send, so they can be
+        # changed without editing the config or restarting
+        SubscriberStore.createTable(dbFile)
+        self.subscribers = SubscriberStore(dbFile, region=self.configData.get('region', SubscriberStore.DEFAULT_REGION), shard=shard,
+            pageSize=self.configData.get('subscriber_page_size', SubscriberStore.DEFAULT_PAGE_SIZE))
+        self.maxMessageLengths = self.configData.get('max_message_lengths')
+        # compiled once, rendered for each recipient profile on every send
+        self.templates = MessageTemplates(self.configData.get('message_templates'), self.configData.get('recipient_profiles'))
+        # paces sends so carrier gateways do not throttle or drop bursts
+        rateLimits = self.configData.get('rate_limits', {})
+        # every shard sends through the same accounts and gateways, so they split the limits
+        self.et.sendScheduler = SendScheduler(domainLimits=rateLimits.get('domains'), senderLimit=rateLimits.get('sender'), shares=self.shardCount)
+        # revisions arriving within this many seconds of each other are sent once
+        self.debounceSecs = self.configData.get('debounce_secs', 0)
+        self.pendingUpdate = None
+        # entry the pending update sends, None once it was sent
+        self.pendingEntry = None
+        self.pendingUpdateLock = threading.Lock()
+        self.digestHour = self.configData.get('digest_hour', self.DEFAULT_DIGEST_HOUR)
+        # dates digests were last sent on are kept in the database, so restarts neither skip nor repeat them
+        self.lastDigestDates = self.subscribers.readDigestDates()
+        # reads the region's feed instead of scraping the status page if one is configured
+        if 'source' in self.configData:
+            self.wr.source = createSource(self.configData['source'])
+        # keeps every distinct page fetched so it can be parsed again (see initialize_db_file.py --reparse)
+        if self.configData.get('archive_pages', True):
+            self.wr.archive = PageArchive(PageArchive.getDefaultDirectory(dbFile))
+        self.channels = []
+        for channelConfig in self.configData.get('channels', self.DEFAULT_CHANNELS):
+            self.channels.append(createChannel(channelConfig, self.et, self.configData['email_credentials']))
+        # latest entry a follower has seen, so entries already stored are not sent again
+        self.followedEntry = None
+        if self.follower:
+            self.followedEntry = self.wr.getLatestEntry()
+        # logs memory, file descriptors, threads and gc stats once started, see startTelemetry()
+        self.monitor = ResourceMonitor(intervalSecs=self.configData.get('telemetry_secs', self.DEFAULT_TELEMETRY_SECS))
+        # compares this region against the other regions' databases, if any are configured
+        self.regionAnalyzer = None
+        if len(self.configData.get('compare_regions', {})) > 0:
+            regions = dict(self.configData['compare_regions'])
+            regions[self.subscribers.region] = dbFile
+            self.regionAnalyzer = RegionAnalyzer(regions, rollingDays=self.da.rollingDays)
+        # everything that reacts to a new entry runs off the poll loop
+        self.bus.subscribe(EventBus.ENTRY_ADDED, self.queueUpdate, name='notifier')
+        self.bus.subscribe(EventBus.ENTRY_ADDED, self.refreshSnapshot, name='snapshot_writer')
 
 
     # reads json config file into configData dict
@@ -37,104 +136,478 @@ class Covid19Updater:
                 self.configData = json.load(f)
         except:
             return False
-        # ensures all required aspects of the file are present
-        if 'phone_credentials' not in self.configData.keys():
-            return False
-        if 'email_credentials' not in self.configData.keys():
-            return False
+        return len(self.getConfigProblems(self.configData)) == 0
+
+
+    # checks all required aspects of the config are present
+    # configData : dict of the json config file
+    # return     : list of problem strings, empty if the config is valid
+    @classmethod
+    def getConfigProblems(cls, configData):
+        problems = []
+        for req_section in ['phone_credentials', 'email_credentials']:
+            if req_section not in configData.keys():
+                problems.append("missing " + req_section)
+        if len(problems) > 0:
+            return problems
         phone_credentials_req_fields = ['number', 'carrier']
         email_credentials_req_fields = ['user', 'pass', 'url']
-        for phoneData in self.configData['phone_credentials']:
+        for idx, phoneData in enumerate(configData['phone_credentials']):
             for req_field in phone_credentials_req_fields:
                 if req_field not in phoneData.keys():
-                    return False
+                    problems.append("phone_credentials " + str(idx) + " is missing " + req_field)
+            if phoneData.get('digest') is not None and phoneData['digest'] not in cls.DIGEST_DAYS:
+                problems.append("phone_credentials " + str(idx) + " has unknown digest " + str(phoneData['digest']))
         for req_field in email_credentials_req_fields:
-            if req_field not in self.configData['email_credentials'].keys():
-                return False
-        return True
+            if req_field not in configData['email_credentials'].keys():
+                problems.append("email_credentials is missing " + req_field)
+        # channels are optional, but each one listed must be complete
+        for idx, channelConfig in enumerate(configData.get('channels', [])):
+            if not isValidChannelConfig(channelConfig):
+                problems.append("channel " + str(idx) + " is incomplete or has an unknown type")
+        if 'source' in configData and not isValidSourceConfig(configData['source']):
+            problems.append("source is incomplete or has an unknown type")
+        problems += DataAnalyzer.getConfigProblems(configData.get('analysis', {}))
+        problems += MessageTemplates.getTemplateProblems(configData.get('message_templates', {}))
+        problems += MessageTemplates.getProfileProblems(configData.get('recipient_profiles', {}))
+        for region, regionDbFile in configData.get('compare_regions', {}).items():
+            if not isinstance(regionDbFile, str) or not os.path.exists(regionDbFile):
+                problems.append("compare_regions database of " + str(region) + " not found")
+                continue
+            # compared databases are only read, so they must already be migrated by their own updater
+            for problem in cls.getDatabaseProblems(regionDbFile, extraColumns=['day']):
+                problems.append("compare_regions database of " + str(region) + ": " + problem)
+        return problems
+
+
+    # checks the database can be read without changing it
+    # dbFile       : sqlite database file
+    # extraColumns : (optional) columns the DATA table must have besides the entry fields
+    # return       : list of problem strings, empty if the database is usable
+    @staticmethod
+    def getDatabaseProblems(dbFile, extraColumns=[]):
+        try:
+            # read only, so a check never creates tables or a journal
+            conn = sqlite3.connect('file:' + os.path.abspath(dbFile) + '?mode=ro', uri=True)
+        except sqlite3.Error as e:
+            return ["could not open database: " + str(e)]
+        problems = []
+        try:
+            integrity = conn.execute("PRAGMA quick_check").fetchone()[0]
+            if integrity != 'ok':
+                problems.append("integrity check failed: " + integrity)
+            columns = [row[1].lower() for row in conn.execute("PRAGMA table_info(DATA)").fetchall()]
+            if len(columns) == 0:
+                problems.append("missing DATA table")
+            else:
+                for field in WebReader.REQUIRED_ENTRY_FIELDS + extraColumns:
+                    if field not in columns:
+                        problems.append("DATA table is missing column " + field)
+            if len(problems) == 0:
+                latest = conn.execute(WebReader.LATEST_ENTRY_QUERY).fetchone()
+                if latest is not None:
+                    datetime.strptime(latest[0], '%Y-%m-%d')
+        except (sqlite3.Error, ValueError, TypeError) as e:
+            problems.append("could not read database: " + str(e))
+        finally:
+            conn.close()
+        return problems
+
+
+    # dry run that validates the config and database without starting anything
+    # NOTE - never loads the page parser, http or smtp stacks and never writes to the database
+    # configFile : json configuration file
+    # dbFile     : sqlite database file
+    # return     : list of problem strings, empty if the updater can start
+    @classmethod
+    def checkFiles(cls, configFile, dbFile):
+        try:
+            with open(configFile) as f:
+                configData = json.load(f)
+        except Exception as e:
+            configData = None
+            problems = ["could not read config file: " + str(e)]
+        if configData is not None:
+            problems = cls.getConfigProblems(configData)
+            if len(problems) == 0:
+                et = EmailTexter()
+                for idx, phoneData in enumerate(configData['phone_credentials']):
+                    if et.getPhoneNumberEmailAddress(phoneData['number'], phoneData['carrier']) is None:
+                        problems.append("phone_credentials " + str(idx) + " has an invalid number or unsupported carrier")
+        return problems + cls.getDatabaseProblems(dbFile)
+
+
+    # finds problems in the data that do not stop the updater but make its analysis less accurate
+    # NOTE - rolling statistics count rows, so a gap stretches them over more days than they say
+    # dbFile : sqlite database file
+    # return : list of warning strings
+    @staticmethod
+    def getDatabaseWarnings(dbFile):
+        try:
+            gaps = DataAnalyzer(dbFile).getDataGaps()
+        except sqlite3.Error:
+            # reported by getDatabaseProblems() instead
+            return []
+        return ["no data for " + str(days) + " day(s) starting " + firstDay for firstDay, days in gaps]
 
 
     # checks for an update and sends message if one is available
     # forceSend : (optional) always sends the update
-    # return    : None
+    # return    : true if a new entry was stored, false otherwise
     def checkForUpdateAndSend(self, forceSend=False):
+        storedNewEntry = False
         if self.wr.isNewDataAvailable() or forceSend:
             # gets new data
-            latestWebData = self.wr.readLatestEntryFromWeb()
+            webData = self.wr.readLatestEntryFromWeb()
+
+            # makes sure the page parsed into something plausible before storing or sending it
+            latestDbData = self.wr.getLatestEntry()
+            latestWebData = EntryRecord.parse(webData)[0]
+            problems = self.wr.validateEntry(webData)
+            if len(problems) > 0 and forceSend:
+                print("could not send forced update, web data is invalid: " + "; ".join(problems))
+                return False
+            # a forced send always goes out, even if the page is older than or jumps from the stored data,
+            # but only plausible entries are stored
+            if len(problems) == 0:
+                problems = self.wr.validateEntry(latestWebData, latestDbData)
+            if len(problems) > 0 and not forceSend:
+                print("rejected web data, quarantined to " + self.wr.quarantineFilename + ": " + "; ".join(problems))
+                self.wr.quarantineEntry(webData, problems)
+                return False
 
             # calculates new cases from previous data entry and this one
-            latestDbData = self.wr.readLatestEntryFromDatabase()
             if latestDbData is not None:
-                latestWebData['new_cases'] = int(latestWebData['total_cases']) - int(latestDbData['total_cases'])
+                latestWebData = latestWebData._replace(new_cases=latestWebData.total_cases - latestDbData.total_cases)
+            else:
+                latestWebData = latestWebData._replace(new_cases=latestWebData.total_cases)
+
+            # saves to database, subscribers send the update and refresh caches from here
+            if len(problems) == 0 and self.wr.addEntryToDatabase(latestWebData):
+                storedNewEntry = True
             else:
-                latestWebData['new_cases'] = int(latestWebData['total_cases'])
-
-            # saves to database
-            if not self.wr.addEntryToDatabase(latestWebData):
-                print("failed to add entry to database?")
-
-            # sends update using text to email
-            # initializes email server now since otherwise may time out over several hours
-            emailserver = self.et.initializeEmailServer(
-                self.configData['email_credentials']['user'],
-                self.configData['email_credentials']['pass'],
-                self.configData['email_credentials']['url']
-            )
-            # generates the text message to send
-            textMessage = "LATEST SD COVID19 UPDATE:\n"
-            textMessage += "New Cases: " + str(latestWebData['new_cases']) + "\n"
-            textMessage += "Total Cases: " + str(latestWebData['total_cases']) + "\n"
-
-            for email in self.phoneNumberEmails:
-                # t-mobile does not allow website link, so only add if that is not the number
-                messageToSend = textMessage
-                if not "tmomail.net" in email:
-                    messageToSend += "https://bit.ly/2W8uQJM" # shortened URL to SD Covid19 Website
-                self.et.sendMessage(
-                    email,
-                    messageToSend,
-                    emailserver
-                )
-            time.sleep(1) # prevents messages from being sent out of order
-
-            # generates a second message that is analysis
-            analysisTextMessage = self.getAnalysisMessage()
-            for email in self.phoneNumberEmails:
-                self.et.sendMessage(
-                    email,
-                    analysisTextMessage,
-                    emailserver
-                )
-
-            emailserver.close()
-    
+                if len(problems) > 0:
+                    print("not storing forced update: " + "; ".join(problems))
+                else:
+                    print("failed to add entry to database?")
+                if forceSend:
+                    self.sendUpdate(latestWebData)
+        elif self.pendingEntry is not None:
+            self.checkForRevision(self.pendingEntry)
+        return storedNewEntry
+
+
+    # stores a revision of the day an update is pending for, e.g. a correction published right after it
+    # NOTE - only checked while the update waits out the debounce window, so the revision replaces it
+    #        instead of being sent as well, later corrections are not sent
+    # entry  : EntryRecord of the pending update
+    # return : true if a revision was stored, false otherwise
+    def checkForRevision(self, entry):
+        webData = self.wr.readLatestEntryFromWeb()
+        revision = EntryRecord.parse(webData)[0]
+        if revision is None or revision.date != entry.date:
+            return False
+        previousEntry = self.wr.readEntryBefore(revision.getDay())
+        problems = self.wr.validateEntry(revision, previousEntry)
+        if len(problems) > 0:
+            print("rejected revision, quarantined to " + self.wr.quarantineFilename + ": " + "; ".join(problems))
+            self.wr.quarantineEntry(webData, problems)
+            return False
+        # new cases are counted from the previous day, as when the day was first stored
+        revision = revision._replace(new_cases=revision.total_cases - (previousEntry.total_cases if previousEntry is not None else 0))
+        if revision == entry:
+            return False
+        # subscribers queue the update again from here
+        return self.wr.reviseEntryInDatabase(revision)
+
+
+    # sends the update for an entry, waiting out the debounce window first if one is set
+    # NOTE - a newer entry (or a revision of the same day) arriving within the window replaces the pending one
+    # entry  : EntryRecord that was stored
+    # return : None
+    def queueUpdate(self, entry):
+        if self.debounceSecs <= 0:
+            self.sendUpdate(entry)
+            return
+        with self.pendingUpdateLock:
+            if self.pendingUpdate is not None:
+                self.pendingUpdate.cancel()
+            self.pendingEntry = entry
+            self.pendingUpdate = threading.Timer(self.debounceSecs, self.sendPendingUpdate, [entry])
+            self.pendingUpdate.start()
+
+
+    # sends a pending update once its debounce window is over
+    # entry  : EntryRecord the update was queued for
+    # return : None
+    def sendPendingUpdate(self, entry):
+        with self.pendingUpdateLock:
+            # replaced after the timer fired, but before the lock was free to cancel it
+            if self.pendingEntry is not entry:
+                return
+            self.pendingEntry = None
+        self.sendUpdate(entry)
+
+
+    # generates the update text message for an entry
+    # entry       : EntryRecord that was stored
+    # includeLink : (optional) adds the link to the county website
+    # return      : string of update in text message format
+    def getUpdateMessage(self, entry, includeLink=True):
+        return self.templates.render('update', date=entry.date, new_cases=entry.new_cases, total_cases=entry.total_cases,
+            link=self.templates.render('link') if includeLink else '')
+
+
+    # sends messages to recipients through every channel, merging them into one text where it fits
+    # NOTE - when a recipient needs more than one text, they are sent a second apart to keep them in order
+    # messages   : list of message strings, in the order they should arrive
+    # recipients : list of email addresses
+    # return     : None
+    def sendMessages(self, messages, recipients):
+        self.sendMessagePages([(self.getTextRenderer(lambda profile: messages), recipients)])
+
+
+    # builds the function giving each recipient their texts, rendered and packed once per update for
+    # each recipient profile and text length instead of once per recipient
+    # getHeads : function of a recipient profile returning the message strings every recipient gets, in order
+    # facts    : (optional) list of (importance, fact) tuples packed after them, see MessageTemplates.packSegments()
+    # return   : function of an email address returning a tuple of text strings
+    def getTextRenderer(self, getHeads, facts=()):
+        rendered = {}
+        def getTexts(email):
+            profile = self.templates.getProfile(email)
+            maxLength = self.et.getMaxMessageLength(email, self.maxMessageLengths)
+            key = (tuple(sorted(profile.items())), maxLength)
+            if key not in rendered:
+                rendered[key] = tuple(self.templates.packSegments(getHeads(profile), facts, maxLength, profile['max_segments']))
+            return rendered[key]
+        return getTexts
+
+
+    # sends each page of recipients its texts, keeping the channels open across pages
+    # NOTE - pages are consumed one at a time, so a generator never has more than one page in memory
+    # pages  : iterable of (function of an email address returning its texts, list of email addresses) tuples,
+    #          see getTextRenderer()
+    # return : None
+    def sendMessagePages(self, pages):
+        # opens channels now since otherwise connections may time out over several hours
+        channels = None
+        try:
+            for getTexts, recipients in pages:
+                if channels is None:
+                    # filled as each one opens, so the ones already open are closed if a later one raises
+                    channels = []
+                    for channel in self.channels:
+                        if channel.open():
+                            channels.append(channel)
+                # each group of recipients getting the same texts is sent together
+                textsPerRecipients = {}
+                for email in recipients:
+                    textsPerRecipients.setdefault(getTexts(email), []).append(email)
+
+                for textIdx in range(max([len(texts) for texts in textsPerRecipients] + [0])):
+                    sendsThisRound = [(texts[textIdx], emails) for texts, emails in textsPerRecipients.items() if textIdx < len(texts)]
+                    if len(sendsThisRound) == 0:
+                        break
+                    if textIdx > 0:
+                        time.sleep(1) # prevents messages from being sent out of order
+                    for channel in channels:
+                        for text, emails in sendsThisRound:
+                            channel.send(text, emails)
+        finally:
+            # an error part way through a send must not leave smtp connections open
+            if channels is not None:
+                for channel in channels:
+                    channel.close()
+
+
+    # reads recipients a page at a time, the config's first and then the database's
+    # digest : (optional) key of DIGEST_DAYS, None for recipients getting every update
+    # return : iterator of lists of email addresses
+    def getRecipientPages(self, digest=None):
+        # skips numbers that could not be turned into an email address
+        configRecipients = [email for email in (self.phoneNumberEmails if digest is None else self.digestEmails[digest]) if email is not None]
+        if len(configRecipients) > 0:
+            yield configRecipients
+        for page in self.subscribers.readPages(digest):
+            yield page
+
+
+    # sends the update and analysis texts for an entry to every non-digest recipient
+    # entry  : EntryRecord that was stored
+    # return : None
+    def sendUpdate(self, entry):
+        # recipient profiles decide the link, e.g. t-mobile does not allow website links
+        getTexts = self.getTextRenderer(lambda profile: [self.getUpdateMessage(entry, includeLink=profile['links'])], self.getAnalysisFacts())
+        self.sendMessagePages((getTexts, recipients) for recipients in self.getRecipientPages())
+
+
+    # checks if a digest should go out
+    # digest : key of DIGEST_DAYS
+    # now    : datetime of now
+    # return : true if due, false otherwise
+    def isDigestDue(self, digest, now):
+        if now.hour < self.digestHour or self.lastDigestDates.get(digest) == now.date():
+            return False
+        if digest == 'weekly' and now.weekday() != self.WEEKLY_DIGEST_WEEKDAY:
+            return False
+        return True
+
+
+    # generates a digest message summarizing the latest days
+    # digest : key of DIGEST_DAYS
+    # return : string of digest in text message format
+    def getDigestMessage(self, digest):
+        days = self.DIGEST_DAYS[digest]
+        entries = self.da.readLatestEntries(days)
+        newCases = sum(entry.new_cases for entry in entries if entry.new_cases is not None)
+        return self.templates.render('digest', digest=digest.upper(), new_cases=newCases,
+            total_cases=entries[0].total_cases if len(entries) > 0 else None)
+
+
+    # sends any digests that are due
+    # now    : (optional) datetime of now
+    # return : list of digests sent
+    def sendDueDigests(self, now=None):
+        if now is None:
+            now = datetime.now()
+        sentDigests = []
+        for digest in self.DIGEST_DAYS:
+            if not self.isDigestDue(digest, now):
+                continue
+            if len(self.digestEmails[digest]) == 0 and not self.subscribers.hasSubscribers(digest):
+                continue
+            # marked before sending, so a send that fails part way is not repeated every poll
+            self.lastDigestDates[digest] = now.date()
+            self.subscribers.writeDigestDate(digest, now.date())
+            digestMessage = self.getDigestMessage(digest)
+            getTexts = self.getTextRenderer(lambda profile: [digestMessage], self.getAnalysisFacts())
+            self.sendMessagePages((getTexts, recipients) for recipients in self.getRecipientPages(digest))
+            sentDigests.append(digest)
+        return sentDigests
+
+
+    # refreshes the snapshot so a restart does not have to rebuild it
+    # entry  : EntryRecord that was stored (unused, the whole table is exported)
+    # return : None
+    def refreshSnapshot(self, entry):
+        if DataSnapshot.writeFromDatabase(self.dbFile, self.snapshotFile):
+            self.da.reloadSnapshot()
+
+
+    # ranks the facts about the latest data, including how the region compares to others
+    # maxFacts : (optional) maximum number of facts to return
+    # return   : list of (importance, fact) tuples, most important first
+    def getAnalysisFacts(self, maxFacts=3):
+        facts = list(self.da.getRankedFactTuples(maxFacts=maxFacts))
+        if self.regionAnalyzer is not None:
+            facts.extend(self.regionAnalyzer.getRegionFacts(self.subscribers.region))
+        facts.sort(key=lambda fact: fact[0], reverse=True)
+        return facts[:maxFacts]
+
 
     # generates an analysis message based on the latest data
     # return : string of analysis data in text message format
     def getAnalysisMessage(self):
-        factBlurbs = ["Analysis:"]
         # format is up to 3 facts, ranked by importance
-        # first up is if latest cases is max of all time
-        if self.da.checkIfLatestIsMaxNewCases():
-            factBlurbs.append("- Today is the highest number of new cases yet")
-        # now gets the 3-day trend to see if we're going up or down
-        dayTrend = self.da.getNewCasesTrend(days=3)
-        if dayTrend != 0:
-            factBlurbs.append(f'- The 3-day trend of new cases is {dayTrend:.2f}/day')
-        # now gets the 7-day average to see what most days are
-        weekAverage = self.da.getLatestNewCasesAverage(days=7)
-        if weekAverage != 0:
-            factBlurbs.append(f'- The 7-day average of new cases is {weekAverage:.2f}/day')
-
-        outputMessage = '\n'.join(factBlurbs)
-        return outputMessage
+        factBlurbs = [self.templates.render('analysis')]
+        for importance, fact in self.getAnalysisFacts(maxFacts=3):
+            factBlurbs.append(self.templates.render('fact', fact=fact))
+        return '\n'.join(factBlurbs)
+
+
+    # gets runtime metrics of the updater
+    # return : dict of metrics
+    def getMetrics(self):
+        return {
+            'send_scheduler' : self.et.sendScheduler.getMetrics(),
+            'resources' : self.monitor.takeSample(keep=False)
+        }
+
+
+    # starts the local read-only http api in the background
+    # host   : interface to listen on
+    # port   : port to listen on
+    # return : true on success, false on error
+    def startApiServer(self, host, port):
+        from api_server import ApiServer
+        self.api = ApiServer(self.dbFile, self.da, host=host, port=port, metricsProvider=self.getMetrics,
+            regionAnalyzer=self.regionAnalyzer)
+        if not self.api.start():
+            return False
+        # rebuilds the responses as soon as new data arrives instead of on the next request
+        self.bus.subscribe(EventBus.ENTRY_ADDED, lambda entry: self.api.refreshCache(), name='api_cache')
+        return True
+
+
+    # starts logging resource samples on the configured interval, and the top allocators on SIGUSR1
+    # traceAllocations : (optional) traces allocations from now instead of from the first signal
+    # return           : true if samples are logged, false if turned off in the config
+    def startTelemetry(self, traceAllocations=False):
+        if traceAllocations:
+            self.monitor.startTracing()
+        self.monitor.installSignalHandler()
+        if self.monitor.intervalSecs <= 0:
+            return False
+        self.monitor.start()
+        return True
+
+
+    # switches the daemon to adaptive polling, learning the publish window from past updates
+    # baseInterval : seconds between polls inside the publish window
+    # maxInterval  : (optional) longest wait in seconds outside the window
+    # return       : true if a publish window was learned, false if polling at the base interval
+    def enableAdaptivePolling(self, baseInterval, maxInterval=3600):
+        self.scheduler = PollScheduler(baseInterval=baseInterval, maxInterval=maxInterval)
+        updateTimes = self.wr.readUpdateTimes()
+        learned = self.scheduler.learnWindow(updateTimes)
+        if learned and len(updateTimes) > 0:
+            # data may already be in for the current window
+            self.scheduler.markCaughtUp(updateTimes[0])
+        return learned
+
+
+    # sends an entry stored by another process (the shard that fetches)
+    # NOTE - a revision of the followed day replaces its update only while that is still pending, as on the fetching shard
+    # return : true if a new entry was found, false otherwise
+    def checkForStoredUpdate(self):
+        # only a PRAGMA until the fetching worker writes
+        entry = self.wr.getLatestEntry()
+        if entry is None or entry == self.followedEntry:
+            return False
+        revision = self.followedEntry is not None and entry.date == self.followedEntry.date
+        self.followedEntry = entry
+        if revision and self.pendingEntry is None:
+            return False
+        # the other process bumped its own data version, not ours
+        data_cache.bumpDataVersion(self.dbFile)
+        self.queueUpdate(entry)
+        return not revision
+
+
+    # checks for an update once and sends any digests that are due
+    # frequencySecs : number of seconds between checks
+    # return        : number of seconds until the next check
+    def pollOnce(self, frequencySecs):
+        if self.follower:
+            storedNewEntry = self.checkForStoredUpdate()
+        else:
+            storedNewEntry = self.checkForUpdateAndSend()
+        self.sendDueDigests()
+        if self.scheduler is not None:
+            if storedNewEntry:
+                self.scheduler.learnWindow(self.wr.readUpdateTimes())
+                self.scheduler.markCaughtUp()
+            return self.scheduler.getNextInterval()
+        return frequencySecs
 
 
     # daemon that runs the check update every X seconds
+    # NOTE - with adaptive polling enabled, X is only the interval inside the publish window
     # frequencySecs : number of seconds between calls to checkForUpdateAndSend()
     def checkUpdateDaemon(self, frequencySecs):
-        self.checkForUpdateAndSend()
-        threading.Timer(frequencySecs, self.checkUpdateDaemon, [frequencySecs]).start()
+        nextCheckSecs = self.pollOnce(frequencySecs)
+        threading.Timer(nextCheckSecs, self.checkUpdateDaemon, [frequencySecs]).start()
 
 
 if __name__ == "__main__":
@@ -146,12 +619,23 @@ if __name__ == "__main__":
     parser.add_argument("-c", "--config", dest="config", default="config.json", help="json configuration file")
     parser.add_argument("-d", "--database", dest="db", default="covid19.db", help="sqlite databse file")
     parser.add_argument("-i", "--interval", type=int, dest="interval", default=60, help="interval in seconds to check for updates")
+    parser.add_argument("-a", "--adaptive", action="store_true", dest="adaptive", help="learns when updates are published and backs off polling outside that window")
+    parser.add_argument("--max_interval", type=int, dest="max_interval", default=3600, help="longest interval in seconds between checks when adaptive")
+    parser.add_argument("--check", action="store_true", dest="check",
+                        help="validates the config and database files and exits without checking for updates or sending")
+    parser.add_argument("--profile", dest="profile", default=None, metavar="PREFIX",
+                        help="profiles one forced update against a copy of the database and the local test page, writing PREFIX.pstats and PREFIX.collapsed")
+    parser.add_argument("--api_port", type=int, dest="api_port", default=None, help="if set, serves the latest data and analysis as json on this port")
+    parser.add_argument("--api_host", dest="api_host", default="127.0.0.1", help="interface for the json api to listen on")
+    parser.add_argument("--trace_allocations", action="store_true", dest="trace_allocations",
+                        help="traces memory allocations from the start, send SIGUSR1 to log the top allocators")
     args = parser.parse_args()
 
     print("COVID-19 Updater")
     print("\tConfig File           : " + args.config)
     print("\tDB File               : " + args.db)
     print("\tCheck Interval (secs) : " + str(args.interval))
+    print("\tAdaptive Polling      : " + str(args.adaptive))
 
     # checks files exist
     if not os.path.exists(args.config):
@@ -161,6 +645,22 @@ if __name__ == "__main__":
         print("ERROR: SQLite database file not found.")
         sys.exit(1)
 
+    if args.check:
+        problems = Covid19Updater.checkFiles(args.config, args.db)
+        for problem in problems:
+            print("ERROR: " + problem)
+        if len(problems) > 0:
+            sys.exit(2)
+        for warning in Covid19Updater.getDatabaseWarnings(args.db):
+            print("WARNING: " + warning)
+        print("Config and database OK.")
+        sys.exit(0)
+
+    if args.profile is not None:
+        from profiling import profileUpdateCycle
+        profileUpdateCycle(args.config, args.db, args.profile)
+        sys.exit(0)
+
     cu = None
     try:
         cu = Covid19Updater(args.config, args.db)
@@ -168,5 +668,18 @@ if __name__ == "__main__":
         print("ERROR: " + str(e))
         sys.exit(2)
 
+    if args.api_port is not None:
+        if not cu.startApiServer(args.api_host, args.api_port):
+            print("ERROR: Could not start json api on port " + str(args.api_port))
+            sys.exit(3)
+        print("\tJSON API              : http://" + args.api_host + ":" + str(cu.api.port))
+
+    if cu.startTelemetry(traceAllocations=args.trace_allocations):
+        print("\tTelemetry (secs)      : " + str(cu.monitor.intervalSecs))
+
+    if args.adaptive:
+        if not cu.enableAdaptivePolling(args.interval, maxInterval=args.max_interval):
+            print("\tNot enough update history yet, polling every " + str(args.interval) + " secs until there is")
+
     # starts daemon (will never end!)
     cu.checkUpdateDaemon(frequencySecs=args.interval)
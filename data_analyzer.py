@@ -3,20 +3,249 @@
 
 import sqlite3
 import statistics
+import math
+import functools
+from datetime import date, timedelta
+
+import data_cache
+from data_snapshot import DataSnapshot
+from entry_record import EntryRecord
+
+
+# caches a DataAnalyzer method's result per data version and arguments
+# NOTE - cached values are shared between calls, so callers must not modify them
+def memoized(func):
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        key = (self.getDataKey(), func.__name__, args, tuple(sorted(kwargs.items())))
+        found, value = self.cache.get(key)
+        if not found:
+            value = func(self, *args, **kwargs)
+            self.cache.put(key, value)
+        return value
+    return wrapper
 
 class DataAnalyzer:
 
-    LATEST_ENTRY_QUERY = "SELECT DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS from DATA ORDER BY strftime('%Y-%m-%d', DATE) DESC"
+    LATEST_ENTRY_QUERY = "SELECT DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS from DATA ORDER BY DAY DESC"
     MAX_NEW_CASES_ENTRY_QUERY = "SELECT DATE, TOTAL_CASES, MAX(NEW_CASES), NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS from DATA"
 
+    # metrics in the order of the DATA query columns (DATE is column 0)
+    METRICS = ['total_cases', 'new_cases', 'new_tests', 'hospitalizations', 'intensive_care', 'deaths']
+    # these are running totals on the county page, so they are analyzed as day-to-day changes
+    CUMULATIVE_METRICS = ['total_cases', 'hospitalizations', 'intensive_care', 'deaths']
+    METRIC_NAMES = {
+        'total_cases' : 'total cases',
+        'new_cases' : 'new cases',
+        'new_tests' : 'new tests',
+        'hospitalizations' : 'new hospitalizations',
+        'intensive_care' : 'new ICU patients',
+        'deaths' : 'new deaths'
+    }
+
+    # tables old daily rows are rolled up into by initialize_db_file.py --maintain, coarsest last
+    # NOTE - running totals hold the value on LAST_DATE, NEW_CASES and NEW_TESTS are summed
+    AGGREGATE_TABLES = {
+        'weekly' : 'DATA_WEEKLY',
+        'monthly' : 'DATA_MONTHLY'
+    }
+    AGGREGATE_QUERY = ("SELECT PERIOD_START, LAST_DATE, DAYS, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS "
+        "from {table} WHERE PERIOD_START >= :start AND PERIOD_START <= :end"
+    )
+    DAILY_WINDOW_QUERY = "SELECT DATE, DATE, 1, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS from DATA WHERE DAY >= :startDay AND DAY <= :endDay"
+    ROLLED_UP_MAX_NEW_CASES_QUERY = "SELECT MAX(MAX_NEW_CASES) from DATA_MONTHLY"
+    # days of a rolled up month no longer stored daily, i.e. pruned by initialize_db_file.py --maintain
+    PRUNED_DAYS_QUERY = ("SELECT DAYS - (SELECT COUNT(*) from DATA WHERE DAY >= :startDay AND DAY <= :endDay) "
+        "from DATA_MONTHLY WHERE PERIOD_START = :start"
+    )
+    # days followed by missing days, with the next day that has data, both found on the DAY index
+    GAPS_QUERY = ("SELECT DAY, (SELECT MIN(NEXT.DAY) from DATA NEXT WHERE NEXT.DAY > DATA.DAY) from DATA "
+        "WHERE DAY < (SELECT MAX(DAY) from DATA) AND NOT EXISTS (SELECT 1 from DATA NEXT WHERE NEXT.DAY = DATA.DAY + 1) "
+        "ORDER BY DAY ASC"
+    )
+
+    # rules that turn statistics into facts, each returns a list of (importance, fact) tuples
+    ANALYSIS_RULES = [
+        'ruleLatestIsMaxNewCases',
+        'ruleAnomalies',
+        'ruleDoublingTime',
+        'ruleNewCasesTrend',
+        'ruleWeekOverWeekChange',
+        'ruleLongWindowChange',
+        'rulePositivityRate',
+        'ruleNewCasesAverage'
+    ]
+
+    # days in the long window, initialize_db_file.py --maintain keeps two of them as daily rows
+    DEFAULT_LONG_WINDOW_DAYS = 28
 
-    def __init__(self, dbFilename):
+    # fields of the "analysis" config section and the constructor argument each one sets
+    CONFIG_FIELDS = {
+        'rolling_days' : 'rollingDays',
+        'trend_days' : 'trendDays',
+        'anomaly_z_score' : 'anomalyZScore',
+        'long_window_days' : 'longWindowDays',
+        'rules' : 'rules'
+    }
+
+
+    # dbFilename       : sqlite database file
+    # snapshotFilename : (optional) binary snapshot of the database to read from instead
+    # rollingDays      : (optional) number of days in the rolling mean and week-over-week windows
+    # trendDays        : (optional) number of days in the new cases trend
+    # anomalyZScore    : (optional) z-score at or above which the latest value is an anomaly
+    # longWindowDays   : (optional) number of days in the long window, read from the rolled up tables where they cover it
+    # rules            : (optional) names of the ANALYSIS_RULES to run, defaults to all of them
+    # cacheSize        : (optional) number of results to memoize
+    def __init__(self, dbFilename, snapshotFilename=None, rollingDays=7, trendDays=3, anomalyZScore=3.0, longWindowDays=DEFAULT_LONG_WINDOW_DAYS, rules=None, cacheSize=64):
         self.dbFilename = dbFilename
+        self.snapshotFilename = snapshotFilename
+        self.snapshot = None
+        self.rollingDays = rollingDays
+        self.trendDays = trendDays
+        self.anomalyZScore = anomalyZScore
+        self.longWindowDays = longWindowDays
+        self.rules = list(rules) if rules is not None else self.ANALYSIS_RULES
+        self.cache = data_cache.LRUCache(cacheSize)
+        self.keyVersion = None
+        self.keyLatestDate = None
+        self.reloadSnapshot()
+
+
+    # checks the "analysis" section of a config
+    # analysisConfig : dict of CONFIG_FIELDS keys to values
+    # return         : list of problem strings, empty if the section is valid
+    @classmethod
+    def getConfigProblems(cls, analysisConfig):
+        if not isinstance(analysisConfig, dict):
+            return ["analysis is not a dict"]
+        problems = []
+        for field, value in analysisConfig.items():
+            if field not in cls.CONFIG_FIELDS:
+                problems.append("analysis has unknown field " + str(field))
+            elif field == 'rules':
+                if not isinstance(value, list) or any(rule not in cls.ANALYSIS_RULES for rule in value):
+                    problems.append("analysis rules must be a list of " + ", ".join(cls.ANALYSIS_RULES))
+            elif field == 'anomaly_z_score':
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                    problems.append("analysis anomaly_z_score must be a positive number")
+            # a trend needs at least two days to difference
+            elif isinstance(value, bool) or not isinstance(value, int) or value < (2 if field == 'trend_days' else 1):
+                problems.append("analysis " + field + " must be an integer of at least " + ("2" if field == 'trend_days' else "1"))
+        return problems
+
+
+    # gets the constructor arguments set by the "analysis" section of a config
+    # analysisConfig : dict of CONFIG_FIELDS keys to values, checked with getConfigProblems()
+    # return         : dict of keyword arguments
+    @classmethod
+    def getConfigArguments(cls, analysisConfig):
+        return {cls.CONFIG_FIELDS[field]: value for field, value in analysisConfig.items()}
+
+
+    # gets the key that identifies the current state of the data
+    # NOTE - the latest date is only re-read when the data version changes, so writes that do not
+    #        go through WebReader.addEntryToDatabase in this process are not seen until then
+    # return : (latest DATE, data version) tuple
+    def getDataKey(self):
+        version = data_cache.getDataVersion(self.dbFilename)
+        if version != self.keyVersion:
+            # data changed, so the snapshot may be out of date as well
+            if self.snapshot is not None and DataSnapshot.isStale(self.dbFilename, self.snapshotFilename):
+                self.reloadSnapshot()
+            latestEntries = self.readLatestEntries(1)
+            self.keyLatestDate = latestEntries[0][0] if len(latestEntries) > 0 else None
+            self.keyVersion = version
+        return (self.keyLatestDate, self.keyVersion)
+
+
+    # (re)opens the snapshot file, falling back to the database if it is missing or stale
+    # NOTE - the old snapshot is left to be released once no reader is using it
+    # return : true if the snapshot is in use, false otherwise
+    def reloadSnapshot(self):
+        snapshot = None
+        if self.snapshotFilename is not None and not DataSnapshot.isStale(self.dbFilename, self.snapshotFilename):
+            snapshot = DataSnapshot(self.snapshotFilename)
+            if not snapshot.open():
+                snapshot = None
+        self.snapshot = snapshot
+        return snapshot is not None
+
+
+    # reads the X latest entries from the snapshot if loaded, otherwise the database
+    # count  : number of entries to read
+    # return : list of EntryRecords, newest first
+    def readLatestEntries(self, count):
+        snapshot = self.snapshot
+        if snapshot is not None:
+            return snapshot.getLatestEntries(count)
+        conn = sqlite3.connect(self.dbFilename)
+        c = conn.cursor()
+        c.row_factory = EntryRecord.fromRow
+        c.execute(self.LATEST_ENTRY_QUERY)
+        latestEntries = c.fetchmany(count)
+        conn.close()
+        return latestEntries
+
+
+    # gets the first day of the week (monday) or month a date is in
+    # day    : date object
+    # period : 'weekly' or 'monthly'
+    # return : date object
+    @staticmethod
+    def getPeriodStart(day, period):
+        if period == 'weekly':
+            return day - timedelta(days=day.weekday())
+        return day.replace(day=1)
+
+
+    # gets the last day of the week or month starting on a date
+    # start  : date object returned by getPeriodStart()
+    # period : 'weekly' or 'monthly'
+    # return : date object
+    @staticmethod
+    def getPeriodEnd(start, period):
+        if period == 'weekly':
+            return start + timedelta(days=6)
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+    # reads the largest daily new cases of the days already rolled up and pruned from DATA
+    # return : int, or None if nothing has been rolled up
+    def readRolledUpMaxNewCases(self):
+        conn = sqlite3.connect(self.dbFilename)
+        try:
+            return conn.execute(self.ROLLED_UP_MAX_NEW_CASES_QUERY).fetchone()[0]
+        except sqlite3.OperationalError:
+            # database made before the aggregate tables existed
+            return None
+        finally:
+            conn.close()
+
+
+    # finds the days missing between the first and latest stored days
+    # return : list of (YYYY-MM-DD first missing day, number of days missing) tuples, oldest first
+    @memoized
+    def getDataGaps(self):
+        conn = sqlite3.connect(self.dbFilename)
+        rows = conn.execute(self.GAPS_QUERY).fetchall()
+        conn.close()
+        return [(date.fromordinal(day + 1).isoformat(), nextDay - day - 1) for day, nextDay in rows]
 
 
     # checks if latest entry has the maximum new cases of entire db
+    # NOTE - includes days that were rolled up into DATA_MONTHLY and pruned from DATA
     # return : true if latest is max, false otherwise
+    @memoized
     def checkIfLatestIsMaxNewCases(self):
+        rolledUpMax = self.readRolledUpMaxNewCases()
+        snapshot = self.snapshot
+        if snapshot is not None:
+            newCases = snapshot.getColumn('new_cases')
+            if len(newCases) == 0 or newCases[-1] == DataSnapshot.MISSING_VALUE:
+                return False
+            return newCases[-1] == max(newCases) and (rolledUpMax is None or newCases[-1] >= rolledUpMax)
+
         # connects to database
         conn = sqlite3.connect(self.dbFilename)
         c = conn.cursor()
@@ -28,31 +257,103 @@ class DataAnalyzer:
 
         # first index is DATE, if dates equal then max == latestentry
         if latestEntryData[0] == maxEntryData[0]:
-            return True
+            return rolledUpMax is None or latestEntryData[2] >= rolledUpMax
         else:
             return False
-    
+
+
+    # summarizes a date window, reading each part of it from the coarsest table that covers it
+    # NOTE - whole months come from DATA_MONTHLY and whole weeks from DATA_WEEKLY, so windows
+    #        reaching back past the daily retention can still be answered, with far fewer rows
+    # startDate : YYYY-MM-DD first day of the window
+    # endDate   : YYYY-MM-DD last day of the window
+    # return    : dict of 'days' with data, 'new_cases' and 'new_tests' summed over the window,
+    #             running totals on the last day with data and 'rows' read from each table,
+    #             None if part of the window was pruned without a whole period covering it
+    @memoized
+    def getWindowSummary(self, startDate, endDate):
+        day = date.fromisoformat(startDate)
+        end = date.fromisoformat(endDate)
+        window = {'start' : startDate, 'end' : endDate, 'startDay' : day.toordinal(), 'endDay' : end.toordinal()}
+        conn = sqlite3.connect(self.dbFilename)
+        periodRows = {}
+        for period, table in self.AGGREGATE_TABLES.items():
+            try:
+                periodRows[period] = {row[0]: row for row in conn.execute(self.AGGREGATE_QUERY.format(table=table), window)}
+            except sqlite3.OperationalError:
+                # database made before the aggregate tables existed
+                periodRows[period] = {}
+        dailyRows = {row[0]: row for row in conn.execute(self.DAILY_WINDOW_QUERY, window)}
+
+        rows = {'monthly' : 0, 'weekly' : 0, 'daily' : 0}
+        parts = []
+        # months the window only partly covers, and whether any of their days were pruned
+        prunedMonths = {}
+        while day <= end:
+            for period in ['monthly', 'weekly']:
+                periodEnd = self.getPeriodEnd(day, period)
+                if day == self.getPeriodStart(day, period) and periodEnd <= end and day.isoformat() in periodRows[period]:
+                    parts.append(periodRows[period][day.isoformat()])
+                    rows[period] += 1
+                    day = periodEnd + timedelta(days=1)
+                    break
+            else:
+                if day.isoformat() in dailyRows:
+                    parts.append(dailyRows[day.isoformat()])
+                    rows['daily'] += 1
+                elif self.isPrunedMonth(conn, self.getPeriodStart(day, 'monthly'), prunedMonths):
+                    # the day may have been rolled up with a month the window only partly covers,
+                    # summing the rest would quietly leave it out
+                    conn.close()
+                    return None
+                day += timedelta(days=1)
+        conn.close()
+
+        summary = {'start' : startDate, 'end' : endDate, 'days' : sum(part[2] for part in parts), 'rows' : rows}
+        # columns after PERIOD_START, LAST_DATE and DAYS are in METRICS order
+        for idx, metric in enumerate(self.METRICS):
+            values = [part[idx + 3] for part in parts if part[idx + 3] is not None]
+            if len(values) == 0:
+                summary[metric] = None
+            elif metric in self.CUMULATIVE_METRICS:
+                summary[metric] = values[-1]
+            else:
+                summary[metric] = sum(values)
+        return summary
+
+
+    # checks whether any day of a month was pruned after being rolled up
+    # conn         : connection to the database
+    # monthStart   : date object of the first day of the month
+    # prunedMonths : dict of month start to result, filled as months are checked
+    # return       : True if the month was rolled up and has fewer daily rows than days with data
+    def isPrunedMonth(self, conn, monthStart, prunedMonths):
+        if monthStart not in prunedMonths:
+            month = {'start' : monthStart.isoformat(), 'startDay' : monthStart.toordinal(), 'endDay' : self.getPeriodEnd(monthStart, 'monthly').toordinal()}
+            try:
+                row = conn.execute(self.PRUNED_DAYS_QUERY, month).fetchone()
+            except sqlite3.OperationalError:
+                # database made before the aggregate tables existed
+                row = None
+            prunedMonths[monthStart] = row is not None and row[0] > 0
+        return prunedMonths[monthStart]
+
 
     # trends the new cases difference between X number of latest days in the database
     # NOTE - If one of the days new_cases entry is None, will ignore it but not load another day
     # days   : (optional) number of days to trend
     # return : float of trend between days
+    @memoized
     def getNewCasesTrend(self, days=3):
         # with only 1 or less entries, cannot get trend (difference)
         if days < 2:
             return 0
         # essentially a linear interpolation
         newCasesEachDay = []
-        # connects to database
-        conn = sqlite3.connect(self.dbFilename)
-        c = conn.cursor()
-        c.execute(self.LATEST_ENTRY_QUERY)
-        latestEntries = c.fetchmany(days)
-        for entry in latestEntries:
+        for entry in self.readLatestEntries(days):
             # NEW_CASES is in location 2, skips any None entries
             if entry[2] is not None:
                 newCasesEachDay.append(int(entry[2]))
-        conn.close()
         # gets difference between each day, and then averages them
         diffBetweenEachDay = []
         # too many None cases, so we don't have enough data
@@ -69,23 +370,263 @@ class DataAnalyzer:
     # NOTE - If one of the days new_cases entry is None, will ignore it but not load another day
     # days   : (optional) number of days to average
     # return : float of average of new_cases across the days
+    @memoized
     def getLatestNewCasesAverage(self, days=7):
         # cannot have zero or negative days
         if days < 1:
             return 0.0
-        
-        # connects to databse
-        conn = sqlite3.connect(self.dbFilename)
+
         newCasesEachDay = []
-        # connects to database
-        conn = sqlite3.connect(self.dbFilename)
-        c = conn.cursor()
-        c.execute(self.LATEST_ENTRY_QUERY)
-        latestEntries = c.fetchmany(days)
-        for entry in latestEntries:
+        for entry in self.readLatestEntries(days):
             # NEW_CASES is in location 2, skips any None entries
             if entry[2] is not None:
                 newCasesEachDay.append(int(entry[2]))
-        conn.close()
         # gets average of the new cases across the most recent X days
         return statistics.mean(newCasesEachDay)
+
+
+    # computes the statistics of every metric in one pass over the latest window of data
+    # NOTE - the window is two rolling periods plus a day so cumulative metrics can be differenced
+    # return : dict of statistics, with a nested dict per metric (None where there is not enough data)
+    @memoized
+    def computeStatistics(self):
+        windowDays = 2 * self.rollingDays + 1
+        entries = self.readLatestEntries(windowDays)
+
+        # builds every metric series (newest first) in a single pass over the rows
+        series = {metric: [] for metric in self.METRICS}
+        for rowIdx, entry in enumerate(entries):
+            for colIdx, metric in enumerate(self.METRICS, start=1):
+                value = entry[colIdx]
+                if metric in self.CUMULATIVE_METRICS:
+                    # daily change needs this day and the one before it
+                    if rowIdx + 1 >= len(entries):
+                        continue
+                    previous = entries[rowIdx + 1][colIdx]
+                    value = None if value is None or previous is None else value - previous
+                series[metric].append(value)
+
+        stats = {
+            'date' : entries[0][0] if len(entries) > 0 else None,
+            'latest_is_max_new_cases' : len(entries) > 0 and self.checkIfLatestIsMaxNewCases(),
+            'positivity_rate' : self.computePositivityRate(entries),
+            'doubling_time' : self.computeDoublingTime(entries),
+            'long_window' : self.computeLongWindowChange(entries[0][0]) if len(entries) > 0 else None,
+            'metrics' : {}
+        }
+        for metric in self.METRICS:
+            stats['metrics'][metric] = self.summarizeSeries(series[metric])
+        return stats
+
+
+    # summarizes a single metric series in one pass
+    # values : list of values (newest first), None where unknown
+    # return : dict of latest, rolling mean, previous rolling mean, week over week change (%), trend and z-score
+    def summarizeSeries(self, values):
+        latest = values[0] if len(values) > 0 else None
+        currentSum, currentCount = 0, 0
+        previousSum, previousCount = 0, 0
+        trendFirst, trendLast, trendCount = None, None, 0
+        # running mean/variance (welford) of the history before the latest value
+        historyCount, historyMean, historyM2 = 0, 0.0, 0.0
+        for idx, value in enumerate(values):
+            if value is None:
+                continue
+            if idx < self.rollingDays:
+                currentSum += value
+                currentCount += 1
+            elif idx < 2 * self.rollingDays:
+                previousSum += value
+                previousCount += 1
+            if idx < self.trendDays:
+                if trendFirst is None:
+                    trendFirst = value
+                trendLast = value
+                trendCount += 1
+            if idx > 0:
+                historyCount += 1
+                delta = value - historyMean
+                historyMean += delta / historyCount
+                historyM2 += delta * (value - historyMean)
+
+        summary = {
+            'latest' : latest,
+            'mean' : currentSum / currentCount if currentCount > 0 else None,
+            'previous_mean' : previousSum / previousCount if previousCount > 0 else None,
+            'week_over_week' : None,
+            # mean of the day-to-day differences telescopes to (first - last) / (n - 1)
+            'trend' : (trendFirst - trendLast) / (trendCount - 1) if trendCount >= 2 else None,
+            'z_score' : None
+        }
+        if summary['mean'] is not None and summary['previous_mean']:
+            summary['week_over_week'] = 100.0 * (summary['mean'] - summary['previous_mean']) / summary['previous_mean']
+        if latest is not None and historyCount >= 2:
+            stdev = math.sqrt(historyM2 / historyCount)
+            if stdev > 0:
+                summary['z_score'] = (latest - historyMean) / stdev
+        return summary
+
+
+    # percentage of new tests that were new cases over the latest rolling period
+    # entries : list of DATA rows, newest first
+    # return  : float percent, or None if no days have both values
+    def computePositivityRate(self, entries):
+        newCases, newTests = 0, 0
+        for entry in entries[:self.rollingDays]:
+            # NEW_CASES is in location 2, NEW_TESTS in location 3
+            if entry[2] is not None and entry[3]:
+                newCases += entry[2]
+                newTests += entry[3]
+        if newTests == 0:
+            return None
+        return 100.0 * newCases / newTests
+
+
+    # compares the average daily new cases of the long window ending on a date to the window before it
+    # NOTE - the windows reach back past the daily retention, so they are read with getWindowSummary()
+    # latestDate : YYYY-MM-DD last day of the long window
+    # return     : dict of 'mean_new_cases', 'previous_mean_new_cases' and 'change' (%), None where a
+    #              window has data for less than half of its days or can not be summarized
+    def computeLongWindowChange(self, latestDate):
+        end = date.fromisoformat(latestDate)
+        windows = []
+        for idx in range(2):
+            windowEnd = end - timedelta(days=idx * self.longWindowDays)
+            summary = self.getWindowSummary((windowEnd - timedelta(days=self.longWindowDays - 1)).isoformat(), windowEnd.isoformat())
+            enoughDays = summary is not None and summary['new_cases'] is not None and 2 * summary['days'] >= self.longWindowDays
+            windows.append(summary['new_cases'] / summary['days'] if enoughDays else None)
+        change = None
+        if windows[0] is not None and windows[1]:
+            change = 100.0 * (windows[0] - windows[1]) / windows[1]
+        return {'mean_new_cases' : windows[0], 'previous_mean_new_cases' : windows[1], 'change' : change}
+
+
+    # number of days total cases take to double at the growth rate of the latest rolling period
+    # entries : list of DATA rows, newest first
+    # return  : float days, or None if not growing or not enough data
+    def computeDoublingTime(self, entries):
+        if len(entries) <= self.rollingDays:
+            return None
+        # TOTAL_CASES is in location 1
+        latest, past = entries[0][1], entries[self.rollingDays][1]
+        if latest is None or past is None or past <= 0 or latest <= past:
+            return None
+        return self.rollingDays * math.log(2) / math.log(latest / past)
+
+
+    # the latest day is the highest new cases ever
+    # stats  : statistics from computeStatistics()
+    # return : list of (importance, fact) tuples
+    def ruleLatestIsMaxNewCases(self, stats):
+        if stats['latest_is_max_new_cases']:
+            return [(100, "Today is the highest number of new cases yet")]
+        return []
+
+
+    # any metric that is far outside of its recent history
+    # stats  : statistics from computeStatistics()
+    # return : list of (importance, fact) tuples
+    def ruleAnomalies(self, stats):
+        facts = []
+        for metric in self.METRICS:
+            if metric == 'total_cases':
+                # same series as new cases
+                continue
+            zScore = stats['metrics'][metric]['z_score']
+            if zScore is None or abs(zScore) < self.anomalyZScore:
+                continue
+            direction = 'high' if zScore > 0 else 'low'
+            facts.append((80 + min(abs(zScore), 10), f'Today\'s {self.METRIC_NAMES[metric]} are unusually {direction} ({zScore:+.1f} std devs)'))
+        return facts
+
+
+    # how fast total cases are doubling
+    # stats  : statistics from computeStatistics()
+    # return : list of (importance, fact) tuples
+    def ruleDoublingTime(self, stats):
+        doublingTime = stats['doubling_time']
+        if doublingTime is None:
+            return []
+        # faster doubling is more important
+        importance = 70 if doublingTime < 14 else 30
+        return [(importance, f'Total cases are doubling every {doublingTime:.1f} days')]
+
+
+    # the short trend of new cases to see if we're going up or down
+    # stats  : statistics from computeStatistics()
+    # return : list of (importance, fact) tuples
+    def ruleNewCasesTrend(self, stats):
+        trend = stats['metrics']['new_cases']['trend']
+        if not trend:
+            return []
+        return [(50, f'The {self.trendDays}-day trend of new cases is {trend:.2f}/day')]
+
+
+    # change of each metric's rolling mean compared to the period before it
+    # stats  : statistics from computeStatistics()
+    # return : list of (importance, fact) tuples
+    def ruleWeekOverWeekChange(self, stats):
+        facts = []
+        for metric in self.METRICS:
+            if metric == 'total_cases':
+                # same series as new cases
+                continue
+            change = stats['metrics'][metric]['week_over_week']
+            if change is None or abs(change) < 10:
+                continue
+            direction = 'up' if change > 0 else 'down'
+            facts.append((40 + min(abs(change) / 10, 30), f'The {self.rollingDays}-day average of {self.METRIC_NAMES[metric]} is {direction} {abs(change):.0f}% from the period before'))
+        return facts
+
+
+    # change of new cases over the long window, which smooths out weekly reporting patterns
+    # stats  : statistics from computeStatistics()
+    # return : list of (importance, fact) tuples
+    def ruleLongWindowChange(self, stats):
+        longWindow = stats['long_window']
+        if longWindow is None or longWindow['change'] is None or abs(longWindow['change']) < 10:
+            return []
+        change = longWindow['change']
+        direction = 'up' if change > 0 else 'down'
+        return [(30 + min(abs(change) / 10, 20), f'New cases over the last {self.longWindowDays} days are {direction} {abs(change):.0f}% from the {self.longWindowDays} days before')]
+
+
+    # share of tests that came back positive
+    # stats  : statistics from computeStatistics()
+    # return : list of (importance, fact) tuples
+    def rulePositivityRate(self, stats):
+        positivityRate = stats['positivity_rate']
+        if positivityRate is None:
+            return []
+        return [(35, f'The {self.rollingDays}-day positivity rate is {positivityRate:.1f}%')]
+
+
+    # the rolling average to see what most days are
+    # stats  : statistics from computeStatistics()
+    # return : list of (importance, fact) tuples
+    def ruleNewCasesAverage(self, stats):
+        average = stats['metrics']['new_cases']['mean']
+        if not average:
+            return []
+        return [(20, f'The {self.rollingDays}-day average of new cases is {average:.2f}/day')]
+
+
+    # runs every analysis rule over one set of statistics and ranks the resulting facts
+    # maxFacts : (optional) maximum number of facts to return
+    # return   : list of (importance, fact) tuples, most important first
+    @memoized
+    def getRankedFactTuples(self, maxFacts=3):
+        stats = self.computeStatistics()
+        facts = []
+        for ruleName in self.rules:
+            facts.extend(getattr(self, ruleName)(stats))
+        # stable sort keeps rule order for facts of equal importance
+        facts.sort(key=lambda fact: fact[0], reverse=True)
+        return facts[:maxFacts]
+
+
+    # ranked facts without their importance
+    # maxFacts : (optional) maximum number of facts to return
+    # return   : list of fact strings, most important first
+    def getRankedFacts(self, maxFacts=3):
+        return [fact[1] for fact in self.getRankedFactTuples(maxFacts)]
@@ -0,0 +1,74 @@
+# in-process caching helpers shared by the reader and analyzer
+# Copyright Michael Kukar 2020. MIT License.
+
+import os, threading
+from collections import OrderedDict
+
+# data version counter per database file, bumped on every successful insert
+_dataVersions = {}
+_dataVersionsLock = threading.Lock()
+
+
+# gets the current data version of a database file
+# dbFilename : sqlite database file
+# return     : int version, 0 if nothing has been written by this process
+def getDataVersion(dbFilename):
+    with _dataVersionsLock:
+        return _dataVersions.get(os.path.abspath(dbFilename), 0)
+
+
+# marks a database file as changed so any cached results for it are invalidated
+# dbFilename : sqlite database file
+# return     : int new version
+def bumpDataVersion(dbFilename):
+    key = os.path.abspath(dbFilename)
+    with _dataVersionsLock:
+        _dataVersions[key] = _dataVersions.get(key, 0) + 1
+        return _dataVersions[key]
+
+
+class LRUCache:
+
+    # maxSize : maximum number of entries before the least recently used is evicted
+    def __init__(self, maxSize=128):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+    # looks up a cached value
+    # key    : hashable key
+    # return : (True, value) if cached, (False, None) otherwise
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, self.entries[key]
+
+
+    # stores a value, evicting the least recently used entry if full
+    # key    : hashable key
+    # value  : value to cache
+    # return : None
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+
+
+    # removes every cached value
+    # return : None
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,200 @@
+# fixed-width, memory-mapped binary snapshot of the DATA table
+# lets the analyzer start up without rebuilding its state from sqlite
+# Copyright Michael Kukar 2020. MIT License.
+
+import os, sys, mmap, struct, sqlite3
+from array import array
+from datetime import date
+
+from entry_record import EntryRecord
+
+class DataSnapshot:
+
+    SNAPSHOT_EXTENSION = ".snap"
+
+    # file layout:
+    #   header  : magic, format version, byte order (0 little, 1 big), row count
+    #   columns : one int64 column per entry of COLUMNS, each ROW COUNT long
+    # dates are stored as day ordinals (date.toordinal()), rows are oldest first
+    MAGIC = b'C19S'
+    FORMAT_VERSION = 1
+    HEADER_FORMAT = '<4sIII'
+    HEADER_SIZE = 16
+    VALUE_SIZE = 8
+
+    COLUMNS = list(EntryRecord._fields)
+
+    # all stored values are non-negative, so -1 stands in for None
+    MISSING_VALUE = -1
+
+    SNAPSHOT_QUERY = "SELECT DAY, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS from DATA ORDER BY DAY ASC"
+
+
+    def __init__(self, snapshotFilename):
+        self.snapshotFilename = snapshotFilename
+        self.rowCount = 0
+        self.file = None
+        self.map = None
+        self.view = None
+        self.columns = {}
+
+
+    # gets the default snapshot filename that sits next to a database file
+    # dbFilename : sqlite database file
+    # return     : snapshot filename string
+    @staticmethod
+    def getDefaultFilename(dbFilename):
+        return str(dbFilename) + DataSnapshot.SNAPSHOT_EXTENSION
+
+
+    # checks if the snapshot is missing or older than the database it was made from
+    # dbFilename       : sqlite database file
+    # snapshotFilename : snapshot file
+    # return           : true if the snapshot should not be trusted, false otherwise
+    @staticmethod
+    def isStale(dbFilename, snapshotFilename):
+        if not os.path.exists(snapshotFilename):
+            return True
+        try:
+            dbMtime = os.path.getmtime(dbFilename)
+            # in WAL mode new rows land in the -wal file until the next checkpoint
+            if os.path.exists(dbFilename + "-wal"):
+                dbMtime = max(dbMtime, os.path.getmtime(dbFilename + "-wal"))
+            return os.path.getmtime(snapshotFilename) < dbMtime
+        except OSError:
+            return True
+
+
+    # exports the DATA table of a database into a snapshot file
+    # NOTE - writes to a temporary file first so open readers never see a partial snapshot
+    # dbFilename       : sqlite database file to read
+    # snapshotFilename : snapshot file to write
+    # return           : true on success, false on error
+    @staticmethod
+    def writeFromDatabase(dbFilename, snapshotFilename):
+        try:
+            conn = sqlite3.connect(dbFilename)
+            rows = conn.execute(DataSnapshot.SNAPSHOT_QUERY).fetchall()
+            conn.close()
+        except Exception as e:
+            return False
+
+        columns = [array('q') for field in DataSnapshot.COLUMNS]
+        try:
+            for row in rows:
+                # already a day ordinal
+                columns[0].append(row[0])
+                for idx in range(1, len(DataSnapshot.COLUMNS)):
+                    value = row[idx]
+                    columns[idx].append(DataSnapshot.MISSING_VALUE if value is None else int(value))
+        except Exception as e:
+            return False
+
+        header = struct.pack(
+            DataSnapshot.HEADER_FORMAT,
+            DataSnapshot.MAGIC,
+            DataSnapshot.FORMAT_VERSION,
+            0 if sys.byteorder == 'little' else 1,
+            len(rows)
+        )
+        # unique per process, as several sharded workers may rebuild the same snapshot at once
+        tempFilename = snapshotFilename + "." + str(os.getpid()) + ".tmp"
+        try:
+            with open(tempFilename, 'wb') as f:
+                f.write(header.ljust(DataSnapshot.HEADER_SIZE, b'\0'))
+                for column in columns:
+                    column.tofile(f)
+            os.replace(tempFilename, snapshotFilename)
+        except Exception as e:
+            if os.path.exists(tempFilename):
+                os.remove(tempFilename)
+            return False
+        return True
+
+
+    # maps the snapshot file into memory
+    # return : true on success, false if the file is missing or invalid
+    def open(self):
+        self.close()
+        try:
+            self.file = open(self.snapshotFilename, 'rb')
+            size = os.fstat(self.file.fileno()).st_size
+            if size < self.HEADER_SIZE:
+                self.close()
+                return False
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            # the map keeps its own handle, so the file does not need to stay open
+            self.file.close()
+            self.file = None
+            magic, version, byteOrder, rowCount = struct.unpack_from(self.HEADER_FORMAT, self.map, 0)
+            nativeOrder = 0 if sys.byteorder == 'little' else 1
+            expectedSize = self.HEADER_SIZE + rowCount * self.VALUE_SIZE * len(self.COLUMNS)
+            if magic != self.MAGIC or version != self.FORMAT_VERSION or byteOrder != nativeOrder or size != expectedSize:
+                self.close()
+                return False
+        except Exception as e:
+            self.close()
+            return False
+
+        # each column is a zero-copy int64 view into the mapped file
+        self.rowCount = rowCount
+        self.view = memoryview(self.map)
+        columnBytes = rowCount * self.VALUE_SIZE
+        for idx, field in enumerate(self.COLUMNS):
+            start = self.HEADER_SIZE + idx * columnBytes
+            self.columns[field] = self.view[start:start + columnBytes].cast('q')
+        return True
+
+
+    # releases the memory map and file handle
+    # return : None
+    def close(self):
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        self.rowCount = 0
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+    # checks if the snapshot is currently mapped
+    # return : true if open, false otherwise
+    def isOpen(self):
+        return self.map is not None
+
+
+    # gets a column of the snapshot without copying it
+    # field  : name from COLUMNS
+    # return : int64 memoryview (oldest first), MISSING_VALUE in place of None
+    def getColumn(self, field):
+        return self.columns[field]
+
+
+    # reads the X latest entries, in the same shape as the DATA query rows
+    # count  : number of entries to read
+    # return : list of EntryRecords, newest first
+    def getLatestEntries(self, count):
+        entries = []
+        if count < 1:
+            return entries
+        for rowIdx in range(self.rowCount - 1, max(self.rowCount - count, 0) - 1, -1):
+            entries.append(self.getEntry(rowIdx))
+        return entries
+
+
+    # reads a single row of the snapshot
+    # rowIdx : index of the row, 0 being the oldest
+    # return : EntryRecord
+    def getEntry(self, rowIdx):
+        entry = [date.fromordinal(self.columns['date'][rowIdx]).isoformat()]
+        for field in self.COLUMNS[1:]:
+            value = self.columns[field][rowIdx]
+            entry.append(None if value == self.MISSING_VALUE else value)
+        return EntryRecord._make(entry)
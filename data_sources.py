@@ -0,0 +1,261 @@
+# sources the latest entry can be read from: the county status page, or structured open-data feeds
+# feeds are parsed a row at a time straight into EntryRecords, so no page or document tree is built
+# Copyright Michael Kukar 2020. MIT License.
+
+import csv, json
+from datetime import datetime, timezone
+
+from entry_record import EntryRecord
+
+class DataSource:
+
+    # url : (optional) url of the source, defaults to the reader's SD_COVID19_URL
+    def __init__(self, url=None):
+        self.url = url
+
+
+    # reads the date of the latest entry the source has
+    # webReader : WebReader used to fetch the source
+    # url       : url to read from
+    # return    : YYYY-MM-DD string, raises on error
+    def readLatestDate(self, webReader, url):
+        return self.readLatestEntry(webReader, url)['date']
+
+
+    # reads the latest entry the source has
+    # webReader : WebReader used to fetch the source
+    # url       : url to read from
+    # return    : dict entry (fields the source does not have are None), raises on error
+    def readLatestEntry(self, webReader, url):
+        raise NotImplementedError()
+
+
+    # reads every entry newer than a date, e.g. to backfill a database
+    # webReader : WebReader used to fetch the source
+    # url       : url to read from
+    # sinceDate : (optional) YYYY-MM-DD date, only entries after it are read
+    # return    : list of EntryRecords, oldest first, raises on error
+    def readEntries(self, webReader, url, sinceDate=None):
+        record, problems = EntryRecord.parse(self.readLatestEntry(webReader, url))
+        if record is None or (sinceDate is not None and record.date <= sinceDate):
+            return []
+        return [record]
+
+
+class HtmlPageSource(DataSource):
+
+    # parses html source into a searchable tree
+    # NOTE - bs4 (and lxml) are only imported here, they are the slowest imports of a poll
+    # source : bytes or string of the page
+    # return : BeautifulSoup object
+    @staticmethod
+    def parsePage(source):
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(source, "lxml")
+
+
+    # finds the rows of the status table and the date they are through
+    # bs     : BeautifulSoup object of the page
+    # return : (list of table rows, YYYY-MM-DD date string) tuple
+    @staticmethod
+    def readTable(bs):
+        # location of date is in a string located at
+        # table -> tr -> td -> "table updated X, with date through Y"
+        table = bs.find("table")
+        # gets first td in the first tr
+        table_rows = table.tbody.find_all("tr")
+        td = table_rows[0].find_all("td")[0]
+        # extract the date after "with data through"
+        rawDateStr = str(td).split("with data through ")[1]
+        rawDateStr = rawDateStr.split(".</i>")[0]
+        return table_rows, datetime.strptime(rawDateStr, '%B %d, %Y').strftime('%Y-%m-%d')
+
+
+    def readLatestDate(self, webReader, url):
+        return self.readTable(self.parsePage(webReader.fetchPage(url)))[1]
+
+
+    def readLatestEntry(self, webReader, url):
+        dataDict = {
+            'date' : None,
+            'total_cases' : None,
+            'new_cases' : None,
+            'new_tests' : None,
+            'hospitalizations' : None,
+            'intensive_care' : None,
+            'deaths' : None
+        }
+        table_rows, dataDict['date'] = self.readTable(self.parsePage(webReader.fetchPage(url)))
+        # extracts the rest of the data available
+        for row in table_rows:
+            tds = row.find_all("td")
+            if "Total Positives" in tds[0].text:
+                dataDict['total_cases'] = int(tds[1].text.replace(',',''))
+            elif "Hospitalizations" in tds[0].text:
+                dataDict['hospitalizations'] = int(tds[1].text.replace(',',''))
+            elif "Intensive Care" in tds[0].text:
+                dataDict['intensive_care'] = int(tds[1].text.replace(',',''))
+            elif "Deaths" in tds[0].text:
+                dataDict['deaths'] = int(tds[1].text.replace(',',''))
+        return dataDict
+
+
+# feed with one row per day, e.g. an open-data portal export
+class FeedSource(DataSource):
+
+    # url        : url of the feed
+    # fields     : (optional) dict of entry field to feed column, nested json keys are joined by dots
+    #              (e.g. 'attributes.Date'), fields left out are read from the column of the same name
+    # dateFormat : (optional) strptime format of the date column, or 'epoch_ms', defaults to
+    #              YYYY-MM-DD (anything after the date, e.g. a time, is ignored)
+    def __init__(self, url, fields=None, dateFormat=None):
+        DataSource.__init__(self, url)
+        self.fields = {field: field for field in EntryRecord._fields}
+        if fields is not None:
+            self.fields.update(fields)
+        self.dateFormat = dateFormat
+
+
+    # reads the rows of the feed one at a time
+    # webReader : WebReader used to fetch the feed
+    # url       : url to read from
+    # return    : iterator of rows (dicts), raises on error
+    def readRows(self, webReader, url):
+        raise NotImplementedError()
+
+
+    # gets a (possibly nested) column of a row
+    # row    : dict row of the feed
+    # column : column name, nested keys joined by dots
+    # return : value, or None if the row does not have it
+    @staticmethod
+    def getColumn(row, column):
+        value = row
+        for key in column.split('.'):
+            if not isinstance(value, dict) or key not in value:
+                return None
+            value = value[key]
+        return value
+
+
+    # converts a feed row into a dict entry
+    # row    : dict row of the feed
+    # return : dict entry, its date None if it could not be read
+    def getEntry(self, row):
+        entry = {field: self.getColumn(row, column) for field, column in self.fields.items()}
+        rawDate = entry['date']
+        try:
+            if self.dateFormat == 'epoch_ms':
+                entry['date'] = datetime.fromtimestamp(int(rawDate) / 1000, timezone.utc).strftime('%Y-%m-%d')
+            elif self.dateFormat is not None:
+                entry['date'] = datetime.strptime(str(rawDate).strip(), self.dateFormat).strftime('%Y-%m-%d')
+            else:
+                entry['date'] = datetime.strptime(str(rawDate).strip()[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+        except (ValueError, TypeError, OverflowError):
+            entry['date'] = None
+        return entry
+
+
+    # NOTE - the feed may be in any order, only the newest row is kept while reading it
+    def readLatestEntry(self, webReader, url):
+        latestEntry = None
+        for row in self.readRows(webReader, url):
+            entry = self.getEntry(row)
+            if entry['date'] is not None and (latestEntry is None or entry['date'] > latestEntry['date']):
+                latestEntry = entry
+        if latestEntry is None:
+            raise ValueError("no dated rows in feed " + url)
+        return latestEntry
+
+
+    # NOTE - rows that do not parse are skipped, a date listed twice keeps its last row
+    def readEntries(self, webReader, url, sinceDate=None):
+        records = {}
+        for row in self.readRows(webReader, url):
+            entry = self.getEntry(row)
+            if entry['date'] is None or (sinceDate is not None and entry['date'] <= sinceDate):
+                continue
+            record, problems = EntryRecord.parse(entry)
+            if record is not None:
+                records[record.date] = record
+        return [records[recordDate] for recordDate in sorted(records)]
+
+
+class CsvFeedSource(FeedSource):
+
+    # NOTE - the first line of the feed holds the column names
+    def readRows(self, webReader, url):
+        return csv.DictReader(webReader.readPageLines(url))
+
+
+class JsonLinesFeedSource(FeedSource):
+
+    # NOTE - one json object per line
+    def readRows(self, webReader, url):
+        for line in webReader.readPageLines(url):
+            if line.strip() != '':
+                yield json.loads(line)
+
+
+class JsonFeedSource(FeedSource):
+
+    # url        : url of the feed
+    # fields     : (optional) see FeedSource
+    # dateFormat : (optional) see FeedSource
+    # records    : (optional) key of the list of rows in the document, nested keys joined by dots
+    #              (e.g. 'features'), defaults to the document being the list
+    def __init__(self, url, fields=None, dateFormat=None, records=None):
+        FeedSource.__init__(self, url, fields=fields, dateFormat=dateFormat)
+        self.records = records
+
+
+    # NOTE - the json module can only decode a whole document, so the document is read at once and
+    #        its rows converted one at a time, use a csv or json lines feed for very large exports
+    def readRows(self, webReader, url):
+        document = json.loads(webReader.fetchPage(url))
+        rows = document if self.records is None else self.getColumn(document, self.records)
+        if not isinstance(rows, list):
+            raise ValueError("no list of rows in feed " + url)
+        return iter(rows)
+
+
+# required fields of each source type in the config file
+SOURCE_REQUIRED_FIELDS = {
+    'html' : [],
+    'csv' : ['url'],
+    'json' : ['url'],
+    'jsonl' : ['url']
+}
+
+
+# checks a source config file entry without creating the source
+# sourceConfig : dict with 'type' and that type's fields
+# return       : true if the entry is complete, false otherwise
+def isValidSourceConfig(sourceConfig):
+    if not isinstance(sourceConfig, dict):
+        return False
+    sourceType = sourceConfig.get('type')
+    if sourceType not in SOURCE_REQUIRED_FIELDS:
+        return False
+    for field in SOURCE_REQUIRED_FIELDS[sourceType]:
+        if field not in sourceConfig:
+            return False
+    if not isinstance(sourceConfig.get('fields', {}), dict):
+        return False
+    return True
+
+
+# creates a source from its config file entry
+# sourceConfig : dict with 'type' and that type's fields
+# return       : DataSource, or None if the config is invalid
+def createSource(sourceConfig):
+    if not isValidSourceConfig(sourceConfig):
+        return None
+    sourceType = sourceConfig['type']
+    if sourceType == 'html':
+        return HtmlPageSource(sourceConfig.get('url'))
+    elif sourceType == 'csv':
+        return CsvFeedSource(sourceConfig['url'], fields=sourceConfig.get('fields'), dateFormat=sourceConfig.get('date_format'))
+    elif sourceType == 'jsonl':
+        return JsonLinesFeedSource(sourceConfig['url'], fields=sourceConfig.get('fields'), dateFormat=sourceConfig.get('date_format'))
+    return JsonFeedSource(sourceConfig['url'], fields=sourceConfig.get('fields'), dateFormat=sourceConfig.get('date_format'), records=sourceConfig.get('records'))
@@ -1,8 +1,142 @@
 # sends "texts" through an email server
 # Copyright Michael Kukar 2020. MIT License.
 
-import smtplib
-from email.message import EmailMessage
+import threading, time
+
+
+class TokenBucket:
+
+    # rate     : tokens added per second
+    # capacity : most tokens the bucket holds (largest burst)
+    # now      : current clock time
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+
+    # refills the bucket for the time passed since the last call
+    # now    : current clock time
+    # return : None
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    # seconds until enough tokens are available
+    # NOTE - a cost larger than the capacity only needs a full bucket, the rest is taken as debt
+    # cost   : tokens needed
+    # now    : current clock time
+    # return : float seconds, 0 if available now
+    def getWait(self, cost, now):
+        self.refill(now)
+        needed = min(cost, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+
+    # takes tokens from the bucket
+    # cost   : tokens to take
+    # return : None
+    def consume(self, cost):
+        self.tokens -= cost
+
+
+class SendScheduler:
+
+    # sends per second and burst allowed by each gateway domain
+    DEFAULT_DOMAIN_LIMITS = {
+        'vtext.com' : {'rate' : 1.0, 'burst' : 5},
+        'tmomail.net' : {'rate' : 1.0, 'burst' : 5}
+    }
+    # used for domains not listed above (regular email)
+    DEFAULT_LIMIT = {'rate' : 5.0, 'burst' : 20}
+    # smtp messages per second and burst allowed per sending account
+    DEFAULT_SENDER_LIMIT = {'rate' : 2.0, 'burst' : 20}
+
+
+    # domainLimits : (optional) dict of domain to {'rate', 'burst'}, merged over DEFAULT_DOMAIN_LIMITS
+    # senderLimit  : (optional) {'rate', 'burst'} of each sending account
+    # clock        : (optional) function returning the current time in seconds
+    # sleep        : (optional) function that waits a number of seconds
+    # shares       : (optional) number of processes sending through the same accounts and gateways,
+    #                each one gets an equal share of every limit
+    def __init__(self, domainLimits=None, senderLimit=None, clock=time.monotonic, sleep=time.sleep, shares=1):
+        self.domainLimits = dict(self.DEFAULT_DOMAIN_LIMITS)
+        if domainLimits is not None:
+            self.domainLimits.update(domainLimits)
+        self.senderLimit = senderLimit if senderLimit is not None else self.DEFAULT_SENDER_LIMIT
+        self.clock = clock
+        self.sleep = sleep
+        self.shares = max(shares, 1)
+        self.lock = threading.Lock()
+        self.domainBuckets = {}
+        self.senderBuckets = {}
+        # metrics
+        self.queueDepth = {}
+        self.sent = {}
+        self.totalWait = {}
+        self.maxWait = {}
+
+
+    # gets (creating if needed) the bucket of a key
+    # buckets : dict of key to TokenBucket
+    # key     : domain or sender
+    # limit   : {'rate', 'burst'} for a new bucket
+    # return  : TokenBucket
+    def getBucket(self, buckets, key, limit):
+        if key not in buckets:
+            buckets[key] = TokenBucket(limit['rate'] / self.shares, max(limit['burst'] / self.shares, 1), self.clock())
+        return buckets[key]
+
+
+    # blocks until a send to a domain from a sender is allowed by both of their limits
+    # domain     : gateway domain of the recipients
+    # sender     : sending account
+    # recipients : (optional) number of recipients in the message, each uses a domain token
+    # return     : float seconds waited
+    def acquire(self, domain, sender, recipients=1):
+        start = self.clock()
+        with self.lock:
+            self.queueDepth[domain] = self.queueDepth.get(domain, 0) + 1
+        try:
+            while True:
+                with self.lock:
+                    now = self.clock()
+                    domainBucket = self.getBucket(self.domainBuckets, domain, self.domainLimits.get(domain, self.DEFAULT_LIMIT))
+                    senderBucket = self.getBucket(self.senderBuckets, sender, self.senderLimit)
+                    wait = max(domainBucket.getWait(recipients, now), senderBucket.getWait(1, now))
+                    if wait <= 0:
+                        domainBucket.consume(recipients)
+                        senderBucket.consume(1)
+                        waited = now - start
+                        self.sent[domain] = self.sent.get(domain, 0) + recipients
+                        self.totalWait[domain] = self.totalWait.get(domain, 0.0) + waited
+                        self.maxWait[domain] = max(self.maxWait.get(domain, 0.0), waited)
+                        return waited
+                self.sleep(wait)
+        finally:
+            with self.lock:
+                self.queueDepth[domain] -= 1
+
+
+    # gets queue depth and wait time metrics per domain
+    # return : dict of domain to {'queue_depth', 'sent', 'average_wait_secs', 'max_wait_secs'}
+    def getMetrics(self):
+        with self.lock:
+            metrics = {}
+            for domain in set(self.queueDepth) | set(self.sent):
+                sent = self.sent.get(domain, 0)
+                metrics[domain] = {
+                    'queue_depth' : self.queueDepth.get(domain, 0),
+                    'sent' : sent,
+                    'average_wait_secs' : self.totalWait.get(domain, 0.0) / sent if sent > 0 else 0.0,
+                    'max_wait_secs' : self.maxWait.get(domain, 0.0)
+                }
+            return metrics
+
 
 class EmailTexter:
 
@@ -11,17 +145,41 @@ class EmailTexter:
         'TMOBILE' : 'tmomail.net'
     }
 
+    # longest message each gateway delivers as a single text, anything else is treated as email
+    MAX_MESSAGE_LENGTHS = {
+        'vtext.com' : 160,
+        'tmomail.net' : 160
+    }
+    DEFAULT_MAX_MESSAGE_LENGTH = 1000
+
+    # optional SendScheduler every send waits on, None sends as fast as possible
+    sendScheduler = None
+
+
+    # waits for the send scheduler (if any) to allow a send
+    # emailAddrs : list of addresses of one message, all on the same domain
+    # server     : smtp server object, its login user is the sending account
+    # fromEmail  : email put as "from", used as the account if not logged in
+    # return     : None
+    def waitToSend(self, emailAddrs, server, fromEmail):
+        if self.sendScheduler is None:
+            return
+        self.sendScheduler.acquire(emailAddrs[0].split('@')[1], getattr(server, 'user', None) or fromEmail, recipients=len(emailAddrs))
+
 
     # gets the smtp server object to send emails
-    # NOTE - uses SSL
+    # NOTE - uses SSL unless told otherwise (e.g. for a local test server)
     # username : email username
     # password : email password
     # smtpUrl  : url of smtp server
     # port     : (optional) port of smtp server
+    # useSsl   : (optional) connects over SSL
     # return   : smtplib server object, or None on error
-    def initializeEmailServer(self, username, password, smtpUrl, port=465):
+    def initializeEmailServer(self, username, password, smtpUrl, port=465, useSsl=True):
         try:
-            server = smtplib.SMTP_SSL(smtpUrl, port)
+            # smtp and email stacks are only loaded when a server is actually needed
+            import smtplib
+            server = smtplib.SMTP_SSL(smtpUrl, port) if useSsl else smtplib.SMTP(smtpUrl, port)
             server.ehlo()
             server.login(username, password)
         except Exception as e:
@@ -42,6 +200,17 @@ class EmailTexter:
         return str(phoneNumber) + '@' + self.SUPPORTED_CARRIERS[carrier]
     
 
+    # gets the longest message that can be sent to an address as one text
+    # emailAddr : email to send to
+    # overrides : (optional) dict of domain to max length, takes priority over MAX_MESSAGE_LENGTHS
+    # return    : int max message length
+    def getMaxMessageLength(self, emailAddr, overrides=None):
+        domain = emailAddr.split('@')[-1]
+        if overrides is not None and domain in overrides:
+            return overrides[domain]
+        return self.MAX_MESSAGE_LENGTHS.get(domain, self.DEFAULT_MAX_MESSAGE_LENGTH)
+
+
     # sends email from phone number
     # emailAddr : email to send to
     # message   : message to send
@@ -50,6 +219,7 @@ class EmailTexter:
     # subject   : (optional) email subject to add
     # return    : true on success, false on fail
     def sendMessage(self, emailAddr, message, server, fromEmail='donotreply@GroceryGrabber.py', subject=None):
+        from email.message import EmailMessage
         msg = EmailMessage()
         # requires message and server
         if message is None or len(message) == 0:
@@ -64,5 +234,38 @@ class EmailTexter:
         msg['From'] = fromEmail
         msg['To'] = emailAddr
         msg.set_content(message)
+        self.waitToSend([emailAddr], server, fromEmail)
         server.send_message(msg)
         return True
+
+
+    # sends one email to many addresses at once, each only sees itself (blind copies)
+    # emailAddrs : list of emails to send to
+    # message    : message to send
+    # server     : smtp server object
+    # fromEmail  : (optional) email to put as "from"
+    # subject    : (optional) email subject to add
+    # return     : number of addresses the message was sent to
+    def sendBatchMessage(self, emailAddrs, message, server, fromEmail='donotreply@GroceryGrabber.py', subject=None):
+        from email.message import EmailMessage
+        msg = EmailMessage()
+        # requires message and server
+        if message is None or len(message) == 0:
+            return 0
+        if server is None:
+            return 0
+        # skips any invalid-ish emails (same check as sendMessage)
+        validAddrs = [addr for addr in emailAddrs if '@' in addr and '.' in addr.split('@')[1]]
+        if len(validAddrs) == 0:
+            return 0
+        if subject is not None:
+            msg['Subject'] = subject
+        msg['From'] = fromEmail
+        # recipients only go in the envelope so they are not shown to each other
+        msg['To'] = 'undisclosed-recipients:;'
+        msg.set_content(message)
+        # NOTE - assumes every address is on the same gateway, as SmtpChannel batches them
+        self.waitToSend(validAddrs, server, fromEmail)
+        # addresses the server refused are left out of the count, the others were still sent
+        refused = server.send_message(msg, to_addrs=validAddrs)
+        return len(validAddrs) - len(refused)
@@ -0,0 +1,88 @@
+# compact record of one day of data, shared by every module that reads or writes DATA rows
+# Copyright Michael Kukar 2020. MIT License.
+
+import datetime
+from collections.abc import Mapping
+from typing import NamedTuple, Optional
+
+# NOTE - fields are in the same order as the DATA columns, so a record is also a drop-in
+#        replacement for the row tuples of the DATA queries (entry[2] is still NEW_CASES)
+class EntryRecord(NamedTuple):
+
+    # YYYY-MM-DD, the one date representation stored and passed between modules
+    date: str
+    total_cases: Optional[int] = None
+    new_cases: Optional[int] = None
+    new_tests: Optional[int] = None
+    hospitalizations: Optional[int] = None
+    intensive_care: Optional[int] = None
+    deaths: Optional[int] = None
+
+
+    # sqlite row factory for queries selecting the DATA columns in field order
+    # cursor : sqlite3 cursor (unused)
+    # row    : tuple of column values
+    # return : EntryRecord
+    @staticmethod
+    def fromRow(cursor, row):
+        return EntryRecord._make(row)
+
+
+    # converts an entry (e.g. parsed from a page or a JSON dataset) into a record in one pass,
+    # converting each field once and collecting every problem
+    # NOTE - records are returned as is, they were already checked when created
+    # entry  : dict-like entry with every field (values may be None, blanks are treated as None)
+    # return : (EntryRecord or None, list of problem strings) tuple
+    @classmethod
+    def parse(cls, entry):
+        if isinstance(entry, cls):
+            return entry, []
+        if entry is None:
+            return None, ["page could not be parsed"]
+        if not isinstance(entry, Mapping):
+            return None, ["entry is not a mapping"]
+        problems = []
+        values = []
+        for field in cls._fields:
+            if field not in entry:
+                problems.append("missing field " + field)
+                continue
+            value = entry[field]
+            if value == '':
+                value = None
+            if field == 'date':
+                try:
+                    # normalizes the date, e.g. a datetime.date or padded string
+                    value = datetime.date.fromisoformat(str(value)).isoformat()
+                except ValueError:
+                    problems.append("missing or invalid date: " + str(value))
+            elif value is not None:
+                try:
+                    value = int(value)
+                except (ValueError, TypeError):
+                    problems.append("invalid " + field + ": " + str(value))
+                    continue
+                if value < 0:
+                    problems.append("invalid " + field + ": " + str(value))
+            values.append(value)
+        if len(problems) > 0:
+            return None, problems
+        return cls._make(values), []
+
+
+    # gets the date for date arithmetic
+    # return : datetime.date object
+    def getDate(self):
+        return datetime.date.fromisoformat(self.date)
+
+
+    # gets the date as a day ordinal, as stored in the DATA DAY column
+    # return : integer, date.toordinal() of the date
+    def getDay(self):
+        return datetime.date.fromisoformat(self.date).toordinal()
+
+
+    # converts the record into a dict, e.g. for json
+    # return : dict of field to value
+    def toDict(self):
+        return self._asdict()
@@ -0,0 +1,118 @@
+# in-process publish/subscribe bus, each subscriber runs on its own worker thread
+# Copyright Michael Kukar 2020. MIT License.
+
+import threading, queue, traceback
+
+class EventBus:
+
+    # published by WebReader after an entry is stored, payload is the EntryRecord
+    ENTRY_ADDED = 'entry_added'
+
+    # marks the end of a subscriber's queue
+    STOP = object()
+
+
+    def __init__(self):
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        # runs callbacks inline on the publisher's thread instead, e.g. when profiling
+        self.synchronous = False
+
+
+    # registers a callback for an event
+    # NOTE - callbacks run on the subscriber's own thread in publish order, so a slow
+    #        subscriber only delays itself and never the publisher or other subscribers
+    # eventName : name of the event to receive
+    # callback  : function called with the event payload
+    # name      : (optional) name of the worker thread
+    # return    : subscriber object, used to unsubscribe
+    def subscribe(self, eventName, callback, name=None):
+        subscriber = EventSubscriber(callback, name if name is not None else getattr(callback, '__name__', 'subscriber'))
+        with self.lock:
+            # copy on write so publish never holds the lock while queueing
+            self.subscribers[eventName] = self.subscribers.get(eventName, []) + [subscriber]
+        subscriber.start()
+        return subscriber
+
+
+    # removes a subscriber and stops its worker once its queue is drained
+    # eventName  : name of the event it subscribed to
+    # subscriber : object returned by subscribe()
+    # return     : None
+    def unsubscribe(self, eventName, subscriber):
+        with self.lock:
+            self.subscribers[eventName] = [s for s in self.subscribers.get(eventName, []) if s is not subscriber]
+        subscriber.stop()
+
+
+    # queues an event for every subscriber without waiting for any of them
+    # eventName : name of the event
+    # payload   : (optional) object passed to each callback
+    # return    : number of subscribers the event was queued for
+    def publish(self, eventName, payload=None):
+        subscribers = self.subscribers.get(eventName, [])
+        for subscriber in subscribers:
+            if self.synchronous:
+                subscriber.handle(payload)
+            else:
+                subscriber.queue.put_nowait(payload)
+        return len(subscribers)
+
+
+    # waits until every subscriber has handled all events published so far
+    # return : None
+    def waitUntilIdle(self):
+        for subscribers in list(self.subscribers.values()):
+            for subscriber in subscribers:
+                subscriber.queue.join()
+
+
+    # stops every subscriber once its queue is drained
+    # return : None
+    def close(self):
+        with self.lock:
+            allSubscribers = [s for subscribers in self.subscribers.values() for s in subscribers]
+            self.subscribers = {}
+        for subscriber in allSubscribers:
+            subscriber.stop()
+
+
+class EventSubscriber:
+
+    # callback : function called with each event payload
+    # name     : name of the worker thread
+    def __init__(self, callback, name):
+        self.callback = callback
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+
+
+    def start(self):
+        self.thread.start()
+
+
+    def stop(self):
+        self.queue.put_nowait(EventBus.STOP)
+
+
+    # runs the callback, a failing callback is reported but does not stop later events
+    # payload : event payload
+    # return  : None
+    def handle(self, payload):
+        try:
+            self.callback(payload)
+        except Exception as e:
+            print("ERROR: event subscriber " + self.thread.name + " failed: " + str(e))
+            traceback.print_exc()
+
+
+    # worker loop
+    def run(self):
+        while True:
+            payload = self.queue.get()
+            try:
+                if payload is EventBus.STOP:
+                    return
+                self.handle(payload)
+            finally:
+                self.queue.task_done()
@@ -4,6 +4,15 @@
 
 import sys, os, json
 import argparse, sqlite3
+from datetime import date, timedelta
+
+from data_snapshot import DataSnapshot
+from data_analyzer import DataAnalyzer
+from entry_record import EntryRecord
+from web_reader import WebReader
+from data_sources import createSource
+from subscriber_store import SubscriberStore
+from page_archive import PageArchive
 
 # for reference on how dataset JSON should be stored:
 # unknown fields can be left as empty ''
@@ -23,6 +32,7 @@ JSON_DATASET_EXAMPLE = {
 
 CREATE_DATA_TABLE_CMD = ("CREATE TABLE DATA "
     "(ID INTEGER PRIMARY KEY,"
+    "DAY INTEGER NOT NULL,"
     "DATE CHAR(10) NOT NULL UNIQUE,"
     "TOTAL_CASES INTEGER,"
     "NEW_CASES INTEGER,"
@@ -33,8 +43,83 @@ CREATE_DATA_TABLE_CMD = ("CREATE TABLE DATA "
     ");"
     )
 
+# when each entry was stored by the updater, imported entries are not logged
+CREATE_UPDATE_LOG_TABLE_CMD = ("CREATE TABLE IF NOT EXISTS UPDATE_LOG "
+    "(ID INTEGER PRIMARY KEY,"
+    "DATE CHAR(10) NOT NULL,"
+    "INSERTED_AT INTEGER NOT NULL"
+    ");"
+    )
+
+# old daily rows rolled up per week (starting monday) and per month, see DataAnalyzer.AGGREGATE_TABLES
+CREATE_AGGREGATE_TABLE_CMD = ("CREATE TABLE IF NOT EXISTS {table} "
+    "(PERIOD_START CHAR(10) PRIMARY KEY,"
+    "LAST_DATE CHAR(10) NOT NULL,"
+    "DAYS INTEGER NOT NULL,"
+    "TOTAL_CASES INTEGER,"
+    "NEW_CASES INTEGER,"
+    "NEW_TESTS INTEGER,"
+    "HOSPITALIZATIONS INTEGER,"
+    "INTENSIVE_CARE INTEGER,"
+    "DEATHS INTEGER,"
+    "MAX_NEW_CASES INTEGER"
+    ");"
+    )
+
 ENTRY_QUERY = "SELECT DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS from DATA"
 
+# a period is only rolled up once, after it has ended, so later runs never overwrite it with the pruned remainder
+ADD_AGGREGATE_CMD = ("INSERT OR IGNORE INTO {table} "
+    "(PERIOD_START, LAST_DATE, DAYS, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS, MAX_NEW_CASES) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+
+# reparsed entries replace the stored entry of their date, fields the page does not have keep their stored value
+REPLACE_ENTRY_CMD = ("INSERT INTO DATA (DAY, DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (DATE) DO UPDATE SET TOTAL_CASES = COALESCE(excluded.TOTAL_CASES, TOTAL_CASES), "
+    "NEW_CASES = COALESCE(excluded.NEW_CASES, NEW_CASES), NEW_TESTS = COALESCE(excluded.NEW_TESTS, NEW_TESTS), "
+    "HOSPITALIZATIONS = COALESCE(excluded.HOSPITALIZATIONS, HOSPITALIZATIONS), "
+    "INTENSIVE_CARE = COALESCE(excluded.INTENSIVE_CARE, INTENSIVE_CARE), DEATHS = COALESCE(excluded.DEATHS, DEATHS)"
+    )
+# the status page has no new cases, so like the updater they are the change from the previous stored day
+FILL_NEW_CASES_CMD = ("UPDATE DATA SET NEW_CASES = TOTAL_CASES - "
+    "COALESCE((SELECT PREVIOUS.TOTAL_CASES FROM DATA AS PREVIOUS WHERE PREVIOUS.DAY < DATA.DAY ORDER BY PREVIOUS.DAY DESC LIMIT 1), 0) "
+    "WHERE DAY = ?"
+    )
+
+DEFAULT_RETENTION_DAYS = 365
+DEFAULT_WEEKLY_RETENTION_DAYS = 3 * 365
+
+
+# creates every table of a new database
+# conn   : sqlite3 connection to the new database
+# return : None
+def createTables(conn):
+    conn.execute(CREATE_DATA_TABLE_CMD)
+    conn.execute(WebReader.CREATE_DAY_INDEX_COMMAND)
+    conn.execute(CREATE_UPDATE_LOG_TABLE_CMD)
+    for table in DataAnalyzer.AGGREGATE_TABLES.values():
+        conn.execute(CREATE_AGGREGATE_TABLE_CMD.format(table=table))
+    conn.execute(SubscriberStore.CREATE_TABLE_COMMAND)
+    conn.execute(SubscriberStore.CREATE_INDEX_COMMAND)
+
+# reads a JSON dataset (see JSON_DATASET_EXAMPLE, dates as MMDDYYYY) into records
+# filename : JSON dataset file
+# return   : list of EntryRecords in file order, raises on error
+def readDataset(filename):
+    with open(filename) as f:
+        jsondata = json.load(f)
+    records = []
+    for entry in jsondata['data']:
+        # changes date to YYYY-MM-DD FROM MMDDYYYY
+        entry['date'] = entry['date'][4:] + '-'+ entry['date'][0:2] + '-' + entry['date'][2:4]
+        # converts blanks to NULL and numbers to integers
+        record, problems = EntryRecord.parse(entry)
+        if record is None:
+            raise ValueError("entry " + str(entry['date']) + ": " + ", ".join(problems))
+        records.append(record)
+    return records
 
 # creates the database file
 # args   : input arguments
@@ -44,6 +129,7 @@ def createFile(args):
     print("\tFilename   : " + str(args.filename))
     print("\tOverwrite? : " + str(args.overwrite))
     print("\tDataset    : " + str(args.dataset))
+    print("\tSource     : " + str(args.source))
 
     # checks if file already exists
     if os.path.exists(args.filename):
@@ -56,30 +142,34 @@ def createFile(args):
 
     # creates database
     conn = sqlite3.connect(args.filename)
+    # must be set before any table exists, lets --maintain give pruned pages back without a full VACUUM
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
 
-    # creates tables
-    conn.execute(CREATE_DATA_TABLE_CMD)
+    createTables(conn)
 
     # if dataset given, will populate database with it
     if args.dataset:
         try:
-            jsondata = None
-            with open(args.dataset) as f:
-                jsondata = json.load(f)
-            for entry in jsondata['data']:
-                # changes date to YYYY-MM-DD FROM MMDDYYYY
-                entry['date'] = entry['date'][4:] + '-'+ entry['date'][0:2] + '-' + entry['date'][2:4]
-                # executes query to entry data into database
-                insertCommand = ("INSERT INTO DATA (DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS) "
-                    "VALUES ("
-                    ":date, :total_cases, :new_cases, :new_tests, :hospitalizations, :intensive_care, :deaths)"
-                    )
-                conn.execute(insertCommand, entry)
+            records = readDataset(args.dataset)
+            # executes query to entry data into database
+            conn.executemany(WebReader.ADD_ENTRY_COMMAND, [(record.getDay(),) + record for record in records])
             conn.commit()
         except Exception as e:
             print("ERROR: Problem reading your JSON data file.")
             print("ERROR: " + str(e))
             sys.exit(2)
+    conn.close()
+
+    # if source given, will load every entry of its feed newer than the dataset
+    if args.source:
+        stored = loadFromSource(args.filename, args.source)
+        if stored is None:
+            sys.exit(2)
+        print("\tEntries Loaded : " + str(stored))
+
+    # writes the binary snapshot so the updater can start without rebuilding it
+    if not DataSnapshot.writeFromDatabase(args.filename, DataSnapshot.getDefaultFilename(args.filename)):
+        print("WARNING: Could not write snapshot file.")
 
     print("Done! Database file created: \'" + str(args.filename) + "\'")
     sys.exit(0)
@@ -112,19 +202,12 @@ def dumpToJson(args):
 
     conn = sqlite3.connect(args.filename)
     c = conn.cursor()
+    c.row_factory = EntryRecord.fromRow
     entries = c.execute(ENTRY_QUERY)
     for entry in entries:
+        newEntryDict = entry.toDict()
         # fixes date into json format (annoying, shouldn't have done this initially)
-        fixedDate = entry[0][5:7] + entry[0][8:] + entry[0][0:4]
-        newEntryDict = {
-            'date' : fixedDate,
-            'total_cases' : entry[1],
-            'new_cases' : entry[2],
-            'new_tests' : entry[3],
-            'hospitalizations' : entry[4],
-            'intensive_care' : entry[5],
-            'deaths' : entry[6]
-        }
+        newEntryDict['date'] = entry.date[5:7] + entry.date[8:] + entry.date[0:4]
         jsonData['data'].append(newEntryDict)
     conn.close()
 
@@ -135,6 +218,256 @@ def dumpToJson(args):
     print("Done! JSON file created: \'" + str(args.dataset) + "\'")
     sys.exit(0)
 
+# exports database file to a memory-mapped binary snapshot
+# args   : input arguments
+# return : n/a - will call sys.exit()
+def exportSnapshot(args):
+    snapshotFilename = DataSnapshot.getDefaultFilename(args.filename)
+    print("Exporting database file to snapshot with the following parameters:")
+    print("\tDB Filename       : " + str(args.filename))
+    print("\tSnapshot Filename : " + str(snapshotFilename))
+
+    if not os.path.exists(args.filename):
+        print("ERROR: Database file not found.")
+        sys.exit(1)
+    if not DataSnapshot.writeFromDatabase(args.filename, snapshotFilename):
+        print("ERROR: Problem writing the snapshot file.")
+        sys.exit(2)
+
+    print("Done! Snapshot file created: \'" + str(snapshotFilename) + "\'")
+    sys.exit(0)
+
+# loads every entry of a region's source newer than the latest stored one in a single transaction
+# dbFilename : sqlite database file
+# configFile : json config file (e.g. the updater's) whose 'source' entry is read
+# return     : number of entries stored, or None on error
+def loadFromSource(dbFilename, configFile):
+    try:
+        with open(configFile) as f:
+            sourceConfig = json.load(f).get('source')
+    except Exception as e:
+        print("ERROR: Problem reading your config file.")
+        print("ERROR: " + str(e))
+        return None
+    source = createSource(sourceConfig)
+    if source is None:
+        print("ERROR: Config file has no valid source.")
+        return None
+    wr = WebReader(dbFilename, source=source)
+    stored = wr.backfillFromSource()
+    wr.close()
+    return stored
+
+# backfills an existing database from its region's source
+# args   : input arguments
+# return : n/a - will call sys.exit()
+def backfillDatabase(args):
+    print("Backfilling database file with the following parameters:")
+    print("\tDB Filename : " + str(args.filename))
+    print("\tSource      : " + str(args.source))
+
+    if not os.path.exists(args.filename):
+        print("ERROR: Database file not found.")
+        sys.exit(1)
+    if not WebReader.migrateDatabase(args.filename):
+        sys.exit(2)
+    stored = loadFromSource(args.filename, args.source)
+    if stored is None:
+        sys.exit(2)
+    print("\tEntries Loaded : " + str(stored))
+
+    # new rows must not be missing from the snapshot
+    if not DataSnapshot.writeFromDatabase(args.filename, DataSnapshot.getDefaultFilename(args.filename)):
+        print("WARNING: Could not write snapshot file.")
+
+    print("Done! Database file backfilled: \'" + str(args.filename) + "\'")
+    sys.exit(0)
+
+# adds the indexed DAY column to a database made before it existed
+# args   : input arguments
+# return : n/a - will call sys.exit()
+def migrateDatabase(args):
+    print("Migrating database file with the following parameters:")
+    print("\tDB Filename : " + str(args.filename))
+
+    if not os.path.exists(args.filename):
+        print("ERROR: Database file not found.")
+        sys.exit(1)
+    if not WebReader.migrateDatabase(args.filename):
+        print("ERROR: Problem migrating the database file.")
+        sys.exit(2)
+
+    print("Done! Database file migrated: \'" + str(args.filename) + "\'")
+    sys.exit(0)
+
+# parses every archived page again and stores the entries found over the ones in DATA
+# NOTE - dates the archive has no page for (e.g. imported from a dataset) are left as they are
+# dbFilename   : sqlite database file, its archive is the PageArchive default directory
+# sourceConfig : (optional) config of the source that fetched the pages, defaults to the county status page
+# processes    : (optional) worker processes parsing pages, defaults to one per cpu
+# return       : dict of 'pages', 'entries' and 'failures' (list of (hash, error) tuples), raises on error
+def rebuildFromArchive(dbFilename, sourceConfig=None, processes=None):
+    archive = PageArchive(PageArchive.getDefaultDirectory(dbFilename))
+    if not archive.exists():
+        raise Exception("no archived pages in " + archive.directory)
+    if not WebReader.migrateDatabase(dbFilename):
+        raise Exception("could not add the DAY column")
+    records, failures = archive.reparse(sourceConfig, processes=processes)
+    conn = sqlite3.connect(dbFilename)
+    with conn:
+        conn.executemany(REPLACE_ENTRY_CMD, [(record.getDay(),) + record for record in records])
+        conn.executemany(FILL_NEW_CASES_CMD, [(record.getDay(),) for record in records if record.new_cases is None])
+    conn.close()
+    return {'pages' : len(set(fetch[0] for fetch in archive.readFetches())), 'entries' : len(records), 'failures' : failures}
+
+# rebuilds the database's entries from its archived pages
+# args   : input arguments
+# return : n/a - will call sys.exit()
+def reparseDatabase(args):
+    print("Reparsing archived pages with the following parameters:")
+    print("\tDB Filename : " + str(args.filename))
+    print("\tSource      : " + str(args.source))
+    print("\tWorkers     : " + str(args.workers))
+
+    if not os.path.exists(args.filename):
+        print("ERROR: Database file not found.")
+        sys.exit(1)
+    sourceConfig = None
+    if args.source:
+        try:
+            with open(args.source) as f:
+                sourceConfig = json.load(f).get('source')
+        except Exception as e:
+            print("ERROR: Problem reading your config file.")
+            print("ERROR: " + str(e))
+            sys.exit(2)
+    try:
+        stats = rebuildFromArchive(args.filename, sourceConfig, processes=args.workers)
+    except Exception as e:
+        print("ERROR: Problem reparsing the archived pages.")
+        print("ERROR: " + str(e))
+        sys.exit(2)
+    for digest, error in stats['failures']:
+        print("WARNING: Could not parse page " + digest + ": " + error)
+    print("\tPages Parsed   : " + str(stats['pages'] - len(stats['failures'])) + " of " + str(stats['pages']))
+    print("\tEntries Stored : " + str(stats['entries']))
+
+    # changed rows must not be served from an old snapshot
+    if not DataSnapshot.writeFromDatabase(args.filename, DataSnapshot.getDefaultFilename(args.filename)):
+        print("WARNING: Could not write snapshot file.")
+
+    print("Done! Database file rebuilt from archive: \'" + str(args.filename) + "\'")
+    sys.exit(0)
+
+# rolls a list of daily rows up into one aggregate row per completed period
+# entries : list of ENTRY_QUERY rows, oldest first
+# period  : 'weekly' or 'monthly'
+# horizon : date object, periods ending on or after it are left out
+# return  : list of ADD_AGGREGATE_CMD parameter tuples
+def getAggregateRows(entries, period, horizon):
+    groups = {}
+    for entry in entries:
+        periodStart = DataAnalyzer.getPeriodStart(date.fromisoformat(entry[0]), period)
+        groups.setdefault(periodStart, []).append(entry)
+    aggregateRows = []
+    for periodStart, periodEntries in sorted(groups.items()):
+        if DataAnalyzer.getPeriodEnd(periodStart, period) >= horizon:
+            continue
+        aggregate = [periodStart.isoformat(), periodEntries[-1][0], len(periodEntries)]
+        # columns after DATE are in DataAnalyzer.METRICS order
+        for idx, metric in enumerate(DataAnalyzer.METRICS):
+            values = [entry[idx + 1] for entry in periodEntries if entry[idx + 1] is not None]
+            if len(values) == 0:
+                aggregate.append(None)
+            elif metric in DataAnalyzer.CUMULATIVE_METRICS:
+                aggregate.append(values[-1])
+            else:
+                aggregate.append(sum(values))
+        newCases = [entry[2] for entry in periodEntries if entry[2] is not None]
+        aggregate.append(max(newCases) if len(newCases) > 0 else None)
+        aggregateRows.append(tuple(aggregate))
+    return aggregateRows
+
+
+# rolls old daily rows into the weekly and monthly tables, prunes them and compacts the file
+# NOTE - horizons count back from the latest entry, not today, so a stopped updater does not lose data
+# dbFilename          : sqlite database file
+# retentionDays       : (optional) days of daily rows to keep
+# weeklyRetentionDays : (optional) days of weekly rows to keep, monthly rows are kept forever
+# longWindowDays      : (optional) long window of the analysis, daily rows of its two latest windows are always kept
+# return              : dict of rows rolled up and pruned
+def compactDatabase(dbFilename, retentionDays=DEFAULT_RETENTION_DAYS, weeklyRetentionDays=DEFAULT_WEEKLY_RETENTION_DAYS,
+    longWindowDays=DataAnalyzer.DEFAULT_LONG_WINDOW_DAYS):
+    stats = {'weekly_rows' : 0, 'monthly_rows' : 0, 'pruned_daily_rows' : 0, 'pruned_weekly_rows' : 0}
+    if not WebReader.migrateDatabase(dbFilename):
+        raise Exception("could not add the DAY column")
+    conn = sqlite3.connect(dbFilename)
+    # databases made by older versions may be missing these
+    conn.execute(CREATE_UPDATE_LOG_TABLE_CMD)
+    for table in DataAnalyzer.AGGREGATE_TABLES.values():
+        conn.execute(CREATE_AGGREGATE_TABLE_CMD.format(table=table))
+    latestDay = conn.execute("SELECT MAX(DAY) from DATA").fetchone()[0]
+    if latestDay is not None:
+        latestDate = date.fromordinal(latestDay)
+        horizon = latestDate - timedelta(days=retentionDays)
+        entries = conn.execute(ENTRY_QUERY + " WHERE DAY < ? ORDER BY DAY ASC", (horizon.toordinal(),)).fetchall()
+        for period, table in DataAnalyzer.AGGREGATE_TABLES.items():
+            stats[period + '_rows'] = conn.executemany(ADD_AGGREGATE_CMD.format(table=table), getAggregateRows(entries, period, horizon)).rowcount
+        # only rows whose week and month have both been rolled up can go, and none the long window change reads,
+        # since a window only partly covering a week or month needs its daily rows
+        longWindowStart = latestDate - timedelta(days=2 * longWindowDays - 1)
+        cutoff = min(DataAnalyzer.getPeriodStart(day, period) for day in [horizon, longWindowStart] for period in DataAnalyzer.AGGREGATE_TABLES)
+        stats['pruned_daily_rows'] = conn.execute("DELETE FROM DATA WHERE DAY < ?", (cutoff.toordinal(),)).rowcount
+        cutoff = cutoff.isoformat()
+        conn.execute("DELETE FROM UPDATE_LOG WHERE DATE < ?", (cutoff,))
+        # weeks are covered by the monthly rows, which are never pruned
+        weeklyHorizon = latestDate - timedelta(days=max(weeklyRetentionDays, retentionDays))
+        weeklyCutoff = min(DataAnalyzer.getPeriodStart(weeklyHorizon, 'monthly').isoformat(), cutoff)
+        stats['pruned_weekly_rows'] = conn.execute("DELETE FROM DATA_WEEKLY WHERE PERIOD_START < ?", (weeklyCutoff,)).rowcount
+    conn.commit()
+
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        conn.execute("PRAGMA incremental_vacuum")
+    else:
+        # databases created before incremental vacuum was turned on need one full VACUUM to switch
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    conn.execute("ANALYZE")
+    conn.close()
+    return stats
+
+
+# runs the maintenance on the database file
+# args   : input arguments
+# return : n/a - will call sys.exit()
+def maintainDatabase(args):
+    print("Maintaining database file with the following parameters:")
+    print("\tDB Filename           : " + str(args.filename))
+    print("\tRetention Days        : " + str(args.retention_days))
+    print("\tWeekly Retention Days : " + str(args.weekly_retention_days))
+    print("\tLong Window Days      : " + str(args.long_window_days))
+
+    if not os.path.exists(args.filename):
+        print("ERROR: Database file not found.")
+        sys.exit(1)
+    try:
+        stats = compactDatabase(args.filename, args.retention_days, args.weekly_retention_days, args.long_window_days)
+    except Exception as e:
+        print("ERROR: Problem maintaining the database file.")
+        print("ERROR: " + str(e))
+        sys.exit(2)
+    print("\tWeeks Rolled Up       : " + str(stats['weekly_rows']))
+    print("\tMonths Rolled Up      : " + str(stats['monthly_rows']))
+    print("\tDaily Rows Pruned     : " + str(stats['pruned_daily_rows']))
+    print("\tWeekly Rows Pruned    : " + str(stats['pruned_weekly_rows']))
+
+    # pruned rows must not be served from an old snapshot
+    if not DataSnapshot.writeFromDatabase(args.filename, DataSnapshot.getDefaultFilename(args.filename)):
+        print("WARNING: Could not write snapshot file.")
+
+    print("Done! Database file maintained: \'" + str(args.filename) + "\'")
+    sys.exit(0)
+
 if __name__ == "__main__":
     # reads in command line arguments
     parser = argparse.ArgumentParser(
@@ -147,12 +480,48 @@ if __name__ == "__main__":
                         help='forcibly overwrites any file with the same name')
     parser.add_argument('--data', '-d', dest='dataset',
                         help='JSON dataset to prepopulate tables')
+    parser.add_argument('--source', '-s', dest='source', metavar='CONFIG',
+                        help='Loads the feed of the \'source\' entry of this json config (e.g. the updater config) into a new database or (without --overwrite) an existing one')
     parser.add_argument('--dump_to_json', action='store_true', dest='dump',
                         help='Dumps the dataset (if it exists) to a JSON so you can use it to edit/prepopulate different databases')
+    parser.add_argument('--profile', dest='profile', default=None, metavar='PREFIX',
+                        help='Profiles the run, writing PREFIX.pstats and PREFIX.collapsed (flamegraph input)')
+    parser.add_argument('--snapshot', action='store_true', dest='snapshot',
+                        help='Exports the existing database to a binary snapshot file (<file>.snap) for fast startup')
+    parser.add_argument('--maintain', action='store_true', dest='maintain',
+                        help='Rolls old daily rows into weekly/monthly tables, prunes them and compacts the existing database')
+    parser.add_argument('--migrate', action='store_true', dest='migrate',
+                        help='Adds the indexed DAY column to a database made by an older version')
+    parser.add_argument('--reparse', action='store_true', dest='reparse',
+                        help='Parses every page archived next to the existing database again and stores the entries found (use --source for a feed)')
+    parser.add_argument('--workers', type=int, default=None, dest='workers',
+                        help='Processes used by --reparse. Default is one per cpu')
+    parser.add_argument('--retention_days', type=int, default=DEFAULT_RETENTION_DAYS, dest='retention_days',
+                        help='Days of daily rows kept by --maintain')
+    parser.add_argument('--weekly_retention_days', type=int, default=DEFAULT_WEEKLY_RETENTION_DAYS, dest='weekly_retention_days',
+                        help='Days of weekly rows kept by --maintain, monthly rows are kept forever')
+    parser.add_argument('--long_window_days', type=int, default=DataAnalyzer.DEFAULT_LONG_WINDOW_DAYS, dest='long_window_days',
+                        help='Long window of the analysis (long_window_days in the config), --maintain keeps the daily rows of two of them')
     args = parser.parse_args()
 
-    if not args.dump:
-        createFile(args)
+    if args.maintain:
+        command = maintainDatabase
+    elif args.snapshot:
+        command = exportSnapshot
+    elif args.migrate:
+        command = migrateDatabase
+    elif args.reparse:
+        command = reparseDatabase
+    elif args.source and not args.dump and not args.overwrite and os.path.exists(args.filename):
+        command = backfillDatabase
+    elif not args.dump:
+        command = createFile
+    else:
+        command = dumpToJson
+
+    if args.profile is not None:
+        from profiling import profileCall
+        profileCall(args.profile, command, args)
     else:
-        dumpToJson(args)
+        command(args)
     sys.exit(0)
@@ -0,0 +1,174 @@
+# text message templates, compiled once and rendered for each kind of recipient
+# analysis facts are packed into as few texts as the recipient's gateway allows, most important first
+# Copyright Michael Kukar 2020. MIT License.
+
+import string
+
+class MessageTemplates:
+
+    # name : template, fields are python format fields e.g. {total_cases} or {total_cases:,}
+    DEFAULT_TEMPLATES = {
+        'update' : "LATEST SD COVID19 UPDATE:\nNew Cases: {new_cases}\nTotal Cases: {total_cases}{link}",
+        'link' : "\nhttps://bit.ly/2W8uQJM", # shortened URL to SD Covid19 Website
+        'digest' : "SD COVID19 {digest} DIGEST:\nNew Cases: {new_cases}\nTotal Cases: {total_cases}",
+        'analysis' : "Analysis:",
+        'fact' : "- {fact}"
+    }
+    # fields each template can use
+    TEMPLATE_FIELDS = {
+        'update' : ['date', 'new_cases', 'total_cases', 'link'],
+        'link' : [],
+        'digest' : ['digest', 'new_cases', 'total_cases'],
+        'analysis' : [],
+        'fact' : ['fact']
+    }
+
+    # links : texts include the link to the county website
+    # max_segments : most texts a message is split into, facts that do not fit are dropped (None for no limit)
+    DEFAULT_PROFILE = {
+        'links' : True,
+        'max_segments' : None
+    }
+    # gateway domain : profile fields that differ from the default
+    DEFAULT_PROFILES = {
+        # t-mobile does not allow website links
+        'tmomail.net' : {'links' : False}
+    }
+
+
+    # templates : (optional) dict of template name to template, replacing the matching DEFAULT_TEMPLATES
+    # profiles  : (optional) dict of gateway domain to profile fields, replacing the matching DEFAULT_PROFILES
+    # NOTE - raises ValueError on an invalid template, see getTemplateProblems()
+    def __init__(self, templates=None, profiles=None):
+        self.compiled = {}
+        for name, template in dict(self.DEFAULT_TEMPLATES, **(templates or {})).items():
+            self.compiled[name] = self.compile(name, template)
+        self.profiles = {}
+        for domain, profile in dict(self.DEFAULT_PROFILES, **(profiles or {})).items():
+            self.profiles[domain] = dict(self.DEFAULT_PROFILE, **profile)
+
+
+    # parses a template into the parts it is rendered from
+    # name     : template name, a key of TEMPLATE_FIELDS
+    # template : template string
+    # return   : list of (literal text, field name or None, format spec) tuples, raises ValueError if invalid
+    @classmethod
+    def compile(cls, name, template):
+        if name not in cls.TEMPLATE_FIELDS:
+            raise ValueError("unknown template " + str(name))
+        parts = []
+        for literal, field, formatSpec, conversion in string.Formatter().parse(template):
+            if field is not None and field not in cls.TEMPLATE_FIELDS[name]:
+                raise ValueError("template " + name + " has unknown field {" + field + "}")
+            if conversion is not None:
+                raise ValueError("template " + name + " has a conversion, use a format spec instead")
+            parts.append((literal, field, formatSpec or ''))
+        return parts
+
+
+    # checks templates from a config
+    # templates : dict of template name to template
+    # return    : list of problem strings, empty if every template is valid
+    @classmethod
+    def getTemplateProblems(cls, templates):
+        problems = []
+        for name, template in templates.items():
+            try:
+                cls.compile(name, template)
+            except (ValueError, TypeError) as e:
+                problems.append("message_templates " + str(name) + ": " + str(e))
+        return problems
+
+
+    # checks recipient profiles from a config
+    # profiles : dict of gateway domain to profile fields
+    # return   : list of problem strings, empty if every profile is valid
+    @classmethod
+    def getProfileProblems(cls, profiles):
+        problems = []
+        for domain, profile in profiles.items():
+            if not isinstance(profile, dict):
+                problems.append("recipient_profiles " + str(domain) + " is not a dict")
+                continue
+            for field in profile:
+                if field not in cls.DEFAULT_PROFILE:
+                    problems.append("recipient_profiles " + str(domain) + " has unknown field " + str(field))
+        return problems
+
+
+    # renders a compiled template
+    # name   : template name
+    # values : field values
+    # return : string
+    def render(self, name, **values):
+        return ''.join(literal + self.formatValue(values[field], formatSpec) if field is not None else literal
+            for literal, field, formatSpec in self.compiled[name])
+
+
+    # formats one field value
+    # NOTE - None (e.g. total cases of a digest without entries) renders as None, its format spec is skipped
+    #        since specs like {total_cases:,} only apply to numbers
+    # value      : field value
+    # formatSpec : format spec of the field, '' for none
+    # return     : string
+    @staticmethod
+    def formatValue(value, formatSpec):
+        if value is None:
+            return str(value)
+        return format(value, formatSpec)
+
+
+    # gets the profile of a recipient
+    # emailAddr : email to send to
+    # return    : profile dict, see DEFAULT_PROFILE
+    def getProfile(self, emailAddr):
+        return self.profiles.get(emailAddr.split('@')[-1], self.DEFAULT_PROFILE)
+
+
+    # renders one text of a packed message
+    # headSegments : list of merged head strings
+    # factLines    : dict of text index to list of rendered facts
+    # idx          : index of the text
+    # return       : string
+    def renderSegment(self, headSegments, factLines, idx):
+        lines = [headSegments[idx]] if idx < len(headSegments) else []
+        if idx in factLines:
+            # the header goes before the facts of the first text that has any
+            if idx == min(factLines):
+                lines.append(self.render('analysis'))
+            lines += factLines[idx]
+        return "\n".join(lines)
+
+
+    # splits a message into texts of at most maxLength characters, in as few texts as possible
+    # NOTE - heads are always sent, in order, and merged where they fit; facts follow under the analysis
+    #        header and each goes into the first text after the heads with room for it, so less important
+    #        facts fill the gaps left by more important ones instead of starting another text
+    # heads       : list of message strings, e.g. the update
+    # facts       : list of (importance, fact) tuples
+    # maxLength   : longest single text
+    # maxSegments : (optional) most texts, facts that would need more are dropped
+    # return      : list of text strings
+    def packSegments(self, heads, facts, maxLength, maxSegments=None):
+        headSegments = []
+        for head in heads:
+            if len(headSegments) > 0 and len(headSegments[-1]) + 1 + len(head) <= maxLength:
+                headSegments[-1] += "\n" + head
+            else:
+                headSegments.append(head)
+        factLines = {}
+        for importance, fact in sorted(facts, key=lambda fact: fact[0], reverse=True):
+            line = self.render('fact', fact=fact)
+            segmentCount = max([len(headSegments)] + [idx + 1 for idx in factLines])
+            # facts can join the last head's text, never an earlier one, so the analysis stays after the update
+            for idx in range(max(len(headSegments) - 1, 0), segmentCount + 1):
+                if maxSegments is not None and idx >= maxSegments:
+                    break
+                trial = dict(factLines)
+                trial[idx] = factLines.get(idx, []) + [line]
+                # a fact longer than a text by itself still gets a text of its own
+                if len(self.renderSegment(headSegments, trial, idx)) <= maxLength or idx == segmentCount:
+                    factLines = trial
+                    break
+        segmentCount = max([len(headSegments)] + [idx + 1 for idx in factLines])
+        return [self.renderSegment(headSegments, factLines, idx) for idx in range(segmentCount)]
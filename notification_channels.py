@@ -0,0 +1,182 @@
+# channels that deliver one message to many recipients in as few network operations as possible
+# Copyright Michael Kukar 2020. MIT License.
+
+import json
+from datetime import datetime
+
+class NotificationChannel:
+
+    # opens any connection the channel needs before sending
+    # return : true on success, false on error
+    def open(self):
+        return True
+
+
+    # sends a message to a list of recipients
+    # message    : message to send
+    # recipients : list of recipient addresses
+    # return     : number of recipients the message was sent to
+    def send(self, message, recipients):
+        raise NotImplementedError()
+
+
+    # closes any connection opened by open()
+    # return : None
+    def close(self):
+        pass
+
+
+    # splits recipients into batches
+    # recipients : list of recipient addresses
+    # batchSize  : maximum recipients per batch
+    # return     : list of recipient lists
+    @staticmethod
+    def getBatches(recipients, batchSize):
+        batchSize = max(batchSize, 1)
+        return [recipients[idx:idx + batchSize] for idx in range(0, len(recipients), batchSize)]
+
+
+class SmtpChannel(NotificationChannel):
+
+    # most recipients per email for each gateway domain, 1 sends an email per recipient
+    # NOTE - gateways that drop blind copied mail should be left out (or set to 1) in the config
+    DEFAULT_MAX_RECIPIENTS = {
+        'vtext.com' : 20,
+        'tmomail.net' : 20
+    }
+
+    # emailTexter      : EmailTexter used to connect and send
+    # credentials      : dict with 'user', 'pass' and 'url' of the smtp server, optionally 'port' and 'ssl'
+    # maxRecipients    : (optional) dict of gateway domain to most recipients per email
+    def __init__(self, emailTexter, credentials, maxRecipients=None):
+        self.et = emailTexter
+        self.credentials = credentials
+        self.maxRecipients = dict(self.DEFAULT_MAX_RECIPIENTS)
+        if maxRecipients is not None:
+            self.maxRecipients.update(maxRecipients)
+        self.server = None
+
+
+    def open(self):
+        # initializes email server now since otherwise may time out over several hours
+        self.server = self.et.initializeEmailServer(
+            self.credentials['user'],
+            self.credentials['pass'],
+            self.credentials['url'],
+            port=self.credentials.get('port', 465),
+            useSsl=self.credentials.get('ssl', True)
+        )
+        return self.server is not None
+
+
+    # NOTE - a batch that fails is logged and skipped, so the other batches, pages and channels still go out
+    def send(self, message, recipients):
+        import smtplib
+        # groups by gateway since each one allows a different number of blind copies
+        recipientsByDomain = {}
+        for recipient in recipients:
+            recipientsByDomain.setdefault(recipient.split('@')[-1], []).append(recipient)
+        sent = 0
+        for domain, domainRecipients in recipientsByDomain.items():
+            batchSize = self.maxRecipients.get(domain, 1)
+            for batch in self.getBatches(domainRecipients, batchSize):
+                try:
+                    if len(batch) == 1:
+                        sent += 1 if self.et.sendMessage(batch[0], message, self.server) else 0
+                    else:
+                        sent += self.et.sendBatchMessage(batch, message, self.server)
+                except (smtplib.SMTPException, OSError) as e:
+                    print("ERROR: could not send to " + str(len(batch)) + " recipient(s) on " + domain + ": " + str(e))
+        return sent
+
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+
+class WebhookChannel(NotificationChannel):
+
+    # url       : url to POST {"message": ..., "recipients": [...]} json to
+    # batchSize : (optional) most recipients per POST
+    # timeout   : (optional) seconds to wait for the webhook
+    def __init__(self, url, batchSize=500, timeout=10):
+        self.url = url
+        self.batchSize = batchSize
+        self.timeout = timeout
+        # kept between sends so posts reuse the same keep-alive connection
+        import requests
+        self.session = requests.Session()
+
+
+    def send(self, message, recipients):
+        sent = 0
+        for batch in self.getBatches(recipients, self.batchSize):
+            try:
+                response = self.session.post(self.url, json={'message' : message, 'recipients' : batch}, timeout=self.timeout)
+                response.raise_for_status()
+            except Exception as e:
+                print("ERROR: webhook " + self.url + " failed: " + str(e))
+                continue
+            sent += len(batch)
+        return sent
+
+
+class FileSinkChannel(NotificationChannel):
+
+    # filename : file to append one json line per message to (e.g. a queue picked up by another process)
+    def __init__(self, filename):
+        self.filename = filename
+
+
+    def send(self, message, recipients):
+        record = {
+            'time' : datetime.now().isoformat(timespec='seconds'),
+            'message' : message,
+            'recipients' : recipients
+        }
+        try:
+            with open(self.filename, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except Exception as e:
+            print("ERROR: could not write to " + self.filename + ": " + str(e))
+            return 0
+        return len(recipients)
+
+
+# required fields of each channel type in the config file
+CHANNEL_REQUIRED_FIELDS = {
+    'smtp' : [],
+    'webhook' : ['url'],
+    'file' : ['filename']
+}
+
+
+# checks a channel config file entry without creating the channel
+# channelConfig : dict with 'type' and that type's fields
+# return        : true if the entry is complete, false otherwise
+def isValidChannelConfig(channelConfig):
+    channelType = channelConfig.get('type')
+    if channelType not in CHANNEL_REQUIRED_FIELDS:
+        return False
+    for field in CHANNEL_REQUIRED_FIELDS[channelType]:
+        if field not in channelConfig:
+            return False
+    return True
+
+
+# creates a channel from its config file entry
+# channelConfig    : dict with 'type' and that type's fields
+# emailTexter      : EmailTexter for smtp channels
+# emailCredentials : dict of email credentials for smtp channels
+# return           : NotificationChannel, or None if the config is invalid
+def createChannel(channelConfig, emailTexter, emailCredentials):
+    if not isValidChannelConfig(channelConfig):
+        return None
+    channelType = channelConfig['type']
+    if channelType == 'smtp':
+        return SmtpChannel(emailTexter, emailCredentials, maxRecipients=channelConfig.get('max_recipients'))
+    elif channelType == 'webhook':
+        return WebhookChannel(channelConfig['url'], batchSize=channelConfig.get('batch_size', 500))
+    return FileSinkChannel(channelConfig['filename'])
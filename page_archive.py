@@ -0,0 +1,177 @@
+# archive of every distinct page fetched, kept next to the database so a page that broke the parser
+# can be parsed again once the parser is fixed
+# pages are stored compressed under the hash of their contents, so polls of an unchanged page cost nothing
+# Copyright Michael Kukar 2020. MIT License.
+
+import os, io, gzip, hashlib, sqlite3, time, threading, codecs
+
+from data_sources import HtmlPageSource, createSource
+
+class PageArchive:
+
+    DIRECTORY_EXTENSION = ".pages"
+    INDEX_FILENAME = "index.db"
+    OBJECT_EXTENSION = ".gz"
+    COMPRESS_LEVEL = 9
+
+    # one row each time a url's page changed (the first fetch of each version)
+    CREATE_FETCHES_TABLE_COMMAND = ("CREATE TABLE IF NOT EXISTS FETCHES "
+        "(ID INTEGER PRIMARY KEY,"
+        "HASH CHAR(64) NOT NULL,"
+        "URL TEXT NOT NULL,"
+        "FETCHED_AT INTEGER NOT NULL"
+        ");"
+        )
+    CREATE_URL_INDEX_COMMAND = "CREATE INDEX IF NOT EXISTS FETCHES_URL_INDEX ON FETCHES (URL, ID);"
+    ADD_FETCH_COMMAND = "INSERT INTO FETCHES (HASH, URL, FETCHED_AT) VALUES (?, ?, ?);"
+    LAST_HASH_QUERY = "SELECT HASH from FETCHES WHERE URL = ? ORDER BY ID DESC LIMIT 1"
+    FETCHES_QUERY = "SELECT HASH, URL, FETCHED_AT from FETCHES ORDER BY ID ASC"
+
+
+    # directory : directory of the archive, created on the first page stored
+    def __init__(self, directory):
+        self.directory = directory
+        self.indexFilename = os.path.join(directory, self.INDEX_FILENAME)
+        # hash of the last page stored for each url, so repeated polls never touch the disk
+        self.lastHashes = {}
+        self.lock = threading.Lock()
+
+
+    # gets the archive directory of a database
+    # dbFilename : sqlite database file
+    # return     : directory name
+    @classmethod
+    def getDefaultDirectory(cls, dbFilename):
+        return dbFilename + cls.DIRECTORY_EXTENSION
+
+
+    # gets the file a page is stored in
+    # digest : sha256 hex digest of the page
+    # return : filename
+    def getObjectFilename(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], digest + self.OBJECT_EXTENSION)
+
+
+    # checks if anything has been archived yet
+    # return : true if the archive has an index, false otherwise
+    def exists(self):
+        return os.path.exists(self.indexFilename)
+
+
+    # stores a fetched page, unless it is the same as the last one fetched from the url
+    # NOTE - archiving never fails the fetch, errors are printed and the page is returned as usual
+    # url       : url the page was fetched from
+    # body      : bytes of the page
+    # fetchedAt : (optional) unix time of the fetch, defaults to now
+    # return    : sha256 hex digest of the page, or None on error
+    def store(self, url, body, fetchedAt=None):
+        digest = hashlib.sha256(body).hexdigest()
+        with self.lock:
+            if self.lastHashes.get(url) == digest:
+                return digest
+            try:
+                objectFilename = self.getObjectFilename(digest)
+                # a page seen before (e.g. the county reverting a change) is already stored
+                if not os.path.exists(objectFilename):
+                    os.makedirs(os.path.dirname(objectFilename), exist_ok=True)
+                    # written beside the object then renamed, so a crash never leaves a partial object
+                    tempFilename = objectFilename + ".tmp"
+                    with gzip.open(tempFilename, 'wb', compresslevel=self.COMPRESS_LEVEL) as f:
+                        f.write(body)
+                    os.replace(tempFilename, objectFilename)
+                conn = sqlite3.connect(self.indexFilename)
+                with conn:
+                    conn.execute(self.CREATE_FETCHES_TABLE_COMMAND)
+                    conn.execute(self.CREATE_URL_INDEX_COMMAND)
+                    # the last version stored before a restart is not a new version
+                    lastRow = conn.execute(self.LAST_HASH_QUERY, (url,)).fetchone()
+                    if lastRow is None or lastRow[0] != digest:
+                        conn.execute(self.ADD_FETCH_COMMAND, (digest, url, int(fetchedAt if fetchedAt is not None else time.time())))
+                conn.close()
+            except (OSError, sqlite3.Error) as e:
+                print("ERROR: could not archive page from " + url + ": " + str(e))
+                return None
+            self.lastHashes[url] = digest
+        return digest
+
+
+    # reads an archived page
+    # digest : sha256 hex digest of the page
+    # return : bytes of the page, raises on error
+    def readPage(self, digest):
+        with gzip.open(self.getObjectFilename(digest), 'rb') as f:
+            return f.read()
+
+
+    # reads every version of every page archived
+    # return : list of (hash, url, fetched at unix time) tuples, oldest first
+    def readFetches(self):
+        if not self.exists():
+            return []
+        conn = sqlite3.connect(self.indexFilename)
+        try:
+            return conn.execute(self.FETCHES_QUERY).fetchall()
+        except sqlite3.Error:
+            return []
+        finally:
+            conn.close()
+
+
+    # parses every archived page again in parallel
+    # NOTE - a date found in several pages keeps the entry of the latest one fetched (e.g. a revision)
+    # sourceConfig : (optional) config of the source that fetched the pages, defaults to the county status page
+    # processes    : (optional) worker processes, defaults to one per cpu, 1 parses in this process
+    # return       : (list of EntryRecords oldest first, list of (hash, error string) of pages that failed) tuple
+    def reparse(self, sourceConfig=None, processes=None):
+        fetches = self.readFetches()
+        # each distinct page is only parsed once, even when several urls or versions share it
+        tasks = {}
+        for digest, url, fetchedAt in fetches:
+            tasks.setdefault(digest, (self.directory, digest, url, sourceConfig))
+        if processes == 1:
+            results = [reparsePage(task) for task in tasks.values()]
+        else:
+            import multiprocessing
+            with multiprocessing.Pool(processes) as pool:
+                results = pool.map(reparsePage, tasks.values())
+        recordsPerPage = {}
+        failures = []
+        for digest, records, error in results:
+            recordsPerPage[digest] = records
+            if error is not None:
+                failures.append((digest, error))
+        records = {}
+        for digest, url, fetchedAt in fetches:
+            for record in recordsPerPage[digest]:
+                records[record.date] = record
+        return [records[recordDate] for recordDate in sorted(records)], failures
+
+
+# stands in for a WebReader so any DataSource reads an archived page instead of fetching it
+class ArchivedPage:
+
+    # body : bytes of the page
+    def __init__(self, body):
+        self.body = body
+
+
+    def fetchPage(self, url):
+        return self.body
+
+
+    def readPageLines(self, url):
+        return codecs.iterdecode(io.BytesIO(self.body), 'utf-8-sig')
+
+
+# parses one archived page, run in the worker processes of PageArchive.reparse()
+# task   : (archive directory, hash, url, source config or None) tuple
+# return : (hash, list of EntryRecords, error string or None) tuple
+def reparsePage(task):
+    directory, digest, url, sourceConfig = task
+    source = createSource(sourceConfig) if sourceConfig is not None else HtmlPageSource()
+    try:
+        if source is None:
+            raise ValueError("invalid source config")
+        return digest, source.readEntries(ArchivedPage(PageArchive(directory).readPage(digest)), url), None
+    except Exception as e:
+        return digest, [], str(e)
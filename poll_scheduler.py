@@ -0,0 +1,115 @@
+# adaptive polling schedule that follows when the county usually publishes
+# Copyright Michael Kukar 2020. MIT License.
+
+import time
+
+class PollScheduler:
+
+    SECONDS_PER_DAY = 24 * 60 * 60
+
+    # need at least this many past updates before trusting a learned window
+    MIN_UPDATES = 3
+    # only the most recent updates are used so the window follows schedule changes
+    MAX_UPDATES = 14
+
+
+    # baseInterval  : (optional) seconds between polls inside the publish window
+    # maxInterval   : (optional) longest backoff in seconds outside the window
+    # windowPadding : (optional) seconds added to each side of the learned window
+    def __init__(self, baseInterval=60, maxInterval=3600, windowPadding=1800):
+        self.baseInterval = baseInterval
+        self.maxInterval = maxInterval
+        self.windowPadding = windowPadding
+        # window is in local seconds since midnight, and can wrap past midnight
+        self.windowStart = None
+        self.windowEnd = None
+        self.backoff = baseInterval
+        self.caughtUpUntil = 0
+
+
+    # gets local seconds since midnight of a timestamp
+    # timestamp : unix timestamp
+    # return    : int seconds since local midnight
+    @staticmethod
+    def getTimeOfDay(timestamp):
+        localTime = time.localtime(timestamp)
+        return localTime.tm_hour * 3600 + localTime.tm_min * 60 + localTime.tm_sec
+
+
+    # learns the publish window from the times past updates were stored
+    # NOTE - the window is the part of the day not covered by the largest gap between update times
+    # updateTimes : list of unix timestamps of past inserts
+    # return      : true if a window was learned, false if there is not enough history
+    def learnWindow(self, updateTimes):
+        updateTimes = sorted(updateTimes)[-self.MAX_UPDATES:]
+        if len(updateTimes) < self.MIN_UPDATES:
+            self.windowStart, self.windowEnd = None, None
+            return False
+        timesOfDay = sorted(self.getTimeOfDay(updateTime) for updateTime in updateTimes)
+        # finds the largest gap going around the clock
+        largestGap, gapEndIdx = -1, 0
+        for idx in range(len(timesOfDay)):
+            previous = timesOfDay[idx - 1]
+            gap = (timesOfDay[idx] - previous) % self.SECONDS_PER_DAY
+            if idx == 0 and gap == 0:
+                # all on the same second, the gap is the whole day
+                gap = self.SECONDS_PER_DAY
+            if gap > largestGap:
+                largestGap, gapEndIdx = gap, idx
+        windowLength = self.SECONDS_PER_DAY - largestGap + 2 * self.windowPadding
+        if windowLength >= self.SECONDS_PER_DAY:
+            # updates are spread across the whole day, so always poll
+            self.windowStart, self.windowEnd = None, None
+            return False
+        self.windowStart = (timesOfDay[gapEndIdx] - self.windowPadding) % self.SECONDS_PER_DAY
+        self.windowEnd = (timesOfDay[gapEndIdx - 1] + self.windowPadding) % self.SECONDS_PER_DAY
+        return True
+
+
+    # checks if a time is inside the publish window
+    # timestamp : unix timestamp
+    # return    : true if inside the window (or no window is known), false otherwise
+    def isInWindow(self, timestamp):
+        if self.windowStart is None:
+            return True
+        timeOfDay = self.getTimeOfDay(timestamp)
+        if self.windowStart <= self.windowEnd:
+            return self.windowStart <= timeOfDay <= self.windowEnd
+        return timeOfDay >= self.windowStart or timeOfDay <= self.windowEnd
+
+
+    # seconds from a time until the next start of the publish window
+    # timestamp : unix timestamp
+    # return    : int seconds, always greater than 0
+    def secondsUntilWindowStart(self, timestamp):
+        seconds = (self.windowStart - self.getTimeOfDay(timestamp)) % self.SECONDS_PER_DAY
+        return seconds if seconds > 0 else self.SECONDS_PER_DAY
+
+
+    # marks the data as caught up so the rest of the current window is not polled hard
+    # timestamp : (optional) unix timestamp new data was found, default is now
+    # return    : None
+    def markCaughtUp(self, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        if self.windowStart is None or not self.isInWindow(timestamp):
+            return
+        secondsToEnd = (self.windowEnd - self.getTimeOfDay(timestamp)) % self.SECONDS_PER_DAY
+        self.caughtUpUntil = max(self.caughtUpUntil, timestamp + secondsToEnd + 1)
+
+
+    # gets how long to wait before the next poll
+    # NOTE - backoff never waits past the start of the next window, so new data is not noticed later
+    # timestamp : (optional) unix timestamp of now
+    # return    : seconds to wait
+    def getNextInterval(self, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        if self.windowStart is None:
+            return self.baseInterval
+        if self.isInWindow(timestamp) and timestamp >= self.caughtUpUntil:
+            self.backoff = self.baseInterval
+            return self.baseInterval
+        # outside the window (or already caught up), backs off exponentially
+        self.backoff = min(self.backoff * 2, self.maxInterval)
+        return max(self.baseInterval, min(self.backoff, self.secondsUntilWindowStart(timestamp)))
@@ -0,0 +1,143 @@
+# profiles a single run of a function with cProfile and a sampling profiler
+# writes pstats (for snakeviz, pstats, etc.) and collapsed stacks (for flamegraph.pl, speedscope, etc.)
+# Copyright Michael Kukar 2020. MIT License.
+
+import sys, os, threading, time, cProfile, pstats, shutil, tempfile, pathlib, sqlite3
+
+class SamplingProfiler:
+
+    # interval : (optional) seconds between samples
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self.running = False
+        self.thread = None
+
+
+    # formats a frame into a single collapsed stack entry
+    # frame  : frame object
+    # return : string of "function (file:line)"
+    @staticmethod
+    def getFrameName(frame):
+        code = frame.f_code
+        return code.co_name + " (" + os.path.basename(code.co_filename) + ":" + str(code.co_firstlineno) + ")"
+
+
+    # records the current stack of every thread except this one
+    # return : None
+    def takeSample(self):
+        ownThreadId = threading.get_ident()
+        threadNames = {thread.ident: thread.name for thread in threading.enumerate()}
+        for threadId, frame in sys._current_frames().items():
+            if threadId == ownThreadId:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self.getFrameName(frame))
+                frame = frame.f_back
+            stack.append(threadNames.get(threadId, str(threadId)))
+            key = ';'.join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+
+    def run(self):
+        while self.running:
+            self.takeSample()
+            time.sleep(self.interval)
+
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='sampling_profiler', daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+
+    # writes the samples in collapsed stack format, one "frame;frame;frame count" per line
+    # filename : file to write
+    # return   : None
+    def writeCollapsed(self, filename):
+        with open(filename, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(stack + " " + str(count) + "\n")
+
+
+# runs a function under both profilers and writes their output
+# NOTE - a SystemExit raised by the function (e.g. a command line entry point) is caught
+# outputPrefix : path prefix of the <prefix>.pstats and <prefix>.collapsed files
+# function     : function to profile
+# args         : arguments of the function
+# return       : (pstats filename, collapsed stacks filename) tuple
+def profileCall(outputPrefix, function, *args):
+    profiler = cProfile.Profile()
+    sampler = SamplingProfiler()
+    sampler.start()
+    profiler.enable()
+    try:
+        function(*args)
+    except SystemExit:
+        pass
+    finally:
+        profiler.disable()
+        sampler.stop()
+
+    pstatsFilename = outputPrefix + ".pstats"
+    collapsedFilename = outputPrefix + ".collapsed"
+    profiler.dump_stats(pstatsFilename)
+    sampler.writeCollapsed(collapsedFilename)
+
+    print("Top functions by cumulative time:")
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+    print("Profile written to: \'" + pstatsFilename + "\'")
+    print("Collapsed stacks (" + str(sampler.samples) + " samples) written to: \'" + collapsedFilename + "\'")
+    return pstatsFilename, collapsedFilename
+
+
+# profiles one forced update cycle of the updater against local copies of its inputs
+# NOTE - the database is copied (without the days from the page's on) and texts are written to a file instead of being sent
+# configFile   : json configuration file
+# dbFile       : sqlite database file (left untouched)
+# outputPrefix : path prefix of the output files
+# url          : (optional) url the config's source is read from instead, defaults to the status page test fixture
+# return       : (pstats filename, collapsed stacks filename) tuple
+def profileUpdateCycle(configFile, dbFile, outputPrefix, url=None):
+    from covid19_updater import Covid19Updater
+    from notification_channels import FileSinkChannel
+    from data_sources import HtmlPageSource
+    from entry_record import EntryRecord
+    import data_cache
+
+    tempDir = tempfile.mkdtemp()
+    try:
+        tempDbFile = os.path.join(tempDir, os.path.basename(dbFile))
+        shutil.copyfile(dbFile, tempDbFile)
+        cu = Covid19Updater(configFile, tempDbFile)
+        # the source is replaced rather than SD_COVID19_URL, since a configured source's url takes priority over it
+        if url is None:
+            cu.wr.source = HtmlPageSource(url=pathlib.Path(os.path.dirname(os.path.abspath(__file__)), "test", "test_valid_data_website.html").as_uri())
+        else:
+            cu.wr.source.url = url
+        # the copy is trimmed to the days before the page's, so the page is stored, analyzed and sent like
+        # a new day instead of being rejected as older than the latest stored date
+        entry = EntryRecord.parse(cu.wr.readLatestEntryFromWeb())[0]
+        if entry is not None:
+            conn = sqlite3.connect(tempDbFile)
+            with conn:
+                conn.execute("DELETE FROM DATA WHERE DAY >= ?", (entry.getDay(),))
+            conn.close()
+            data_cache.bumpDataVersion(tempDbFile)
+            cu.refreshSnapshot(entry)
+        cu.channels = [FileSinkChannel(os.path.join(tempDir, "notifications.jsonl"))]
+        # runs subscribers inline and without debouncing so their work shows up in the profile
+        cu.bus.synchronous = True
+        cu.debounceSecs = 0
+        return profileCall(outputPrefix, cu.checkForUpdateAndSend, True)
+    finally:
+        shutil.rmtree(tempDir)
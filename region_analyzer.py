@@ -0,0 +1,202 @@
+# compares regions against each other, e.g. which county's cases grew fastest this week
+# every region database is attached to one connection and summarized by a single grouped window query
+# Copyright Michael Kukar 2020. MIT License.
+
+import os, sqlite3, threading, math
+
+import data_cache
+
+class RegionAnalyzer:
+
+    # latest days of one attached region, {schema} is the attached name
+    REGION_ROWS_QUERY = ("SELECT :region{idx} AS REGION, DAY, DATE, TOTAL_CASES, NEW_CASES from {schema}.DATA "
+        "WHERE DAY > (SELECT MAX(DAY) from {schema}.DATA) - :windowDays"
+    )
+    # one row per region, AGE is days before the region's latest day
+    # NOTE - daily cases fall back to the change in total cases for days without NEW_CASES
+    COMPARISON_QUERY = ("WITH REGION_ROWS AS ({regionRows}), "
+        "WINDOWED AS (SELECT REGION, DATE, TOTAL_CASES, "
+        "MAX(DAY) OVER (PARTITION BY REGION) - DAY AS AGE, "
+        "COALESCE(NEW_CASES, TOTAL_CASES - LAG(TOTAL_CASES) OVER (PARTITION BY REGION ORDER BY DAY)) AS DAILY_CASES "
+        "from REGION_ROWS) "
+        "SELECT REGION, "
+        "MAX(CASE WHEN AGE = 0 THEN DATE END), "
+        "MAX(CASE WHEN AGE = 0 THEN TOTAL_CASES END), "
+        "MAX(CASE WHEN AGE = :rollingDays THEN TOTAL_CASES END), "
+        "AVG(CASE WHEN AGE < :rollingDays THEN DAILY_CASES END), "
+        "AVG(CASE WHEN AGE >= :rollingDays AND AGE < 2 * :rollingDays THEN DAILY_CASES END) "
+        "from WINDOWED GROUP BY REGION"
+    )
+
+    # statistics regions are ranked by, higher ranks first
+    RANKED_STATISTICS = ['weekly_growth', 'mean_new_cases', 'week_over_week']
+
+
+    # regions     : dict of region name to sqlite database file
+    # rollingDays : (optional) number of days in each rolling window
+    # cacheSize   : (optional) number of comparisons to memoize
+    def __init__(self, regions, rollingDays=7, cacheSize=8):
+        self.regions = regions
+        self.rollingDays = rollingDays
+        self.cache = data_cache.LRUCache(cacheSize)
+        self.lock = threading.Lock()
+        # (connection, list of (schema, region name)) tuples, opened on first use
+        self.connections = None
+
+
+    # opens the connections every region database is attached to, as few as the attach limit allows
+    # NOTE - callers must hold lock
+    # return : list of (connection, list of (schema, region name)) tuples
+    def getConnections(self):
+        if self.connections is None:
+            connections = []
+            names = sorted(self.regions)
+            while len(names) > 0:
+                conn = sqlite3.connect(':memory:', uri=True, check_same_thread=False)
+                attachLimit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+                attached = []
+                for idx, name in enumerate(names[:attachLimit]):
+                    schema = "region" + str(idx)
+                    try:
+                        # read only, comparing never writes to or creates a region database
+                        conn.execute("ATTACH DATABASE ? AS " + schema, ('file:' + os.path.abspath(self.regions[name]) + '?mode=ro',))
+                    except sqlite3.Error as e:
+                        print("ERROR: could not open database of region " + name + ": " + str(e))
+                        continue
+                    attached.append((schema, name))
+                names = names[attachLimit:]
+                connections.append((conn, attached))
+            self.connections = connections
+        return self.connections
+
+
+    # closes the connections to the region databases
+    # return : None
+    def close(self):
+        with self.lock:
+            if self.connections is not None:
+                for conn, attached in self.connections:
+                    conn.close()
+                self.connections = None
+
+
+    # gets the key that identifies the current state of every region's data
+    # NOTE - PRAGMA data_version moves when any other connection (or process) writes to a database
+    # return : tuple of data versions
+    def getDataKey(self):
+        with self.lock:
+            return tuple(conn.execute("PRAGMA " + schema + ".data_version").fetchone()[0]
+                for conn, attached in self.getConnections() for schema, name in attached)
+
+
+    # summarizes every region's latest rolling windows, one query per connection
+    # NOTE - a region whose database can not be read (e.g. no DATA table, or made before the DAY column)
+    #        is logged and left out, so it never stops the other regions' comparison
+    # return : dict of region name to dict of statistics
+    def readRegionStatistics(self):
+        statistics = {}
+        with self.lock:
+            for conn, attached in self.getConnections():
+                try:
+                    statistics.update(self.readAttachedStatistics(conn, attached))
+                except sqlite3.Error:
+                    # reads the regions one at a time to find the broken ones
+                    for region in attached:
+                        try:
+                            statistics.update(self.readAttachedStatistics(conn, [region]))
+                        except sqlite3.Error as e:
+                            print("ERROR: could not compare region " + region[1] + ": " + str(e))
+        return statistics
+
+
+    # summarizes the latest rolling windows of regions attached to one connection in a single query
+    # conn     : connection the regions are attached to
+    # attached : list of (schema, region name) tuples
+    # return   : dict of region name to dict of statistics, raises sqlite3.Error on error
+    def readAttachedStatistics(self, conn, attached):
+        statistics = {}
+        if len(attached) == 0:
+            return statistics
+        params = {'windowDays' : 2 * self.rollingDays + 1, 'rollingDays' : self.rollingDays}
+        regionRows = []
+        for idx, (schema, name) in enumerate(attached):
+            params['region' + str(idx)] = name
+            regionRows.append(self.REGION_ROWS_QUERY.format(idx=idx, schema=schema))
+        query = self.COMPARISON_QUERY.format(regionRows=" UNION ALL ".join(regionRows))
+        for name, latestDate, totalCases, pastTotalCases, meanNewCases, previousMeanNewCases in conn.execute(query, params):
+            statistics[name] = {
+                'date' : latestDate,
+                'total_cases' : totalCases,
+                'mean_new_cases' : meanNewCases,
+                'previous_mean_new_cases' : previousMeanNewCases,
+                'week_over_week' : None,
+                'weekly_growth' : None,
+                'doubling_time' : None
+            }
+            if meanNewCases is not None and previousMeanNewCases:
+                statistics[name]['week_over_week'] = 100.0 * (meanNewCases - previousMeanNewCases) / previousMeanNewCases
+            if totalCases is not None and pastTotalCases:
+                statistics[name]['weekly_growth'] = 100.0 * (totalCases - pastTotalCases) / pastTotalCases
+                if totalCases > pastTotalCases:
+                    statistics[name]['doubling_time'] = self.rollingDays * math.log(2) / math.log(totalCases / pastTotalCases)
+        return statistics
+
+
+    # compares every region, cached until any region's data changes
+    # NOTE - the cached value is shared between callers, so it must not be modified
+    # return : dict of 'regions' (region name to statistics with 'ranks' and 'percentiles' of each
+    #          ranked statistic, None where the region has no value) and 'leaders' (statistic to region name)
+    def getComparison(self):
+        key = (self.getDataKey(), self.rollingDays)
+        found, comparison = self.cache.get(key)
+        if found:
+            return comparison
+        statistics = self.readRegionStatistics()
+        leaders = {}
+        for statistic in self.RANKED_STATISTICS:
+            values = sorted(stats[statistic] for stats in statistics.values() if stats[statistic] is not None)
+            for name, stats in statistics.items():
+                stats.setdefault('ranks', {})[statistic] = None
+                stats.setdefault('percentiles', {})[statistic] = None
+                value = stats[statistic]
+                if value is None:
+                    continue
+                # ties share the higher rank, percentile is the share of the other regions below
+                below = sum(1 for other in values if other < value)
+                stats['ranks'][statistic] = len(values) - sum(1 for other in values if other <= value) + 1
+                stats['percentiles'][statistic] = 100.0 * below / (len(values) - 1) if len(values) > 1 else 100.0
+                if stats['ranks'][statistic] == 1:
+                    leaders.setdefault(statistic, name)
+        comparison = {'regions' : statistics, 'leaders' : leaders}
+        self.cache.put(key, comparison)
+        return comparison
+
+
+    # facts about how a region compares to the others
+    # region : region name
+    # return : list of (importance, fact) tuples
+    def getRegionFacts(self, region):
+        comparison = self.getComparison()
+        stats = comparison['regions'].get(region)
+        if stats is None or stats['ranks']['weekly_growth'] is None:
+            return []
+        ranked = sum(1 for other in comparison['regions'].values() if other['ranks']['weekly_growth'] is not None)
+        if ranked < 2:
+            return []
+        rank = stats['ranks']['weekly_growth']
+        growth = stats['weekly_growth']
+        if rank == 1:
+            return [(60, f'Cases here grew the fastest of {ranked} regions this week ({growth:+.1f}%)')]
+        if rank == ranked:
+            return [(25, f'Cases here grew the slowest of {ranked} regions this week ({growth:+.1f}%)')]
+        return [(25, f'Cases here grew the {self.getOrdinal(rank)} fastest of {ranked} regions this week ({growth:+.1f}%)')]
+
+
+    # gets the ordinal of a number, e.g. 2nd
+    # number : positive int
+    # return : string
+    @staticmethod
+    def getOrdinal(number):
+        if 10 <= number % 100 <= 20:
+            return str(number) + 'th'
+        return str(number) + {1 : 'st', 2 : 'nd', 3 : 'rd'}.get(number % 10, 'th')
@@ -0,0 +1,232 @@
+# samples the process's memory, file descriptors, threads and garbage collector on an interval
+# so a slow leak in a daemon running for months shows up in its log long before it runs out
+# Copyright Michael Kukar 2020. MIT License.
+
+import os, sys, gc, time, threading, collections
+
+class ResourceMonitor:
+
+    # samples kept to compare against, a leak is growth across all of them
+    HISTORY_SIZE = 60
+    # growth across the history that is reported as a possible leak
+    RSS_GROWTH_WARNING = 0.5
+    FD_GROWTH_WARNING = 20
+    THREAD_GROWTH_WARNING = 10
+    # frames kept per allocation while tracing, more frames costs more memory
+    TRACEMALLOC_FRAMES = 5
+
+
+    # intervalSecs : (optional) seconds between samples logged by start()
+    # clock        : (optional) function returning the current time in seconds
+    def __init__(self, intervalSecs=3600, clock=time.time):
+        self.intervalSecs = intervalSecs
+        self.clock = clock
+        self.startTime = clock()
+        self.history = collections.deque(maxlen=self.HISTORY_SIZE)
+        self.lock = threading.Lock()
+        self.timer = None
+        self.running = False
+        # tracemalloc snapshot of the last top allocators report, the next one shows growth since it
+        self.tracemallocSnapshot = None
+
+
+    # reads the resident memory of this process
+    # NOTE - /proc is only on linux, elsewhere this is the peak resident memory instead
+    # return : bytes, or None if unknown
+    @staticmethod
+    def getRssBytes():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            pass
+        try:
+            import resource
+            maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # kilobytes on linux, bytes on macos
+            return maxRss if sys.platform == 'darwin' else maxRss * 1024
+        except (ImportError, OSError):
+            return None
+
+
+    # counts the open file descriptors (database connections, sockets, files) of this process
+    # return : count, or None if unknown
+    @staticmethod
+    def getOpenFdCount():
+        for fdDir in ['/proc/self/fd', '/dev/fd']:
+            try:
+                return len(os.listdir(fdDir))
+            except OSError:
+                continue
+        return None
+
+
+    # takes a sample of the process's resources
+    # keep   : (optional) keeps the sample in the history leaks are looked for in
+    # return : dict of the sample
+    def takeSample(self, keep=True):
+        gcStats = gc.get_stats()
+        sample = {
+            'time' : self.clock(),
+            'uptime_secs' : round(self.clock() - self.startTime, 1),
+            'rss_bytes' : self.getRssBytes(),
+            'open_fds' : self.getOpenFdCount(),
+            'threads' : threading.active_count(),
+            'gc_counts' : list(gc.get_count()),
+            'gc_collections' : [stats['collections'] for stats in gcStats],
+            'gc_collected' : [stats['collected'] for stats in gcStats],
+            'gc_uncollectable' : len(gc.garbage),
+            'gc_objects' : len(gc.get_objects())
+        }
+        if keep:
+            with self.lock:
+                self.history.append(sample)
+        return sample
+
+
+    # compares the newest sample to the oldest one kept
+    # return : dict of 'secs', 'rss_bytes', 'open_fds' and 'threads' growth (None if unknown), or None with under 2 samples
+    def getGrowth(self):
+        with self.lock:
+            if len(self.history) < 2:
+                return None
+            first, last = self.history[0], self.history[-1]
+        growth = {'secs' : last['time'] - first['time']}
+        for key in ['rss_bytes', 'open_fds', 'threads']:
+            growth[key] = last[key] - first[key] if last[key] is not None and first[key] is not None else None
+        return growth
+
+
+    # checks the history for steady growth that looks like a leak
+    # return : list of warning strings, empty if nothing grew past its threshold
+    def getLeakWarnings(self):
+        growth = self.getGrowth()
+        if growth is None:
+            return []
+        with self.lock:
+            firstRss = self.history[0]['rss_bytes']
+        hours = str(round(growth['secs'] / 3600, 1))
+        warnings = []
+        if growth['rss_bytes'] is not None and firstRss and growth['rss_bytes'] > firstRss * self.RSS_GROWTH_WARNING:
+            warnings.append("memory grew " + str(growth['rss_bytes'] // (1024 * 1024)) + " MB in " + hours + " hours")
+        if growth['open_fds'] is not None and growth['open_fds'] > self.FD_GROWTH_WARNING:
+            warnings.append("open file descriptors grew by " + str(growth['open_fds']) + " in " + hours + " hours")
+        if growth['threads'] > self.THREAD_GROWTH_WARNING:
+            warnings.append("threads grew by " + str(growth['threads']) + " in " + hours + " hours")
+        return warnings
+
+
+    # formats a sample as one log line
+    # sample : dict from takeSample()
+    # return : string
+    @staticmethod
+    def formatSample(sample):
+        rss = sample['rss_bytes']
+        return ("RESOURCES: rss=" + (str(round(rss / (1024 * 1024), 1)) + "MB" if rss is not None else "?")
+            + " fds=" + str(sample['open_fds'] if sample['open_fds'] is not None else "?")
+            + " threads=" + str(sample['threads'])
+            + " gc_counts=" + "/".join(str(count) for count in sample['gc_counts'])
+            + " gc_collections=" + "/".join(str(count) for count in sample['gc_collections'])
+            + " gc_uncollectable=" + str(sample['gc_uncollectable'])
+            + " uptime=" + str(round(sample['uptime_secs'] / 3600, 1)) + "h")
+
+
+    # samples, logs the sample and any leak warnings, and schedules the next sample
+    # return : None
+    def logSample(self):
+        print(self.formatSample(self.takeSample()))
+        for warning in self.getLeakWarnings():
+            print("WARNING: possible leak, " + warning)
+        with self.lock:
+            if self.running:
+                # one timer at a time, started only after this sample is done
+                self.timer = threading.Timer(self.intervalSecs, self.logSample)
+                self.timer.daemon = True
+                self.timer.name = 'resource_monitor'
+                self.timer.start()
+
+
+    # starts logging a sample every intervalSecs, the first one right away
+    # return : None
+    def start(self):
+        with self.lock:
+            self.running = True
+        self.logSample()
+
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+
+    # starts tracing python allocations so getTopAllocators() can report them
+    # NOTE - tracing slows allocations down and uses memory, so it is only started on demand
+    # return : None
+    def startTracing(self):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.TRACEMALLOC_FRAMES)
+        self.tracemallocSnapshot = tracemalloc.take_snapshot()
+
+
+    # stops tracing python allocations and frees the traces
+    # return : None
+    def stopTracing(self):
+        import tracemalloc
+        tracemalloc.stop()
+        self.tracemallocSnapshot = None
+
+
+    # gets the lines of code that allocated the most memory still in use, and their growth since the last call
+    # limit  : (optional) number of lines to return
+    # return : list of dicts with 'location', 'size_bytes', 'size_growth_bytes' and 'count', empty if not tracing
+    def getTopAllocators(self, limit=10):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")
+        ])
+        if self.tracemallocSnapshot is not None:
+            stats = snapshot.compare_to(self.tracemallocSnapshot, 'lineno')
+        else:
+            stats = snapshot.statistics('lineno')
+        self.tracemallocSnapshot = snapshot
+        topAllocators = []
+        for stat in sorted(stats, key=lambda stat: stat.size, reverse=True)[:limit]:
+            frame = stat.traceback[0]
+            topAllocators.append({
+                'location' : frame.filename + ":" + str(frame.lineno),
+                'size_bytes' : stat.size,
+                'size_growth_bytes' : getattr(stat, 'size_diff', None),
+                'count' : stat.count
+            })
+        return topAllocators
+
+
+    # starts tracing on the first signal and logs the top allocators on each one after it
+    # NOTE - e.g. `kill -USR1 <pid>` on a daemon started with nohup, only on platforms with SIGUSR1
+    # return : true if the handler was installed, false otherwise
+    def installSignalHandler(self):
+        import signal
+        if not hasattr(signal, 'SIGUSR1') or threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.logTopAllocators())
+        return True
+
+
+    # logs the top allocators, starting tracing if it is not on yet
+    # return : None
+    def logTopAllocators(self):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            self.startTracing()
+            print("RESOURCES: tracing allocations, signal again to see the top allocators since now")
+            return
+        for allocator in self.getTopAllocators():
+            print("RESOURCES: " + allocator['location'] + " size=" + str(allocator['size_bytes'] // 1024) + "KB"
+                + " growth=" + str((allocator['size_growth_bytes'] or 0) // 1024) + "KB count=" + str(allocator['count']))
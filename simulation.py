@@ -0,0 +1,468 @@
+# replays a historical dataset against the real updater, so it can be load tested without waiting on the county
+# a local stand-in status page publishes one day every N seconds, the supervisor runs the updater for each
+# simulated region against it and a local smtp sink captures every text to measure publish to delivery latency
+# Copyright Michael Kukar 2020. MIT License.
+
+import sys, os, json, time, argparse, sqlite3, shutil, tempfile, threading, statistics, socketserver
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from datetime import timedelta
+
+from entry_record import EntryRecord
+
+class SimulatedCounty:
+
+    # same structure as the county status table, so the page is read by the real HtmlPageSource
+    PAGE_TEMPLATE = ("<html><body><table><tbody>"
+        "<tr><td><p><i>Table updated {updated}, with data through {through}.</i></p></td></tr>"
+        "{rows}"
+        "</tbody></table></body></html>"
+    )
+    ROW_TEMPLATE = "<tr><td><b>{name}</b></td><td><b>{value:,}</b></td></tr>"
+    # (row name, entry field) of each row on the page, fields without a value are left off
+    PAGE_ROWS = [
+        ('Total Positives', 'total_cases'),
+        ('Hospitalizations', 'hospitalizations'),
+        ('Intensive Care', 'intensive_care'),
+        ('Deaths', 'deaths')
+    ]
+
+
+    # records     : list of EntryRecords, oldest first
+    # stepSecs    : seconds between each day being published
+    # firstDayIdx : (optional) index of the record shown before the first step
+    # clock       : (optional) function returning the current time in seconds
+    def __init__(self, records, stepSecs, firstDayIdx=0, clock=time.time):
+        self.records = records
+        self.stepSecs = stepSecs
+        self.firstDayIdx = firstDayIdx
+        self.clock = clock
+        self.startTime = None
+        self.server = None
+        self.url = None
+
+
+    # starts serving the page, the first step is published stepSecs from now
+    # host   : (optional) interface to listen on
+    # port   : (optional) port to listen on, 0 picks a free one
+    # return : None
+    def start(self, host='127.0.0.1', port=0):
+        self.startTime = self.clock()
+        county = self
+        class StatusPageHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = county.renderPage(county.records[county.getDayIdx()]).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, format, *args):
+                pass
+        self.server = ThreadingHTTPServer((host, port), StatusPageHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='simulated_county', daemon=True).start()
+        self.url = "http://" + host + ":" + str(self.server.server_address[1]) + "/status.html"
+
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+    # gets the index of the day currently published
+    # now    : (optional) current time
+    # return : index into records
+    def getDayIdx(self, now=None):
+        if now is None:
+            now = self.clock()
+        steps = int(max(now - self.startTime, 0) // self.stepSecs)
+        return min(self.firstDayIdx + steps, len(self.records) - 1)
+
+
+    # gets the time a day was (or will be) published
+    # dayIdx : index into records, after firstDayIdx
+    # return : time in seconds
+    def getPublishTime(self, dayIdx):
+        return self.startTime + (dayIdx - self.firstDayIdx) * self.stepSecs
+
+
+    # renders the status page of a day
+    # record : EntryRecord of the day
+    # return : html string
+    @classmethod
+    def renderPage(cls, record):
+        day = record.getDate()
+        rows = ""
+        for name, field in cls.PAGE_ROWS:
+            value = getattr(record, field)
+            if value is not None:
+                rows += cls.ROW_TEMPLATE.format(name=name, value=value)
+        return cls.PAGE_TEMPLATE.format(
+            updated=(day + timedelta(days=1)).strftime('%B %d, %Y'),
+            through=day.strftime('%B %d, %Y'),
+            rows=rows
+        )
+
+
+class SmtpSink:
+
+    # clock : (optional) function returning the current time in seconds
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.messages = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.port = None
+
+
+    # starts accepting mail, any login is accepted and nothing is delivered
+    # host   : (optional) interface to listen on
+    # port   : (optional) port to listen on, 0 picks a free one
+    # return : None
+    def start(self, host='127.0.0.1', port=0):
+        sink = self
+        class SmtpSinkHandler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write((line + "\r\n").encode())
+            def handle(self):
+                self.reply("220 simulation ESMTP")
+                recipients = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode('ascii', 'replace').strip()
+                    verb = command.split(' ')[0].upper()
+                    if verb == 'EHLO':
+                        self.reply("250-simulation")
+                        self.reply("250-AUTH PLAIN LOGIN")
+                        self.reply("250 8BITMIME")
+                    elif verb == 'AUTH':
+                        # prompts for whatever was not sent with the command, then accepts it
+                        parts = command.split(' ')
+                        if parts[1].upper() == 'LOGIN':
+                            if len(parts) < 3:
+                                self.reply("334 VXNlcm5hbWU6")
+                                self.rfile.readline()
+                            self.reply("334 UGFzc3dvcmQ6")
+                            self.rfile.readline()
+                        elif len(parts) < 3:
+                            self.reply("334 ")
+                            self.rfile.readline()
+                        self.reply("235 2.7.0 Authentication successful")
+                    elif verb in ['MAIL', 'RSET']:
+                        recipients = []
+                        self.reply("250 OK")
+                    elif verb == 'RCPT':
+                        recipients.append(command[command.find('<') + 1:command.find('>')])
+                        self.reply("250 OK")
+                    elif verb == 'DATA':
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        data = []
+                        while True:
+                            line = self.rfile.readline()
+                            if not line or line in [b".\r\n", b".\n"]:
+                                break
+                            # removes dot stuffing
+                            data.append(line[1:] if line.startswith(b"..") else line)
+                        sink.record(recipients, b"".join(data))
+                        recipients = []
+                        self.reply("250 OK")
+                    elif verb in ['HELO', 'NOOP']:
+                        self.reply("250 OK")
+                    elif verb == 'QUIT':
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((host, port), SmtpSinkHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='smtp_sink', daemon=True).start()
+        self.port = self.server.server_address[1]
+
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+    # stores a received message
+    # recipients : list of recipient addresses of the message
+    # data       : bytes of the message
+    # return     : None
+    def record(self, recipients, data):
+        import email, email.policy
+        message = email.message_from_bytes(data, policy=email.policy.default)
+        with self.lock:
+            self.messages.append({
+                'time' : self.clock(),
+                'recipients' : recipients,
+                'text' : message.get_content().replace('\r\n', '\n').strip()
+            })
+
+
+    # gets every message received so far
+    # return : list of dicts with 'time', 'recipients' and 'text', oldest first
+    def getMessages(self):
+        with self.lock:
+            return list(self.messages)
+
+
+# matches every captured text to the region and day it reports on and measures how long each took
+# NOTE - the update text names its day by total cases, texts without it (e.g. the analysis text) belong to
+#        the recipient's last update, recipients are numbered so their first 3 digits are the region
+# messages           : list of SmtpSink message dicts
+# publishTimes       : dict of YYYY-MM-DD date to the time the day was published
+# totalCases         : dict of YYYY-MM-DD date to total cases of the day
+# recipientsPerRegion: dict of region number string (e.g. '001') to number of subscribers
+# return             : dict of 'days' (list of one dict per region and day) and 'summary'
+def getLatencyReport(messages, publishTimes, totalCases, recipientsPerRegion):
+    datesByTotal = {}
+    for day, total in totalCases.items():
+        datesByTotal.setdefault(str(total), []).append(day)
+    deliveries = {}
+    lastDates = {}
+    for message in sorted(messages, key=lambda message: message['time']):
+        messageDate = None
+        for line in message['text'].splitlines():
+            if line.startswith("Total Cases: "):
+                # a total can repeat across days, the latest day already published is the one reported
+                published = [day for day in datesByTotal.get(line[len("Total Cases: "):].strip(), []) if publishTimes.get(day, float('inf')) <= message['time']]
+                messageDate = max(published) if len(published) > 0 else None
+        for recipient in message['recipients']:
+            if messageDate is not None:
+                lastDates[recipient] = messageDate
+            recipientDate = lastDates.get(recipient)
+            if recipientDate is None:
+                continue
+            delivery = deliveries.setdefault((recipient[:3], recipientDate), {'times' : [], 'recipients' : set()})
+            delivery['times'].append(message['time'])
+            if messageDate is not None:
+                delivery['recipients'].add(recipient)
+
+    days = []
+    for day in sorted(publishTimes):
+        for region in sorted(recipientsPerRegion):
+            delivery = deliveries.get((region, day), {'times' : [], 'recipients' : set()})
+            hasTimes = len(delivery['times']) > 0
+            days.append({
+                'date' : day,
+                'region' : region,
+                'delivered' : len(delivery['recipients']),
+                'expected' : recipientsPerRegion[region],
+                'first_latency' : min(delivery['times']) - publishTimes[day] if hasTimes else None,
+                'last_latency' : max(delivery['times']) - publishTimes[day] if hasTimes else None
+            })
+    lastLatencies = sorted(day['last_latency'] for day in days if day['last_latency'] is not None)
+    summary = {
+        'messages' : len(messages),
+        'delivered' : sum(day['delivered'] for day in days),
+        'expected' : sum(day['expected'] for day in days),
+        'median_last_latency' : statistics.median(lastLatencies) if len(lastLatencies) > 0 else None,
+        'p95_last_latency' : lastLatencies[min(int(len(lastLatencies) * 0.95), len(lastLatencies) - 1)] if len(lastLatencies) > 0 else None,
+        'max_last_latency' : lastLatencies[-1] if len(lastLatencies) > 0 else None
+    }
+    return {'days' : days, 'summary' : summary}
+
+
+# prints a latency report
+# report : dict from getLatencyReport()
+# return : None
+def printReport(report):
+    def formatSecs(secs):
+        return "-" if secs is None else "{:.2f}s".format(secs)
+    print("Date       | Region | Delivered | First   | Last")
+    for day in report['days']:
+        print(day['date'] + " | " + day['region'].ljust(6) + " | " + (str(day['delivered']) + "/" + str(day['expected'])).ljust(9)
+            + " | " + formatSecs(day['first_latency']).ljust(7) + " | " + formatSecs(day['last_latency']))
+    summary = report['summary']
+    print("Texts captured       : " + str(summary['messages']))
+    print("Updates delivered    : " + str(summary['delivered']) + " of " + str(summary['expected']))
+    print("Publish to last text : median " + formatSecs(summary['median_last_latency']) + ", p95 " + formatSecs(summary['p95_last_latency'])
+        + ", max " + formatSecs(summary['max_last_latency']))
+
+
+# reads a dataset to replay
+# filename : JSON dataset (as made by initialize_db_file.py --dump_to_json) or sqlite database file
+# return   : list of EntryRecords, oldest first
+def readRecords(filename):
+    if filename.endswith('.json'):
+        from initialize_db_file import readDataset
+        return sorted(readDataset(filename), key=lambda record: record.date)
+    conn = sqlite3.connect('file:' + os.path.abspath(filename) + '?mode=ro', uri=True)
+    conn.row_factory = EntryRecord.fromRow
+    records = conn.execute("SELECT DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS from DATA ORDER BY DAY ASC").fetchall()
+    conn.close()
+    return records
+
+
+class Simulation:
+
+    # seconds without a new text before the last day is considered delivered
+    QUIET_SECS = 2.0
+    # seconds between checks of the workers and the sink
+    CHECK_INTERVAL = 0.25
+
+    # records     : list of EntryRecords to replay, oldest first
+    # regions     : (optional) number of regions, each with its own database and updater
+    # subscribers : (optional) number of subscribers of each region
+    # stepSecs    : (optional) seconds between each day being published
+    # days        : (optional) number of days to publish
+    # historyDays : (optional) days stored in each database before the first one is published
+    # workers     : (optional) worker processes (subscriber shards) of each region
+    # interval    : (optional) seconds between polls of each updater
+    # rateLimits  : (optional) keeps the default gateway rate limits, false lifts them
+    # drainSecs   : (optional) longest wait for texts after the last day is published
+    def __init__(self, records, regions=1, subscribers=10, stepSecs=10.0, days=5, historyDays=7, workers=1, interval=1.0, rateLimits=True, drainSecs=120.0):
+        historyDays = max(historyDays, 1)
+        self.records = records[:historyDays + days]
+        self.historyDays = historyDays
+        self.regions = regions
+        self.subscribers = subscribers
+        self.workers = workers
+        self.interval = interval
+        self.rateLimits = rateLimits
+        self.drainSecs = drainSecs
+        self.county = SimulatedCounty(self.records, stepSecs, firstDayIdx=historyDays - 1)
+        self.sink = SmtpSink()
+        self.workDir = None
+
+
+    # gets a subscriber's phone number, its first 3 digits are the region
+    # regionIdx     : index of the region
+    # subscriberIdx : index of the subscriber in the region
+    # return        : 10 digit string
+    @staticmethod
+    def getPhoneNumber(regionIdx, subscriberIdx):
+        return "{:03d}{:07d}".format(regionIdx + 1, subscriberIdx)
+
+
+    # writes the database and config of every region and the supervisor config
+    # NOTE - the sink must be started first, its port goes in the configs
+    # return : supervisor config filename
+    def writeRegions(self):
+        from initialize_db_file import createTables
+        from web_reader import WebReader
+        from email_texter import EmailTexter, SendScheduler
+        carriers = sorted(EmailTexter.SUPPORTED_CARRIERS)
+        regions = []
+        for regionIdx in range(self.regions):
+            name = "region_" + str(regionIdx + 1)
+            dbFile = os.path.join(self.workDir, name + ".db")
+            conn = sqlite3.connect(dbFile)
+            createTables(conn)
+            conn.executemany(WebReader.ADD_ENTRY_COMMAND, [(record.getDay(),) + record for record in self.records[:self.historyDays]])
+            conn.commit()
+            conn.close()
+            config = {
+                'email_credentials' : {'user' : 'simulation', 'pass' : 'simulation', 'url' : '127.0.0.1', 'port' : self.sink.port, 'ssl' : False},
+                'phone_credentials' : [{'number' : self.getPhoneNumber(regionIdx, idx), 'carrier' : carriers[idx % len(carriers)]} for idx in range(self.subscribers)]
+            }
+            if not self.rateLimits:
+                unlimited = {'rate' : 1000000.0, 'burst' : 1000000}
+                config['rate_limits'] = {
+                    'domains' : {domain: unlimited for domain in SendScheduler.DEFAULT_DOMAIN_LIMITS},
+                    'sender' : unlimited
+                }
+            configFile = os.path.join(self.workDir, name + ".json")
+            with open(configFile, 'w') as f:
+                json.dump(config, f, indent=4)
+            regions.append({'name' : name, 'config' : configFile, 'database' : dbFile, 'url' : self.county.url, 'workers' : self.workers})
+        supervisorConfigFile = os.path.join(self.workDir, "supervisor.json")
+        with open(supervisorConfigFile, 'w') as f:
+            json.dump({'interval' : self.interval, 'regions' : regions}, f, indent=4)
+        return supervisorConfigFile
+
+
+    # builds the latency report of every day published so far
+    # return : dict from getLatencyReport()
+    def getReport(self):
+        publishTimes = {}
+        for dayIdx in range(self.historyDays, self.county.getDayIdx() + 1):
+            publishTimes[self.records[dayIdx].date] = self.county.getPublishTime(dayIdx)
+        totalCases = {record.date: record.total_cases for record in self.records[self.historyDays:]}
+        recipientsPerRegion = {self.getPhoneNumber(regionIdx, 0)[:3]: self.subscribers for regionIdx in range(self.regions)}
+        return getLatencyReport(self.sink.getMessages(), publishTimes, totalCases, recipientsPerRegion)
+
+
+    # checks if every day has been published and delivered to every subscriber
+    # return : true if the simulation can stop
+    def isDone(self):
+        if self.county.getDayIdx() < len(self.records) - 1:
+            return False
+        messages = self.sink.getMessages()
+        if len(messages) > 0 and time.time() - messages[-1]['time'] < self.QUIET_SECS:
+            return False
+        report = self.getReport()
+        return report['summary']['delivered'] >= report['summary']['expected']
+
+
+    # runs the real updater for every region against the simulated county until every day is delivered
+    # workDir : (optional) directory for the databases and configs, a temporary one is removed afterwards
+    # return  : dict from getLatencyReport()
+    def run(self, workDir=None):
+        from supervisor import Supervisor
+        self.workDir = workDir if workDir is not None else tempfile.mkdtemp(prefix="simulation_")
+        supervisor = None
+        try:
+            self.sink.start()
+            self.county.start()
+            supervisor = Supervisor(self.writeRegions())
+            if not supervisor.start():
+                raise Exception("could not start the supervisor")
+            lastPublishTime = self.county.getPublishTime(len(self.records) - 1)
+            while not self.isDone() and time.time() < lastPublishTime + self.drainSecs:
+                time.sleep(self.CHECK_INTERVAL)
+                supervisor.checkWorkers()
+            return self.getReport()
+        finally:
+            if supervisor is not None:
+                supervisor.stop()
+            self.county.stop()
+            self.sink.stop()
+            if workDir is None:
+                shutil.rmtree(self.workDir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Replays a dataset through a local status page and smtp sink to load test the updater',
+        epilog='Copyright Michael Kukar 2020. MIT License.'
+        )
+    parser.add_argument("-d", "--dataset", dest="dataset", default="dataset_up_to_4_25.json", help="JSON dataset or sqlite database to replay")
+    parser.add_argument("-r", "--regions", type=int, dest="regions", default=1, help="number of regions, each with its own database and updater")
+    parser.add_argument("-m", "--subscribers", type=int, dest="subscribers", default=10, help="number of subscribers of each region")
+    parser.add_argument("-n", "--step", type=float, dest="step", default=10.0, help="seconds between each day being published")
+    parser.add_argument("--days", type=int, dest="days", default=5, help="number of days to publish")
+    parser.add_argument("--history", type=int, dest="history", default=7, help="days stored in each database before the first one is published")
+    parser.add_argument("-w", "--workers", type=int, dest="workers", default=1, help="worker processes (subscriber shards) of each region")
+    parser.add_argument("-i", "--interval", type=float, dest="interval", default=1.0, help="seconds between polls of each updater")
+    parser.add_argument("--no_rate_limits", action="store_false", dest="rate_limits", help="lifts the gateway and sender rate limits")
+    parser.add_argument("--drain", type=float, dest="drain", default=120.0, help="longest wait in seconds for texts after the last day is published")
+    parser.add_argument("--keep", dest="keep", default=None, metavar="DIR", help="writes the databases and configs to DIR and keeps them")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.dataset):
+        print("ERROR: Dataset file not found.")
+        sys.exit(1)
+    try:
+        records = readRecords(args.dataset)
+    except Exception as e:
+        print("ERROR: Problem reading the dataset: " + str(e))
+        sys.exit(2)
+    if len(records) < 2:
+        print("ERROR: Dataset needs at least two days.")
+        sys.exit(2)
+
+    simulation = Simulation(records, regions=args.regions, subscribers=args.subscribers, stepSecs=args.step, days=args.days,
+        historyDays=args.history, workers=args.workers, interval=args.interval, rateLimits=args.rate_limits, drainSecs=args.drain)
+    print("Simulating " + str(len(simulation.records) - simulation.historyDays) + " days, one every " + str(args.step) + " seconds, for "
+        + str(args.regions) + " region(s) of " + str(args.subscribers) + " subscribers")
+    if args.keep is not None:
+        os.makedirs(args.keep, exist_ok=True)
+    printReport(simulation.run(workDir=args.keep))
@@ -0,0 +1,255 @@
+# subscribers kept in the region's database, so they can be managed while the updater runs
+# and streamed in pages at send time instead of being held in memory
+# Copyright Michael Kukar 2020. MIT License.
+
+import sys, os, json, time, argparse, sqlite3
+from datetime import date
+
+from email_texter import EmailTexter
+
+class SubscriberStore:
+
+    # region of subscribers added without one, several regions can share a database
+    DEFAULT_REGION = 'default'
+    # DIGEST is '' for subscribers getting every update
+    NO_DIGEST = ''
+    DEFAULT_PAGE_SIZE = 1000
+
+    CREATE_TABLE_COMMAND = ("CREATE TABLE IF NOT EXISTS SUBSCRIBERS "
+        "(ID INTEGER PRIMARY KEY,"
+        "REGION TEXT NOT NULL,"
+        "NUMBER CHAR(10) NOT NULL,"
+        "CARRIER TEXT NOT NULL,"
+        "DIGEST TEXT NOT NULL DEFAULT '',"
+        "ACTIVE INTEGER NOT NULL DEFAULT 1,"
+        "ADDED_AT INTEGER NOT NULL,"
+        "UNIQUE (REGION, NUMBER)"
+        ");"
+        )
+    # a page is a range scan of this index, ID last so each page starts where the previous one ended
+    CREATE_INDEX_COMMAND = "CREATE INDEX IF NOT EXISTS SUBSCRIBERS_FANOUT_INDEX ON SUBSCRIBERS (REGION, ACTIVE, DIGEST, CARRIER, ID);"
+
+    # adding a number again reactivates it with its new carrier and digest
+    ADD_COMMAND = ("INSERT INTO SUBSCRIBERS (REGION, NUMBER, CARRIER, DIGEST, ACTIVE, ADDED_AT) VALUES (?, ?, ?, ?, 1, ?) "
+        "ON CONFLICT (REGION, NUMBER) DO UPDATE SET CARRIER = excluded.CARRIER, DIGEST = excluded.DIGEST, ACTIVE = 1;"
+        )
+    DEACTIVATE_COMMAND = "UPDATE SUBSCRIBERS SET ACTIVE = 0 WHERE REGION = ? AND NUMBER = ? AND ACTIVE = 1;"
+    # NOTE - shards keep every count-th subscriber by ID, the same split as phone_credentials
+    PAGE_QUERY = ("SELECT ID, NUMBER from SUBSCRIBERS "
+        "WHERE REGION = :region AND ACTIVE = 1 AND DIGEST = :digest AND CARRIER = :carrier AND ID > :afterId AND ID % :shardCount = :shardIndex "
+        "ORDER BY ID LIMIT :pageSize"
+        )
+    # date each shard of a region last sent each digest on
+    CREATE_DIGEST_LOG_COMMAND = ("CREATE TABLE IF NOT EXISTS DIGEST_LOG "
+        "(REGION TEXT NOT NULL,"
+        "SHARD INTEGER NOT NULL,"
+        "DIGEST TEXT NOT NULL,"
+        "SENT_DATE CHAR(10) NOT NULL,"
+        "PRIMARY KEY (REGION, SHARD, DIGEST)"
+        ");"
+        )
+    WRITE_DIGEST_DATE_COMMAND = ("INSERT INTO DIGEST_LOG (REGION, SHARD, DIGEST, SENT_DATE) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (REGION, SHARD, DIGEST) DO UPDATE SET SENT_DATE = excluded.SENT_DATE;"
+        )
+    DIGEST_DATES_QUERY = "SELECT DIGEST, SENT_DATE from DIGEST_LOG WHERE REGION = ? AND SHARD = ?"
+    EXISTS_QUERY = "SELECT EXISTS (SELECT 1 from SUBSCRIBERS WHERE REGION = ? AND ACTIVE = 1 AND DIGEST = ?)"
+    COUNT_QUERY = "SELECT DIGEST, CARRIER, COUNT(*) from SUBSCRIBERS WHERE REGION = ? AND ACTIVE = 1 GROUP BY DIGEST, CARRIER"
+
+
+    # dbFilename : sqlite database file
+    # region     : (optional) region whose subscribers are read and changed
+    # shard      : (optional) (index, count) tuple, pages only hold every count-th subscriber starting at index
+    # pageSize   : (optional) most subscribers read per query
+    def __init__(self, dbFilename, region=DEFAULT_REGION, shard=(0, 1), pageSize=DEFAULT_PAGE_SIZE):
+        self.dbFilename = dbFilename
+        self.region = region
+        self.shardIndex, self.shardCount = shard
+        self.pageSize = pageSize
+        self.et = EmailTexter()
+
+
+    # creates the subscribers and digest log tables in databases made before they existed
+    # dbFilename : sqlite database file
+    # return     : true on success, false on error
+    @classmethod
+    def createTable(cls, dbFilename):
+        try:
+            conn = sqlite3.connect(dbFilename)
+            with conn:
+                conn.execute(cls.CREATE_TABLE_COMMAND)
+                conn.execute(cls.CREATE_INDEX_COMMAND)
+                conn.execute(cls.CREATE_DIGEST_LOG_COMMAND)
+            conn.close()
+        except sqlite3.Error as e:
+            print("ERROR: could not create subscribers table in " + dbFilename + ": " + str(e))
+            return False
+        return True
+
+
+    # adds (or reactivates) subscribers in one transaction
+    # subscribers : list of dicts with 'number', 'carrier' and optionally 'digest', as in phone_credentials
+    # return      : number of subscribers stored, None on error
+    # NOTE - subscribers with an invalid number or unsupported carrier are skipped
+    def addSubscribers(self, subscribers):
+        now = int(time.time())
+        rows = []
+        for subscriber in subscribers:
+            if self.et.getPhoneNumberEmailAddress(str(subscriber['number']), subscriber['carrier']) is None:
+                print("ERROR: skipping subscriber " + str(subscriber['number']) + " with an invalid number or unsupported carrier")
+                continue
+            digest = subscriber.get('digest')
+            rows.append((self.region, str(subscriber['number']), subscriber['carrier'], digest if digest is not None else self.NO_DIGEST, now))
+        try:
+            conn = sqlite3.connect(self.dbFilename)
+            with conn:
+                conn.executemany(self.ADD_COMMAND, rows)
+            conn.close()
+        except sqlite3.Error as e:
+            print("ERROR: could not add subscribers: " + str(e))
+            return None
+        return len(rows)
+
+
+    # stops sending to a subscriber, the row is kept so they can be reactivated
+    # number : 10 digit phone number string
+    # return : true if an active subscriber was removed, false otherwise
+    def removeSubscriber(self, number):
+        try:
+            conn = sqlite3.connect(self.dbFilename)
+            with conn:
+                removed = conn.execute(self.DEACTIVATE_COMMAND, (self.region, str(number))).rowcount
+            conn.close()
+        except sqlite3.Error as e:
+            print("ERROR: could not remove subscriber: " + str(e))
+            return False
+        return removed > 0
+
+
+    # checks if any subscriber of a digest is active
+    # digest : (optional) key of Covid19Updater.DIGEST_DAYS, None for subscribers getting every update
+    # return : true if there is at least one, false otherwise (or if the table does not exist)
+    def hasSubscribers(self, digest=None):
+        try:
+            conn = sqlite3.connect(self.dbFilename)
+            exists = conn.execute(self.EXISTS_QUERY, (self.region, digest if digest is not None else self.NO_DIGEST)).fetchone()[0]
+            conn.close()
+        except sqlite3.Error:
+            return False
+        return exists == 1
+
+
+    # reads the dates this shard last sent each digest on
+    # return : dict of digest to date object, empty if none were sent (or on error)
+    def readDigestDates(self):
+        try:
+            conn = sqlite3.connect(self.dbFilename)
+            digestDates = {digest: date.fromisoformat(sentDate) for digest, sentDate in conn.execute(self.DIGEST_DATES_QUERY, (self.region, self.shardIndex))}
+            conn.close()
+        except sqlite3.Error as e:
+            print("ERROR: could not read digest dates: " + str(e))
+            return {}
+        return digestDates
+
+
+    # records that this shard sent a digest
+    # digest : key of Covid19Updater.DIGEST_DAYS
+    # day    : date object the digest was sent on
+    # return : true on success, false on error
+    def writeDigestDate(self, digest, day):
+        try:
+            conn = sqlite3.connect(self.dbFilename)
+            with conn:
+                conn.execute(self.WRITE_DIGEST_DATE_COMMAND, (self.region, self.shardIndex, digest, day.isoformat()))
+            conn.close()
+        except sqlite3.Error as e:
+            print("ERROR: could not write digest date: " + str(e))
+            return False
+        return True
+
+
+    # counts active subscribers of the region
+    # return : dict of digest ('' for every update) to dict of carrier to count
+    def countSubscribers(self):
+        counts = {}
+        conn = sqlite3.connect(self.dbFilename)
+        for digest, carrier, count in conn.execute(self.COUNT_QUERY, (self.region,)):
+            counts.setdefault(digest, {})[carrier] = count
+        conn.close()
+        return counts
+
+
+    # reads the email addresses of active subscribers one page at a time
+    # NOTE - every page is its own query, so subscribers can be changed while a send is in progress and
+    #        no read transaction is held open while the page is sent
+    # digest : (optional) key of Covid19Updater.DIGEST_DAYS, None for subscribers getting every update
+    # return : iterator of lists of email addresses, each list on a single carrier
+    def readPages(self, digest=None):
+        params = {
+            'region' : self.region,
+            'digest' : digest if digest is not None else self.NO_DIGEST,
+            'shardCount' : self.shardCount,
+            'shardIndex' : self.shardIndex,
+            'pageSize' : self.pageSize
+        }
+        for carrier in self.et.SUPPORTED_CARRIERS:
+            params['carrier'] = carrier
+            params['afterId'] = 0
+            while True:
+                try:
+                    conn = sqlite3.connect(self.dbFilename)
+                    rows = conn.execute(self.PAGE_QUERY, params).fetchall()
+                    conn.close()
+                except sqlite3.Error as e:
+                    print("ERROR: could not read subscribers: " + str(e))
+                    return
+                if len(rows) == 0:
+                    break
+                yield [self.et.getPhoneNumberEmailAddress(number, carrier) for subscriberId, number in rows]
+                if len(rows) < self.pageSize:
+                    break
+                params['afterId'] = rows[-1][0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Manages the subscribers stored in a Covid19Updater database',
+        epilog='Copyright Michael Kukar 2020. MIT License.'
+        )
+    parser.add_argument("-f", "--file", dest="filename", default="covid19.db", help="sqlite database file")
+    parser.add_argument("-r", "--region", dest="region", default=SubscriberStore.DEFAULT_REGION, help="region of the subscribers (the 'region' in the updater config)")
+    parser.add_argument("--add", nargs=2, dest="add", metavar=("NUMBER", "CARRIER"), help="adds (or reactivates) a subscriber")
+    parser.add_argument("--digest", dest="digest", default=None, choices=["daily", "weekly"], help="with --add, sends the subscriber a daily or weekly digest instead of every update")
+    parser.add_argument("--remove", dest="remove", metavar="NUMBER", help="stops sending to a subscriber")
+    parser.add_argument("--import", dest="importConfig", metavar="CONFIG", help="adds every phone_credentials entry of a json config")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.filename):
+        print("ERROR: SQLite database file not found.")
+        sys.exit(1)
+    if not SubscriberStore.createTable(args.filename):
+        sys.exit(2)
+    store = SubscriberStore(args.filename, region=args.region)
+
+    if args.add is not None:
+        if store.addSubscribers([{'number' : args.add[0], 'carrier' : args.add[1], 'digest' : args.digest}]) != 1:
+            sys.exit(2)
+    elif args.remove is not None:
+        if not store.removeSubscriber(args.remove):
+            print("ERROR: No active subscriber " + args.remove + " in region " + args.region)
+            sys.exit(2)
+    elif args.importConfig is not None:
+        try:
+            with open(args.importConfig) as f:
+                phoneCredentials = json.load(f)['phone_credentials']
+        except Exception as e:
+            print("ERROR: Problem reading your config file: " + str(e))
+            sys.exit(2)
+        stored = store.addSubscribers(phoneCredentials)
+        if stored is None:
+            sys.exit(2)
+        print("Imported " + str(stored) + " of " + str(len(phoneCredentials)) + " subscribers")
+
+    for digest, carriers in sorted(store.countSubscribers().items()):
+        for carrier, count in sorted(carriers.items()):
+            print("\t" + (digest if digest != SubscriberStore.NO_DIGEST else "every update").ljust(12) + " " + carrier.ljust(8) + " : " + str(count))
+    sys.exit(0)
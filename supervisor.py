@@ -0,0 +1,220 @@
+# runs many regions and subscriber lists as separate worker processes and restarts any that crash
+# workers only share the region's sqlite database (in WAL mode), so one crashing never stops the others
+# Copyright Michael Kukar 2020. MIT License.
+
+import sys, os, json, time, argparse, sqlite3
+import multiprocessing
+
+from data_sources import createSource, isValidSourceConfig
+
+class Supervisor:
+
+    DEFAULT_INTERVAL = 60
+    DEFAULT_MAX_INTERVAL = 3600
+
+    # seconds between checks that every worker is still running
+    CHECK_INTERVAL = 1.0
+    # restarts back off exponentially from RESTART_BACKOFF seconds, up to MAX_RESTART_BACKOFF
+    RESTART_BACKOFF = 1.0
+    MAX_RESTART_BACKOFF = 300.0
+    # a worker that ran this long before exiting is restarted without backing off
+    STABLE_SECS = 600.0
+
+    REGION_REQUIRED_FIELDS = ['name', 'config', 'database']
+
+
+    # supervisorConfigFile : json file listing the regions to run
+    # target               : (optional) function run in each worker process with its spec dict
+    def __init__(self, supervisorConfigFile, target=None):
+        if not self.parseConfig(supervisorConfigFile):
+            # fail construction as the config is invalid
+            raise Exception("Invalid supervisor config file")
+        self.target = target if target is not None else runWorker
+        self.workers = {}
+        self.running = False
+
+
+    # reads and validates the supervisor config
+    # supervisorConfigFile : json file listing the regions to run
+    # return               : True on success, false on fail
+    def parseConfig(self, supervisorConfigFile):
+        try:
+            with open(supervisorConfigFile) as f:
+                self.configData = json.load(f)
+        except:
+            return False
+        regions = self.configData.get('regions')
+        if not isinstance(regions, list) or len(regions) == 0:
+            return False
+        names = set()
+        databases = set()
+        for region in regions:
+            for req_field in self.REGION_REQUIRED_FIELDS:
+                if req_field not in region.keys():
+                    return False
+            if not isinstance(region.get('workers', 1), int) or region.get('workers', 1) < 1:
+                return False
+            if 'source' in region and not isValidSourceConfig(region['source']):
+                return False
+            # two regions fetching into one database would store every entry twice
+            database = os.path.abspath(region['database'])
+            if region['name'] in names or database in databases:
+                return False
+            names.add(region['name'])
+            databases.add(database)
+        return True
+
+
+    # splits every region into one worker per subscriber shard
+    # NOTE - shard 0 of a region fetches the page, the other shards follow its database
+    # return : list of worker spec dicts
+    def getWorkerSpecs(self):
+        specs = []
+        for region in self.configData['regions']:
+            shardCount = region.get('workers', 1)
+            for shardIndex in range(shardCount):
+                specs.append({
+                    'name' : region['name'] + "_" + str(shardIndex),
+                    'config' : region['config'],
+                    'database' : region['database'],
+                    'url' : region.get('url'),
+                    'source' : region.get('source'),
+                    'shard' : (shardIndex, shardCount),
+                    'interval' : self.configData.get('interval', self.DEFAULT_INTERVAL),
+                    'adaptive' : self.configData.get('adaptive', False),
+                    'max_interval' : self.configData.get('max_interval', self.DEFAULT_MAX_INTERVAL)
+                })
+        return specs
+
+
+    # switches every region database to WAL so followers read while the fetching worker writes
+    # and migrates it once here, before its workers start
+    # NOTE - the journal mode is stored in the database file, so this only needs to succeed once
+    # return : true on success, false on error
+    def prepareDatabases(self):
+        from web_reader import WebReader
+        for region in self.configData['regions']:
+            try:
+                conn = sqlite3.connect(region['database'])
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.close()
+            except sqlite3.Error as e:
+                print("ERROR: could not prepare " + region['database'] + ": " + str(e))
+                return False
+            if not WebReader.migrateDatabase(region['database']):
+                return False
+        return True
+
+
+    # starts (or restarts) the process of a worker
+    # spec   : worker spec dict
+    # return : None
+    def startWorker(self, spec):
+        worker = self.workers.setdefault(spec['name'], {'spec' : spec, 'restarts' : 0, 'backoff' : self.RESTART_BACKOFF})
+        process = multiprocessing.Process(target=self.target, args=(spec,), name=spec['name'], daemon=True)
+        process.start()
+        worker['process'] = process
+        worker['started'] = time.monotonic()
+        worker['restartAt'] = None
+
+
+    # restarts workers that exited, backing off on ones that keep crashing
+    # now    : (optional) current monotonic time
+    # return : list of names of the workers restarted
+    def checkWorkers(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        restarted = []
+        for name, worker in self.workers.items():
+            if worker['process'].is_alive():
+                continue
+            if worker['restartAt'] is None:
+                print("ERROR: worker " + name + " exited with code " + str(worker['process'].exitcode))
+                if now - worker['started'] >= self.STABLE_SECS:
+                    worker['backoff'] = self.RESTART_BACKOFF
+                worker['restartAt'] = now + worker['backoff']
+                worker['backoff'] = min(worker['backoff'] * 2, self.MAX_RESTART_BACKOFF)
+            if now >= worker['restartAt']:
+                worker['restarts'] += 1
+                self.startWorker(worker['spec'])
+                restarted.append(name)
+        return restarted
+
+
+    # starts every worker
+    # return : true on success, false on error
+    def start(self):
+        if not self.prepareDatabases():
+            return False
+        for spec in self.getWorkerSpecs():
+            self.startWorker(spec)
+        self.running = True
+        return True
+
+
+    # keeps the workers running until stop() is called
+    # return : None
+    def run(self):
+        while self.running:
+            time.sleep(self.CHECK_INTERVAL)
+            self.checkWorkers()
+
+
+    # stops every worker
+    # return : None
+    def stop(self):
+        self.running = False
+        for worker in self.workers.values():
+            worker['process'].terminate()
+        for worker in self.workers.values():
+            worker['process'].join()
+
+
+# runs one worker until its process is stopped, any exception ends the process so it is restarted
+# spec   : worker spec dict from Supervisor.getWorkerSpecs()
+# return : None
+def runWorker(spec):
+    from covid19_updater import Covid19Updater
+    try:
+        cu = Covid19Updater(spec['config'], spec['database'], shard=spec['shard'])
+    except Exception as e:
+        print("ERROR: worker " + spec['name'] + ": " + str(e))
+        sys.exit(2)
+    if spec.get('source') is not None:
+        cu.wr.source = createSource(spec['source'])
+    if spec.get('url') is not None:
+        cu.wr.SD_COVID19_URL = spec['url']
+    cu.startTelemetry()
+    if spec['adaptive']:
+        cu.enableAdaptivePolling(spec['interval'], maxInterval=spec['max_interval'])
+    while True:
+        time.sleep(cu.pollOnce(spec['interval']))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Runs the COVID-19 updater for many regions and subscriber lists in separate processes',
+        epilog='Copyright Michael Kukar 2020. MIT License.'
+        )
+    parser.add_argument("-s", "--supervisor_config", dest="config", default="supervisor.json", help="json file listing the regions to run")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.config):
+        print("ERROR: Supervisor config file not found.")
+        sys.exit(1)
+
+    try:
+        supervisor = Supervisor(args.config)
+    except Exception as e:
+        print("ERROR: " + str(e))
+        sys.exit(2)
+
+    for spec in supervisor.getWorkerSpecs():
+        print("\t" + spec['name'] + " : " + spec['database'] + " (shard " + str(spec['shard'][0] + 1) + " of " + str(spec['shard'][1]) + ")")
+
+    if not supervisor.start():
+        sys.exit(3)
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        supervisor.stop()
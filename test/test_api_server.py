@@ -0,0 +1,95 @@
+# tests api_server.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest, shutil
+import sys, os, json
+import urllib.request, urllib.error
+
+sys.path.append('..')
+from api_server import *
+from data_analyzer import DataAnalyzer
+from web_reader import WebReader
+from region_analyzer import RegionAnalyzer
+
+class UnitTestCases(unittest.TestCase):
+
+    TEST_DB_FILE = "basic_populated_database.db"
+
+    NEW_ENTRY = {
+        'date' : '2020-10-10',
+        'total_cases' : 5000,
+        'new_cases' : 10,
+        'new_tests' : None,
+        'hospitalizations' : None,
+        'intensive_care' : None,
+        'deaths' : None
+    }
+
+    def setUp(self):
+        # copies dummy database that is populated
+        shutil.copyfile(self.TEST_DB_FILE, "temp_" + self.TEST_DB_FILE)
+        self.api = ApiServer("temp_" + self.TEST_DB_FILE, DataAnalyzer("temp_" + self.TEST_DB_FILE), port=0)
+        self.assertTrue(self.api.start())
+        self.baseUrl = "http://127.0.0.1:" + str(self.api.port)
+
+    def tearDown(self):
+        self.api.stop()
+        os.remove("temp_" + self.TEST_DB_FILE)
+
+    def get(self, path, etag=None):
+        request = urllib.request.Request(self.baseUrl + path)
+        if etag is not None:
+            request.add_header('If-None-Match', etag)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.read(), response.headers.get('ETag')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), e.headers.get('ETag')
+
+    def test_latestReturnsMostRecentEntry(self):
+        status, body, etag = self.get('/latest')
+        self.assertEqual(200, status)
+        self.assertEqual('2020-04-26', json.loads(body)['date'])
+        self.assertIsNotNone(etag)
+
+    def test_matchingEtagReturnsNotModified(self):
+        status, body, etag = self.get('/analysis')
+        self.assertEqual(200, status)
+        self.assertIn('facts', json.loads(body))
+        status, body, newEtag = self.get('/analysis', etag=etag)
+        self.assertEqual(304, status)
+        self.assertEqual(etag, newEtag)
+
+    def test_historyReturnsEntriesInDateRange(self):
+        status, body, etag = self.get('/history?start=2020-04-20&end=2020-04-24')
+        self.assertEqual(200, status)
+        dates = [entry['date'] for entry in json.loads(body)['data']]
+        self.assertListEqual(['2020-04-20', '2020-04-21', '2020-04-22', '2020-04-23', '2020-04-24'], dates)
+
+    def test_historyReturnsBadRequestOnInvalidDate(self):
+        self.assertEqual(400, self.get('/history?start=04202020')[0])
+
+    def test_unknownPathReturnsNotFound(self):
+        self.assertEqual(404, self.get('/notapath')[0])
+
+    def test_newEntryChangesLatestAndEtag(self):
+        status, body, etag = self.get('/latest')
+        WebReader("temp_" + self.TEST_DB_FILE).addEntryToDatabase(self.NEW_ENTRY)
+        status, body, newEtag = self.get('/latest', etag=etag)
+        self.assertEqual(200, status)
+        self.assertNotEqual(etag, newEtag)
+        self.assertEqual('2020-10-10', json.loads(body)['date'])
+
+    def test_regionsReturnsComparisonOnlyWithARegionAnalyzer(self):
+        self.assertEqual(404, self.get('/regions')[0])
+        self.api.regionAnalyzer = RegionAnalyzer({'san_diego' : "temp_" + self.TEST_DB_FILE})
+        status, body, etag = self.get('/regions')
+        self.assertEqual(200, status)
+        self.assertEqual(1, json.loads(body)['regions']['san_diego']['ranks']['weekly_growth'])
+        self.assertEqual(304, self.get('/regions', etag=etag)[0])
+        self.api.regionAnalyzer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,10 +4,14 @@
 # Copyright Michael Kukar 2020.
 
 import unittest
-import sys, os, shutil
+import sys, os, shutil, json, subprocess, pathlib
+from datetime import datetime
 
 sys.path.append('..')
 from covid19_updater import *
+from notification_channels import FileSinkChannel
+from data_sources import HtmlPageSource
+from entry_record import EntryRecord
 
 class TestCases(unittest.TestCase):
 
@@ -16,6 +20,11 @@ class TestCases(unittest.TestCase):
     VALID_CONFIG = "valid_configuration_file.json"
     INVALID_CONFIG = "invalid_configuration_file.json"
     CORRUPTED_CONFIG = "corrupted_configuration_file.json"
+    VALID_DIGEST_CONFIG = "valid_digest_configuration_file.json"
+    INVALID_DIGEST_CONFIG = "invalid_digest_configuration_file.json"
+
+    SINK_FILE = "temp_notifications.jsonl"
+    VALID_WEBSITE_FILE = "test_valid_data_website.html"
 
     EMPTY_DB_FILE = "empty_test_database.db"
     POPULATED_DB_FILE = "basic_populated_database.db"
@@ -30,6 +39,25 @@ class TestCases(unittest.TestCase):
         # deletes our dummy database files
         os.remove("temp_" + self.EMPTY_DB_FILE)
         os.remove("temp_" + self.POPULATED_DB_FILE)
+        # deletes any snapshot files written alongside them
+        for dbFile in [self.EMPTY_DB_FILE, self.POPULATED_DB_FILE]:
+            if os.path.exists("temp_" + dbFile + ".snap"):
+                os.remove("temp_" + dbFile + ".snap")
+        if os.path.exists(self.SINK_FILE):
+            os.remove(self.SINK_FILE)
+        for dbFile in [self.EMPTY_DB_FILE, self.POPULATED_DB_FILE]:
+            if os.path.exists("temp_" + dbFile + WebReader.QUARANTINE_EXTENSION):
+                os.remove("temp_" + dbFile + WebReader.QUARANTINE_EXTENSION)
+        # deletes any pages archived by updates
+        for dbFile in [self.EMPTY_DB_FILE, self.POPULATED_DB_FILE]:
+            shutil.rmtree("temp_" + dbFile + PageArchive.DIRECTORY_EXTENSION, ignore_errors=True)
+
+    # reads back the messages written to the file sink channel
+    def readSentMessages(self):
+        if not os.path.exists(self.SINK_FILE):
+            return []
+        with open(self.SINK_FILE) as f:
+            return [json.loads(line) for line in f.readlines()]
 
     def test_parseConfigReturnsTrueWithValidConfigFile(self):
         # parseConfig is called on construction, so ensure we don't throw
@@ -44,6 +72,173 @@ class TestCases(unittest.TestCase):
     def test_parseConfigReturnsFalseWithCorruptConfigFile(self):
         self.assertRaises(Exception, Covid19Updater, self.CORRUPTED_CONFIG, "temp_" + self.EMPTY_DB_FILE)
 
+    def test_parseConfigReturnsFalseWithInvalidDigest(self):
+        self.assertRaises(Exception, Covid19Updater, self.INVALID_DIGEST_CONFIG, "temp_" + self.EMPTY_DB_FILE)
+
+    def test_sendUpdateCoalescesUpdateAndAnalysisWhenTheyFit(self):
+        cu = Covid19Updater(self.VALID_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        cu.channels = [FileSinkChannel(self.SINK_FILE)]
+        cu.maxMessageLengths = {'vtext.com' : 1000}
+        cu.sendUpdate(EntryRecord('2020-04-27', total_cases=3044, new_cases=1))
+        messages = self.readSentMessages()
+        self.assertEqual(1, len(messages))
+        self.assertIn("Total Cases: 3044", messages[0]['message'])
+        self.assertIn("Analysis:", messages[0]['message'])
+
+    def test_sendUpdateSplitsMessagesThatDoNotFit(self):
+        cu = Covid19Updater(self.VALID_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        cu.channels = [FileSinkChannel(self.SINK_FILE)]
+        cu.maxMessageLengths = {'vtext.com' : 100}
+        cu.sendUpdate(EntryRecord('2020-04-27', total_cases=3044, new_cases=1))
+        messages = self.readSentMessages()
+        # the update alone, then the facts packed into texts that each fit
+        self.assertEqual(1 + len(cu.getAnalysisFacts()), len(messages))
+        self.assertTrue(messages[0]['message'].startswith("LATEST SD COVID19 UPDATE"))
+        self.assertTrue(messages[1]['message'].startswith("Analysis:"))
+        self.assertTrue(all(len(message['message']) <= 100 for message in messages))
+
+    def test_sendMessagePagesClosesChannelsWhenASendRaises(self):
+        closed = []
+        class FailingChannel(FileSinkChannel):
+            def send(self, message, recipients):
+                raise OSError("connection reset")
+            def close(self):
+                closed.append(self)
+        cu = Covid19Updater(self.VALID_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        cu.channels = [FailingChannel(self.SINK_FILE)]
+        self.assertRaises(OSError, cu.sendMessagePages, [(lambda email: ("text",), ["1234567890@vtext.com"])])
+        self.assertListEqual(cu.channels, closed)
+
+    def test_sendUpdateRendersOncePerRecipientProfile(self):
+        cu = Covid19Updater(self.VALID_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        cu.channels = [FileSinkChannel(self.SINK_FILE)]
+        cu.templates = MessageTemplates({'update' : "{date}: {total_cases:,} cases{link}"}, {'vtext.com' : {'max_segments' : 1}})
+        cu.subscribers.addSubscribers([{'number' : '5550000000', 'carrier' : 'VERIZON'}, {'number' : '5550000001', 'carrier' : 'TMOBILE'}])
+        cu.sendUpdate(EntryRecord('2020-04-27', total_cases=3044, new_cases=1))
+        messages = self.readSentMessages()
+        # verizon texts are capped at one, t-mobile gets every fact without the link
+        self.assertEqual(1, len([message for message in messages if message['recipients'] == ["5550000000@vtext.com"]]))
+        self.assertTrue(messages[0]['message'].startswith("2020-04-27: 3,044 cases\nhttps://"))
+        tmobileTexts = [message['message'] for message in messages if message['recipients'] == ["5550000001@tmomail.net"]]
+        self.assertTrue(tmobileTexts[0].startswith("2020-04-27: 3,044 cases\nAnalysis:"))
+        self.assertEqual(len(cu.getAnalysisFacts()), len([line for text in tmobileTexts for line in text.split("\n") if line.startswith("- ")]))
+
+    def test_analysisSettingsAreReadFromTheConfig(self):
+        with open(self.VALID_CONFIG) as f:
+            configData = json.load(f)
+        configData['analysis'] = {'rolling_days' : 14, 'trend_days' : 5, 'anomaly_z_score' : 2.5, 'long_window_days' : 21, 'rules' : ['ruleNewCasesAverage']}
+        with open("temp_config.json", 'w') as f:
+            json.dump(configData, f)
+        try:
+            cu = Covid19Updater("temp_config.json", "temp_" + self.POPULATED_DB_FILE)
+        finally:
+            os.remove("temp_config.json")
+        self.assertEqual((14, 5, 2.5, 21), (cu.da.rollingDays, cu.da.trendDays, cu.da.anomalyZScore, cu.da.longWindowDays))
+        # only the chosen rule runs
+        self.assertListEqual(["The 14-day average of new cases is"], [fact[:34] for fact in cu.da.getRankedFacts()])
+
+    def test_getConfigProblemsReportsInvalidAnalysisSettings(self):
+        problems = Covid19Updater.getConfigProblems({'phone_credentials' : [], 'email_credentials' : {'user' : '', 'pass' : '', 'url' : ''},
+            'analysis' : {'rolling_days' : 0, 'trend_days' : 1, 'anomaly_z_score' : "3", 'rules' : ['ruleUnknown'], 'color' : 1}})
+        self.assertEqual(5, len(problems))
+        self.assertListEqual(["analysis is not a dict"], DataAnalyzer.getConfigProblems([]))
+
+    def test_getConfigProblemsReportsInvalidTemplatesAndProfiles(self):
+        problems = Covid19Updater.getConfigProblems({'phone_credentials' : [], 'email_credentials' : {'user' : '', 'pass' : '', 'url' : ''},
+            'message_templates' : {'update' : "{unknown}", 'fact' : "{fact", 'other' : ""}, 'recipient_profiles' : {'vtext.com' : {'color' : 1}}})
+        self.assertEqual(4, len(problems))
+
+    def test_sendUpdateStreamsDatabaseSubscribersInPagesAfterConfigSubscribers(self):
+        cu = Covid19Updater(self.VALID_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        cu.channels = [FileSinkChannel(self.SINK_FILE)]
+        cu.maxMessageLengths = {'vtext.com' : 1000, 'tmomail.net' : 1000}
+        cu.subscribers.pageSize = 2
+        # added while running, no restart or config edit needed
+        cu.subscribers.addSubscribers([{'number' : '555000000' + str(idx), 'carrier' : 'VERIZON' if idx < 3 else 'TMOBILE'} for idx in range(4)])
+        cu.sendUpdate(EntryRecord('2020-04-27', total_cases=3044, new_cases=1))
+        messages = self.readSentMessages()
+        self.assertListEqual([
+            ["1234567890@vtext.com"],
+            ["5550000000@vtext.com", "5550000001@vtext.com"],
+            ["5550000002@vtext.com"],
+            ["5550000003@tmomail.net"]
+        ], [message['recipients'] for message in messages])
+        self.assertNotIn("https://", messages[-1]['message'])
+
+    def test_sendDueDigestsSendsToDatabaseDigestSubscribers(self):
+        cu = Covid19Updater(self.VALID_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        cu.channels = [FileSinkChannel(self.SINK_FILE)]
+        self.assertListEqual([], cu.sendDueDigests(now=datetime(2020, 4, 26, 18)))
+        cu.subscribers.addSubscribers([{'number' : '5550000000', 'carrier' : 'VERIZON', 'digest' : 'daily'}])
+        self.assertListEqual(['daily'], cu.sendDueDigests(now=datetime(2020, 4, 26, 18)))
+        self.assertListEqual(["5550000000@vtext.com"], self.readSentMessages()[0]['recipients'])
+
+    def test_sendDueDigestsSendsOnlyToDigestRecipientsOncePerDay(self):
+        cu = Covid19Updater(self.VALID_DIGEST_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        cu.channels = [FileSinkChannel(self.SINK_FILE)]
+        self.assertListEqual([], cu.sendDueDigests(now=datetime(2020, 4, 26, 17)))
+        self.assertListEqual(['daily'], cu.sendDueDigests(now=datetime(2020, 4, 26, 18)))
+        self.assertListEqual([], cu.sendDueDigests(now=datetime(2020, 4, 26, 23)))
+        messages = self.readSentMessages()
+        self.assertTrue(messages[0]['message'].startswith("SD COVID19 DAILY DIGEST:"))
+        for message in messages:
+            self.assertListEqual(["1234567891@tmomail.net"], message['recipients'])
+        # regular updates skip the digest recipient
+        self.assertListEqual(["1234567890@vtext.com"], cu.phoneNumberEmails)
+
+    def test_sendDueDigestsIsNeitherSkippedNorRepeatedByRestarts(self):
+        cu = Covid19Updater(self.VALID_DIGEST_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        cu.channels = [FileSinkChannel(self.SINK_FILE)]
+        # started after the digest hour without having sent the digest
+        self.assertListEqual(['daily'], cu.sendDueDigests(now=datetime(2020, 4, 26, 19)))
+        restarted = Covid19Updater(self.VALID_DIGEST_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        restarted.channels = [FileSinkChannel(self.SINK_FILE)]
+        self.assertListEqual([], restarted.sendDueDigests(now=datetime(2020, 4, 26, 20)))
+        self.assertListEqual(['daily'], restarted.sendDueDigests(now=datetime(2020, 4, 27, 18)))
+        self.assertEqual(2, len([m for m in self.readSentMessages() if m["message"].startswith("SD COVID19 DAILY DIGEST")]))
+
+    def test_queueUpdateSendsOnlyTheLatestEntryOfTheDebounceWindow(self):
+        cu = Covid19Updater(self.VALID_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        cu.channels = [FileSinkChannel(self.SINK_FILE)]
+        cu.debounceSecs = 0.2
+        cu.queueUpdate(EntryRecord('2020-04-27', total_cases=3044, new_cases=1))
+        firstUpdate = cu.pendingUpdate
+        cu.queueUpdate(EntryRecord('2020-04-27', total_cases=3050, new_cases=7))
+        self.assertIsNot(firstUpdate, cu.pendingUpdate)
+        firstUpdate.join()
+        cu.pendingUpdate.join()
+        messages = [m['message'] for m in self.readSentMessages() if m['message'].startswith("LATEST SD COVID19 UPDATE")]
+        self.assertEqual(1, len(messages))
+        self.assertIn("Total Cases: 3050", messages[0])
+        self.assertIsNone(cu.pendingEntry)
+
+    def test_checkForUpdateAndSendReplacesPendingUpdateWithRevision(self):
+        cu = Covid19Updater(self.VALID_CONFIG, "temp_" + self.EMPTY_DB_FILE)
+        cu.channels = [FileSinkChannel(self.SINK_FILE)]
+        cu.bus.synchronous = True
+        cu.debounceSecs = 60
+        cu.wr.source = HtmlPageSource(url=pathlib.Path(os.path.abspath(self.VALID_WEBSITE_FILE)).as_uri())
+        self.assertTrue(cu.checkForUpdateAndSend())
+        self.assertEqual(2943, cu.pendingEntry.total_cases)
+        # the county corrects the day while its update is still pending
+        with open(self.VALID_WEBSITE_FILE, 'rb') as f:
+            page = f.read().replace(b"2,943", b"2,950")
+        with open("temp_revised_website.html", 'wb') as f:
+            f.write(page)
+        try:
+            cu.wr.source.url = pathlib.Path(os.path.abspath("temp_revised_website.html")).as_uri()
+            self.assertFalse(cu.checkForUpdateAndSend())
+        finally:
+            os.remove("temp_revised_website.html")
+        self.assertEqual(EntryRecord('2020-04-24', total_cases=2950, new_cases=2950, hospitalizations=683, intensive_care=225, deaths=111), cu.pendingEntry)
+        self.assertEqual(2950, WebReader("temp_" + self.EMPTY_DB_FILE).getLatestEntry().total_cases)
+        # only the revision is sent once the window is over
+        cu.pendingUpdate.cancel()
+        cu.sendPendingUpdate(cu.pendingEntry)
+        messages = [m['message'] for m in self.readSentMessages() if m['message'].startswith("LATEST SD COVID19 UPDATE")]
+        self.assertEqual(1, len(messages))
+        self.assertIn("Total Cases: 2950", messages[0])
+
     def test_checkForUpdateAndSend(self):
         try:
             cu = Covid19Updater(self.ACTUAL_CONFIG, "temp_" + self.POPULATED_DB_FILE)
@@ -51,6 +246,17 @@ class TestCases(unittest.TestCase):
         except:
             self.fail()
 
+    def test_checkForUpdateAndSendForcesUpdateOlderThanTheDatabase(self):
+        cu = Covid19Updater(self.VALID_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        cu.channels = [FileSinkChannel(self.SINK_FILE)]
+        # the page is from 2020-04-24, the database goes to 2020-04-26
+        cu.wr.source = HtmlPageSource(url=pathlib.Path(os.path.abspath(self.VALID_WEBSITE_FILE)).as_uri())
+        self.assertFalse(cu.checkForUpdateAndSend(forceSend=True))
+        self.assertIn("Total Cases: 2943", self.readSentMessages()[0]['message'])
+        # sent, but neither stored nor quarantined
+        self.assertEqual('2020-04-26', cu.wr.getLatestEntry().date)
+        self.assertFalse(os.path.exists(cu.wr.quarantineFilename))
+
     def test_getAnalysisMessage(self):
         try:
             cu = Covid19Updater(self.ACTUAL_CONFIG, "temp_" + self.POPULATED_DB_FILE)
@@ -58,5 +264,91 @@ class TestCases(unittest.TestCase):
         except:
             self.fail()
 
+    def test_shardKeepsEveryNthSubscriber(self):
+        firstShard = Covid19Updater(self.VALID_DIGEST_CONFIG, "temp_" + self.POPULATED_DB_FILE, shard=(0, 2))
+        secondShard = Covid19Updater(self.VALID_DIGEST_CONFIG, "temp_" + self.POPULATED_DB_FILE, shard=(1, 2))
+        self.assertListEqual(["1234567890@vtext.com"], firstShard.phoneNumberEmails)
+        self.assertListEqual([], firstShard.digestEmails['daily'])
+        self.assertListEqual([], secondShard.phoneNumberEmails)
+        self.assertListEqual(["1234567891@tmomail.net"], secondShard.digestEmails['daily'])
+        self.assertFalse(firstShard.follower)
+        self.assertTrue(secondShard.follower)
+
+    def test_checkForStoredUpdateSendsOnlyEntriesStoredAfterStarting(self):
+        cu = Covid19Updater(self.VALID_CONFIG, "temp_" + self.POPULATED_DB_FILE, shard=(1, 2))
+        cu.channels = [FileSinkChannel(self.SINK_FILE)]
+        # the only subscriber in the config belongs to the first shard
+        cu.phoneNumberEmails = ["1234567890@vtext.com"]
+        self.assertFalse(cu.checkForStoredUpdate())
+        # stored by another worker
+        entry = cu.wr.getLatestEntry()._replace(date='2099-01-01')
+        self.assertTrue(WebReader("temp_" + self.POPULATED_DB_FILE).addEntryToDatabase(entry))
+        self.assertTrue(cu.checkForStoredUpdate())
+        self.assertFalse(cu.checkForStoredUpdate())
+        self.assertEqual(1, len([m for m in self.readSentMessages() if m['message'].startswith("LATEST SD COVID19 UPDATE")]))
+
+    def test_getAnalysisMessageIncludesRegionComparison(self):
+        cu = Covid19Updater(self.VALID_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        # the other region's cases grew slower, so this region leads with the most important fact
+        cu.regionAnalyzer = RegionAnalyzer({cu.subscribers.region : "temp_" + self.POPULATED_DB_FILE, 'other' : "temp_" + self.EMPTY_DB_FILE})
+        WebReader("temp_" + self.EMPTY_DB_FILE).addEntryToDatabase(EntryRecord('2020-04-19', total_cases=2325).toDict())
+        WebReader("temp_" + self.EMPTY_DB_FILE).addEntryToDatabase(EntryRecord('2020-04-26', total_cases=2400).toDict())
+        self.assertIn("Cases here grew the fastest of 2 regions", cu.getAnalysisMessage())
+        cu.regionAnalyzer.close()
+
+    def test_getConfigProblemsReportsMissingCompareRegionDatabase(self):
+        problems = Covid19Updater.getConfigProblems({'phone_credentials' : [], 'email_credentials' : {'user' : '', 'pass' : '', 'url' : ''},
+            'compare_regions' : {'other' : "temp_" + self.POPULATED_DB_FILE, 'missing' : "not_a_database.db"}})
+        self.assertListEqual(["compare_regions database of missing not found"], problems)
+
+    def test_getConfigProblemsReportsUnmigratedAndEmptyCompareRegionDatabases(self):
+        conn = sqlite3.connect("temp_" + self.POPULATED_DB_FILE)
+        with conn:
+            conn.execute("DROP INDEX DATA_DAY_INDEX")
+            conn.execute("ALTER TABLE DATA DROP COLUMN DAY")
+        conn.close()
+        sqlite3.connect("temp_new.db").close()
+        problems = Covid19Updater.getConfigProblems({'phone_credentials' : [], 'email_credentials' : {'user' : '', 'pass' : '', 'url' : ''},
+            'compare_regions' : {'old' : "temp_" + self.POPULATED_DB_FILE, 'new' : "temp_new.db", 'ok' : "temp_" + self.EMPTY_DB_FILE}})
+        os.remove("temp_new.db")
+        self.assertListEqual(["compare_regions database of old: DATA table is missing column day",
+            "compare_regions database of new: missing DATA table"], problems)
+
+    def test_getAnalysisMessageIgnoresUnreadableCompareRegionDatabase(self):
+        cu = Covid19Updater(self.VALID_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        sqlite3.connect("temp_new.db").close()
+        cu.regionAnalyzer = RegionAnalyzer({cu.subscribers.region : "temp_" + self.POPULATED_DB_FILE, 'new' : "temp_new.db"})
+        self.assertTrue(cu.getAnalysisMessage().startswith("Analysis:"))
+        cu.regionAnalyzer.close()
+        os.remove("temp_new.db")
+
+    def test_checkFilesReturnsNoProblemsWithValidConfigAndDatabase(self):
+        self.assertListEqual([], Covid19Updater.checkFiles(self.VALID_CONFIG, "temp_" + self.POPULATED_DB_FILE))
+
+    def test_checkFilesReportsEachMissingConfigSection(self):
+        problems = Covid19Updater.checkFiles(self.INVALID_CONFIG, "temp_" + self.POPULATED_DB_FILE)
+        self.assertListEqual(["missing phone_credentials", "missing email_credentials"], problems)
+
+    def test_checkFilesReportsUnreadableDatabase(self):
+        problems = Covid19Updater.checkFiles(self.VALID_CONFIG, self.VALID_CONFIG)
+        self.assertEqual(1, len(problems))
+
+    def test_getDatabaseWarningsReportsMissingDays(self):
+        self.assertListEqual([], Covid19Updater.getDatabaseWarnings("temp_" + self.POPULATED_DB_FILE))
+        WebReader("temp_" + self.POPULATED_DB_FILE).addEntryToDatabase(EntryRecord('2020-04-30', total_cases=3200, new_cases=59).toDict())
+        self.assertListEqual(["no data for 3 day(s) starting 2020-04-27"], Covid19Updater.getDatabaseWarnings("temp_" + self.POPULATED_DB_FILE))
+
+    def test_checkFilesDoesNotWriteToTheDatabase(self):
+        before = os.path.getmtime("temp_" + self.EMPTY_DB_FILE)
+        Covid19Updater.checkFiles(self.VALID_CONFIG, "temp_" + self.EMPTY_DB_FILE)
+        self.assertEqual(before, os.path.getmtime("temp_" + self.EMPTY_DB_FILE))
+        self.assertFalse(os.path.exists("temp_" + self.EMPTY_DB_FILE + ".snap"))
+
+    def test_importDoesNotLoadParserHttpOrSmtpStacks(self):
+        # runs in a fresh interpreter since this one already imported them for other tests
+        code = "import sys; import covid19_updater; print(','.join(m for m in ['bs4', 'requests', 'smtplib'] if m in sys.modules))"
+        output = subprocess.run([sys.executable, "-c", code], cwd="..", capture_output=True, text=True, check=True).stdout
+        self.assertEqual("", output.strip())
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
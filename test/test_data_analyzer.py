@@ -3,11 +3,12 @@
 # Copyright Michael Kukar 2020.
 
 import unittest, shutil
-import sys, os
+import sys, os, sqlite3
 
 sys.path.append('..')
 from data_analyzer import *
 from web_reader import WebReader
+from initialize_db_file import compactDatabase
 
 class UnitTestCases(unittest.TestCase):
 
@@ -134,6 +135,107 @@ class UnitTestCases(unittest.TestCase):
         self.assertEqual(0.0, self.da.getLatestNewCasesAverage(days=-1))
         self.assertEqual(0.0, self.da.getLatestNewCasesAverage(days=0))
 
+    def test_resultsAreMemoizedUntilAnEntryIsAdded(self):
+        firstAverage = self.da.getLatestNewCasesAverage(days=7)
+        self.assertEqual(firstAverage, self.da.getLatestNewCasesAverage(days=7))
+        self.assertEqual(1, self.da.cache.hits)
+        self.wr.addEntryToDatabase(self.MAX_NEW_CASES_ENTRY)
+        self.assertNotEqual(firstAverage, self.da.getLatestNewCasesAverage(days=7))
+        self.assertTrue(self.da.checkIfLatestIsMaxNewCases())
+
+    def test_computeStatisticsMatchesSingleMetricFunctions(self):
+        stats = self.da.computeStatistics()
+        self.assertEqual(self.da.getNewCasesTrend(days=3), stats['metrics']['new_cases']['trend'])
+        self.assertAlmostEqual(self.da.getLatestNewCasesAverage(days=7), stats['metrics']['new_cases']['mean'])
+        self.assertEqual(self.da.checkIfLatestIsMaxNewCases(), stats['latest_is_max_new_cases'])
+
+    def test_computeStatisticsCalculatesPositivityRateAndDoublingTime(self):
+        daysData = []
+        for x in range(8):
+            daysData.append(dict(self.MAX_NEW_CASES_ENTRY))
+            daysData[x]['date'] = '2020-10-1' + str(x)
+            daysData[x]['total_cases'] = 10000 * (2 ** x)
+            daysData[x]['new_cases'] = 10
+            daysData[x]['new_tests'] = 100
+        for data in daysData:
+            self.wr.addEntryToDatabase(data)
+        stats = self.da.computeStatistics()
+        self.assertAlmostEqual(10.0, stats['positivity_rate'])
+        self.assertAlmostEqual(1.0, stats['doubling_time'])
+
+    def test_getRankedFactsFlagsAnomalyAndLimitsNumberOfFacts(self):
+        daysData = []
+        for x in range(8):
+            daysData.append(dict(self.MAX_NEW_CASES_ENTRY))
+            daysData[x]['date'] = '2020-10-1' + str(x)
+            daysData[x]['new_cases'] = 100 + (x % 2)
+        daysData[7]['new_cases'] = 5000
+        for data in daysData:
+            self.wr.addEntryToDatabase(data)
+        facts = self.da.getRankedFacts(maxFacts=2)
+        self.assertEqual(2, len(facts))
+        self.assertEqual("Today is the highest number of new cases yet", facts[0])
+        self.assertIn("unusually high", facts[1])
+
+    def test_getDataGapsReturnsNoGapsForConsecutiveDays(self):
+        self.assertListEqual([], self.da.getDataGaps())
+
+    def test_getDataGapsReturnsFirstMissingDayAndLengthOfEachGap(self):
+        # latest entry in the database is 2020-04-26
+        self.wr.addEntryToDatabase(dict(self.ZERO_NEW_CASES_ENTRY, date='2020-04-30'))
+        self.assertListEqual([('2020-04-27', 3)], self.da.getDataGaps())
+
+    def test_getWindowSummaryReadsWholeWeeksAndMonthsFromAggregates(self):
+        before = self.da.getWindowSummary('2020-03-01', '2020-04-26')
+        compactDatabase("temp_" + self.TEST_DB_FILE, retentionDays=20)
+        da = DataAnalyzer("temp_" + self.TEST_DB_FILE)
+        after = da.getWindowSummary('2020-03-01', '2020-04-26')
+        self.assertDictEqual({'monthly' : 1, 'weekly' : 0, 'daily' : 26}, after['rows'])
+        for field in ['days', 'total_cases', 'new_cases', 'new_tests', 'deaths']:
+            self.assertEqual(before[field], after[field])
+        weeks = da.getWindowSummary('2020-03-09', '2020-04-05')
+        self.assertDictEqual({'monthly' : 0, 'weekly' : 4, 'daily' : 0}, weeks['rows'])
+        self.assertEqual(28, weeks['days'])
+
+    def test_longWindowChangeIsUnchangedByRollingUpOldDays(self):
+        before = self.da.computeStatistics()['long_window']
+        # 28 days to 4/26 against the 23 days with data of the 28 before
+        self.assertAlmostEqual(2569 / 28, before['mean_new_cases'])
+        self.assertIn("New cases over the last 28 days are up 250% from the 28 days before", self.da.getRankedFacts(maxFacts=10))
+        compactDatabase("temp_" + self.TEST_DB_FILE, retentionDays=20)
+        after = DataAnalyzer("temp_" + self.TEST_DB_FILE).computeStatistics()['long_window']
+        self.assertDictEqual(before, after)
+
+    def test_compactDatabaseKeepsTheDailyRowsOfTheLongWindows(self):
+        windows = [('2020-03-01', '2020-03-28'), ('2020-03-02', '2020-03-29'), ('2020-03-30', '2020-04-26')]
+        before = [self.da.getWindowSummary(start, end) for start, end in windows]
+        change = self.da.computeLongWindowChange('2020-04-26')
+        compactDatabase("temp_" + self.TEST_DB_FILE, retentionDays=20, weeklyRetentionDays=25)
+        da = DataAnalyzer("temp_" + self.TEST_DB_FILE)
+        for expected, (start, end) in zip(before, windows):
+            summary = da.getWindowSummary(start, end)
+            for field in ['days', 'total_cases', 'new_cases', 'new_tests', 'deaths']:
+                self.assertEqual(expected[field], summary[field])
+        self.assertDictEqual(change, da.computeLongWindowChange('2020-04-26'))
+
+    def test_getWindowSummaryRefusesWindowsWhosePrunedDaysAreNotCovered(self):
+        # a shorter long window lets the end of march go, leaving only the whole month rolled up
+        compactDatabase("temp_" + self.TEST_DB_FILE, retentionDays=20, weeklyRetentionDays=25, longWindowDays=10)
+        da = DataAnalyzer("temp_" + self.TEST_DB_FILE)
+        self.assertIsNone(da.getWindowSummary('2020-03-01', '2020-03-28'))
+        self.assertIsNotNone(da.getWindowSummary('2020-03-01', '2020-03-31'))
+        self.assertIsNone(da.computeLongWindowChange('2020-04-26')['previous_mean_new_cases'])
+        self.assertIsNone(da.computeLongWindowChange('2020-04-26')['change'])
+
+    def test_checkIfLatestIsMaxNewCasesIncludesRolledUpDays(self):
+        compactDatabase("temp_" + self.TEST_DB_FILE, retentionDays=20)
+        conn = sqlite3.connect("temp_" + self.TEST_DB_FILE)
+        conn.execute("UPDATE DATA_MONTHLY SET MAX_NEW_CASES = 100000")
+        conn.commit()
+        conn.close()
+        self.wr.addEntryToDatabase(self.MAX_NEW_CASES_ENTRY)
+        self.assertFalse(self.da.checkIfLatestIsMaxNewCases())
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,42 @@
+# tests data_cache.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys
+
+sys.path.append('..')
+from data_cache import *
+
+class UnitTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LRUCache(maxSize=2)
+
+    def test_getReturnsCachedValueAfterPut(self):
+        self.cache.put('a', 1)
+        self.assertEqual((True, 1), self.cache.get('a'))
+
+    def test_getReturnsNotFoundForMissingKey(self):
+        self.assertEqual((False, None), self.cache.get('a'))
+
+    def test_putEvictsLeastRecentlyUsedEntryWhenFull(self):
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        # reading 'a' makes 'b' the least recently used
+        self.cache.get('a')
+        self.cache.put('c', 3)
+        self.assertEqual(2, len(self.cache))
+        self.assertEqual((False, None), self.cache.get('b'))
+        self.assertEqual((True, 1), self.cache.get('a'))
+
+    def test_bumpDataVersionIncrementsVersionOfThatFileOnly(self):
+        startVersion = getDataVersion("cache_test_a.db")
+        otherVersion = getDataVersion("cache_test_b.db")
+        bumpDataVersion("cache_test_a.db")
+        self.assertEqual(startVersion + 1, getDataVersion("cache_test_a.db"))
+        self.assertEqual(otherVersion, getDataVersion("cache_test_b.db"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+# tests data_snapshot.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest, shutil
+import sys, os, sqlite3
+
+sys.path.append('..')
+from data_snapshot import *
+from data_analyzer import DataAnalyzer
+from web_reader import WebReader
+
+class UnitTestCases(unittest.TestCase):
+
+    TEST_DB_FILE = "basic_populated_database.db"
+    TEST_SNAPSHOT_FILE = "temp_basic_populated_database.db.snap"
+
+    NONE_NEW_CASES_ENTRY = {
+        'date' : '2020-10-10',
+        'total_cases' : None,
+        'new_cases' : None,
+        'new_tests' : None,
+        'hospitalizations' : None,
+        'intensive_care' : None,
+        'deaths' : None
+    }
+
+    def setUp(self):
+        # copies dummy database that is populated
+        shutil.copyfile(self.TEST_DB_FILE, "temp_" + self.TEST_DB_FILE)
+        self.snapshot = DataSnapshot(self.TEST_SNAPSHOT_FILE)
+
+    def tearDown(self):
+        self.snapshot.close()
+        os.remove("temp_" + self.TEST_DB_FILE)
+        if os.path.exists(self.TEST_SNAPSHOT_FILE):
+            os.remove(self.TEST_SNAPSHOT_FILE)
+
+    def test_writeFromDatabaseCreatesSnapshotThatOpens(self):
+        self.assertTrue(DataSnapshot.writeFromDatabase("temp_" + self.TEST_DB_FILE, self.TEST_SNAPSHOT_FILE))
+        self.assertTrue(self.snapshot.open())
+        self.assertEqual(51, self.snapshot.rowCount)
+
+    def test_getLatestEntriesMatchesDatabaseQuery(self):
+        DataSnapshot.writeFromDatabase("temp_" + self.TEST_DB_FILE, self.TEST_SNAPSHOT_FILE)
+        self.snapshot.open()
+        conn = sqlite3.connect("temp_" + self.TEST_DB_FILE)
+        dbEntries = conn.execute(DataAnalyzer.LATEST_ENTRY_QUERY).fetchmany(10)
+        conn.close()
+        self.assertListEqual(dbEntries, self.snapshot.getLatestEntries(10))
+
+    def test_openFailsOnMissingOrCorruptedSnapshot(self):
+        self.assertFalse(self.snapshot.open())
+        with open(self.TEST_SNAPSHOT_FILE, 'wb') as f:
+            f.write(b'not a snapshot file')
+        self.assertFalse(self.snapshot.open())
+
+    def test_dataAnalyzerGivesSameResultsFromSnapshot(self):
+        WebReader("temp_" + self.TEST_DB_FILE).addEntryToDatabase(self.NONE_NEW_CASES_ENTRY)
+        DataSnapshot.writeFromDatabase("temp_" + self.TEST_DB_FILE, self.TEST_SNAPSHOT_FILE)
+        dbAnalyzer = DataAnalyzer("temp_" + self.TEST_DB_FILE)
+        snapshotAnalyzer = DataAnalyzer("temp_" + self.TEST_DB_FILE, snapshotFilename=self.TEST_SNAPSHOT_FILE)
+        self.assertIsNotNone(snapshotAnalyzer.snapshot)
+        self.assertEqual(dbAnalyzer.checkIfLatestIsMaxNewCases(), snapshotAnalyzer.checkIfLatestIsMaxNewCases())
+        self.assertEqual(dbAnalyzer.getNewCasesTrend(days=5), snapshotAnalyzer.getNewCasesTrend(days=5))
+        self.assertEqual(dbAnalyzer.getLatestNewCasesAverage(days=7), snapshotAnalyzer.getLatestNewCasesAverage(days=7))
+        snapshotAnalyzer.snapshot.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
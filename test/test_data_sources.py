@@ -0,0 +1,138 @@
+# tests data_sources.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys, os, shutil, sqlite3, json
+
+sys.path.append('..')
+from data_sources import *
+from web_reader import WebReader
+
+class UnitTestCases(unittest.TestCase):
+
+    EMPTY_DB_FILE = "empty_test_database.db"
+    POPULATED_DB_FILE = "basic_populated_database.db"
+
+    CSV_FEED_FILENAME = "test_valid_data_feed.csv"
+    JSON_FEED_FILENAME = "test_valid_data_feed.json"
+    JSON_LINES_FEED_FILENAME = "test_valid_data_feed.jsonl"
+    VALID_WEBSITE_FILENAME = "test_valid_data_website.html"
+
+    CSV_FEED_CONFIG = {
+        'type' : 'csv',
+        'fields' : {
+            'date' : 'Date',
+            'total_cases' : 'Total Positives',
+            'new_cases' : 'New Cases',
+            'new_tests' : 'Tests',
+            'hospitalizations' : 'Hospitalized',
+            'intensive_care' : 'ICU',
+            'deaths' : 'Deaths'
+        },
+        'date_format' : '%m/%d/%Y'
+    }
+    JSON_FEED_CONFIG = {
+        'type' : 'json',
+        'records' : 'features',
+        'fields' : {
+            'date' : 'attributes.UpdateDate',
+            'total_cases' : 'attributes.Positives',
+            'new_cases' : 'attributes.NewCases',
+            'new_tests' : 'attributes.Tests',
+            'hospitalizations' : 'attributes.Hospitalized',
+            'intensive_care' : 'attributes.ICU',
+            'deaths' : 'attributes.Deaths'
+        },
+        'date_format' : 'epoch_ms'
+    }
+
+    LATEST_FEED_ENTRY = {
+        'date' : '2020-04-24',
+        'total_cases' : 2943,
+        'new_cases' : 117,
+        'new_tests' : 1520,
+        'hospitalizations' : 683,
+        'intensive_care' : 225,
+        'deaths' : 111
+    }
+
+    def setUp(self):
+        shutil.copyfile(self.EMPTY_DB_FILE, "temp_" + self.EMPTY_DB_FILE)
+        shutil.copyfile(self.POPULATED_DB_FILE, "temp_" + self.POPULATED_DB_FILE)
+        self.wr = WebReader("temp_" + self.EMPTY_DB_FILE)
+
+    def tearDown(self):
+        self.wr.close()
+        os.remove("temp_" + self.EMPTY_DB_FILE)
+        os.remove("temp_" + self.POPULATED_DB_FILE)
+        for filename in ["temp_" + self.EMPTY_DB_FILE + WebReader.QUARANTINE_EXTENSION, "temp_data_feed.csv"]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def getUrl(self, filename):
+        return "file:///" + os.path.dirname(os.path.abspath(__file__)) + '/' + filename
+
+    def createSource(self, sourceConfig, filename):
+        return createSource(dict(sourceConfig, url=self.getUrl(filename)))
+
+    def test_createSourceReturnsNoneForUnknownTypeOrMissingUrl(self):
+        self.assertIsNone(createSource({'type' : 'xml', 'url' : 'feed.xml'}))
+        self.assertIsNone(createSource({'type' : 'csv'}))
+        self.assertIsInstance(createSource({'type' : 'html'}), HtmlPageSource)
+
+    def test_csvFeedReadLatestEntryMapsColumnsAndFindsNewestRowInAnyOrder(self):
+        source = self.createSource(self.CSV_FEED_CONFIG, self.CSV_FEED_FILENAME)
+        self.assertEqual(self.LATEST_FEED_ENTRY, EntryRecord.parse(source.readLatestEntry(self.wr, source.url))[0]._asdict())
+
+    def test_jsonFeedReadLatestEntryReadsNestedColumnsAndEpochDates(self):
+        source = self.createSource(self.JSON_FEED_CONFIG, self.JSON_FEED_FILENAME)
+        self.assertEqual('2020-04-24', source.readLatestDate(self.wr, source.url))
+        self.assertEqual(self.LATEST_FEED_ENTRY, EntryRecord.parse(source.readLatestEntry(self.wr, source.url))[0]._asdict())
+
+    def test_jsonLinesFeedReadEntriesReturnsOnlyNewerEntriesOldestFirst(self):
+        source = self.createSource({'type' : 'jsonl'}, self.JSON_LINES_FEED_FILENAME)
+        records = source.readEntries(self.wr, source.url, sinceDate='2020-04-22')
+        self.assertListEqual(['2020-04-23', '2020-04-24'], [record.date for record in records])
+        self.assertIsNone(records[0].new_cases)
+
+    def test_htmlPageSourceReadEntriesReturnsOnlyTheLatestEntry(self):
+        source = HtmlPageSource(self.getUrl(self.VALID_WEBSITE_FILENAME))
+        self.assertEqual(['2020-04-24'], [record.date for record in source.readEntries(self.wr, source.url)])
+        self.assertListEqual([], source.readEntries(self.wr, source.url, sinceDate='2020-04-24'))
+
+    def test_webReaderWithFeedSourceChecksForNewDataWithoutThePage(self):
+        wr = WebReader("temp_" + self.POPULATED_DB_FILE, source=self.createSource(self.CSV_FEED_CONFIG, self.CSV_FEED_FILENAME))
+        # the populated database runs through 2020-04-26
+        self.assertFalse(wr.isNewDataAvailable())
+        # csv values are read as strings and converted when the entry is parsed
+        self.assertEqual(2943, EntryRecord.parse(wr.readLatestEntryFromWeb())[0].total_cases)
+        wr.close()
+
+    def test_backfillFromSourceStoresEveryNewerEntryInOneBatch(self):
+        self.wr.source = self.createSource(self.CSV_FEED_CONFIG, self.CSV_FEED_FILENAME)
+        self.assertEqual(3, self.wr.backfillFromSource())
+        self.assertEqual('2020-04-24', self.wr.getLatestEntry().date)
+        # nothing newer on a second run
+        self.assertEqual(0, self.wr.backfillFromSource())
+        conn = sqlite3.connect("temp_" + self.EMPTY_DB_FILE)
+        self.assertEqual(3, conn.execute("SELECT COUNT(*) from DATA").fetchone()[0])
+        # the day the feed has no new cases for gets the change from the day before
+        self.assertListEqual([(134,), (135,), (117,)], conn.execute("SELECT NEW_CASES from DATA ORDER BY DAY ASC").fetchall())
+        conn.close()
+
+    def test_backfillFromSourceQuarantinesImplausibleEntries(self):
+        with open(self.CSV_FEED_FILENAME, 'rb') as f:
+            feed = f.read()
+        # total cases going down from the day before
+        with open("temp_data_feed.csv", 'wb') as f:
+            f.write(feed.replace(b"04/24/2020,2943", b"04/24/2020,2800"))
+        self.wr.source = self.createSource(self.CSV_FEED_CONFIG, "temp_data_feed.csv")
+        self.assertEqual(2, self.wr.backfillFromSource())
+        self.assertEqual('2020-04-23', self.wr.getLatestEntry().date)
+        with open(self.wr.quarantineFilename) as f:
+            quarantined = [json.loads(line) for line in f.readlines()]
+        self.assertListEqual(['2020-04-24'], [record['entry']['date'] for record in quarantined])
+
+if __name__ == "__main__":
+    unittest.main()
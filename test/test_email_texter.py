@@ -6,7 +6,7 @@ import json, sys
 import unittest
 
 sys.path.append("..")
-from email_texter import EmailTexter
+from email_texter import EmailTexter, SendScheduler
 
 class IntegrationTestCases(unittest.TestCase):
 
@@ -193,5 +193,53 @@ class UnitTestCases(unittest.TestCase):
         )
 
 
+class SendSchedulerTestCases(unittest.TestCase):
+
+    def setUp(self):
+        # fake clock that only moves when the scheduler sleeps
+        self.now = 0.0
+        self.sleeps = []
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            self.now += seconds
+        self.scheduler = SendScheduler(
+            domainLimits={'vtext.com' : {'rate' : 1.0, 'burst' : 2}},
+            senderLimit={'rate' : 10.0, 'burst' : 10},
+            clock=lambda: self.now,
+            sleep=sleep
+        )
+
+    def test_acquireAllowsBurstWithoutWaiting(self):
+        self.assertEqual(0.0, self.scheduler.acquire('vtext.com', 'me'))
+        self.assertEqual(0.0, self.scheduler.acquire('vtext.com', 'me'))
+        self.assertListEqual([], self.sleeps)
+
+    def test_acquireWaitsForDomainRateAfterBurst(self):
+        for x in range(4):
+            self.scheduler.acquire('vtext.com', 'me')
+        self.assertAlmostEqual(2.0, self.now)
+        metrics = self.scheduler.getMetrics()['vtext.com']
+        self.assertEqual(4, metrics['sent'])
+        self.assertEqual(0, metrics['queue_depth'])
+        self.assertAlmostEqual(1.0, metrics['max_wait_secs'])
+
+    def test_acquireGivesEachShareAnEqualPartOfTheLimit(self):
+        self.scheduler.shares = 2
+        for x in range(3):
+            self.scheduler.acquire('vtext.com', 'me')
+        # burst of 1 then half the rate, so two sends that wait 2 secs each
+        self.assertAlmostEqual(4.0, self.now)
+
+    def test_acquireLimitsEachDomainSeparately(self):
+        for x in range(2):
+            self.scheduler.acquire('vtext.com', 'me')
+        self.assertEqual(0.0, self.scheduler.acquire('example.com', 'me'))
+
+    def test_acquireLimitsSenderAcrossDomains(self):
+        for x in range(10):
+            self.scheduler.acquire('example.com', 'me')
+        self.assertAlmostEqual(0.1, self.scheduler.acquire('example.org', 'me'))
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,55 @@
+# tests entry_record.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys, sqlite3
+
+sys.path.append('..')
+from entry_record import *
+
+class UnitTestCases(unittest.TestCase):
+
+    VALID_ENTRY = {
+        'date' : '2020-04-21',
+        'total_cases' : '2434',
+        'new_cases' : 109,
+        'new_tests' : '',
+        'hospitalizations' : 626,
+        'intensive_care' : 202,
+        'deaths' : None
+    }
+
+    def test_parseConvertsFieldsAndTreatsBlanksAsNone(self):
+        record, problems = EntryRecord.parse(self.VALID_ENTRY)
+        self.assertListEqual([], problems)
+        self.assertEqual(EntryRecord('2020-04-21', 2434, 109, None, 626, 202, None), record)
+
+    def test_parseReturnsEveryProblemInOnePass(self):
+        entry = dict(self.VALID_ENTRY)
+        del entry['deaths']
+        entry['date'] = 'April 21'
+        entry['total_cases'] = 'many'
+        entry['new_cases'] = -1
+        record, problems = EntryRecord.parse(entry)
+        self.assertIsNone(record)
+        self.assertEqual(4, len(problems))
+
+    def test_parseReturnsRecordsAsIs(self):
+        record = EntryRecord('2020-04-21', total_cases=2434)
+        self.assertEqual((record, []), EntryRecord.parse(record))
+
+    def test_parseReturnsProblemForMissingEntry(self):
+        self.assertEqual((None, ["page could not be parsed"]), EntryRecord.parse(None))
+
+    def test_fromRowBuildsRecordsFromDataQueryRows(self):
+        conn = sqlite3.connect(":memory:")
+        conn.row_factory = EntryRecord.fromRow
+        record = conn.execute("SELECT '2020-04-21', 2434, 109, NULL, 626, 202, 98").fetchone()
+        conn.close()
+        self.assertEqual(109, record.new_cases)
+        self.assertEqual(109, record[2])
+        self.assertEqual(21, record.getDate().day)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+# tests event_bus.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys, threading
+
+sys.path.append('..')
+from event_bus import *
+
+class UnitTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = EventBus()
+
+    def tearDown(self):
+        self.bus.close()
+
+    def test_publishDeliversPayloadToEverySubscriberInOrder(self):
+        firstReceived, secondReceived = [], []
+        self.bus.subscribe('test', firstReceived.append)
+        self.bus.subscribe('test', secondReceived.append)
+        self.assertEqual(2, self.bus.publish('test', 1))
+        self.bus.publish('test', 2)
+        self.bus.waitUntilIdle()
+        self.assertListEqual([1, 2], firstReceived)
+        self.assertListEqual([1, 2], secondReceived)
+
+    def test_publishWithNoSubscribersDoesNothing(self):
+        self.assertEqual(0, self.bus.publish('nobody_listening', 1))
+
+    def test_slowSubscriberDoesNotBlockPublisherOrOtherSubscribers(self):
+        release = threading.Event()
+        fastReceived = threading.Event()
+        self.bus.subscribe('test', lambda payload: release.wait(5))
+        self.bus.subscribe('test', lambda payload: fastReceived.set())
+        self.bus.publish('test')
+        self.assertTrue(fastReceived.wait(5))
+        release.set()
+
+    def test_failingSubscriberKeepsReceivingEvents(self):
+        received = []
+        def failOnFirst(payload):
+            if payload == 1:
+                raise ValueError("first event fails")
+            received.append(payload)
+        self.bus.subscribe('test', failOnFirst)
+        self.bus.publish('test', 1)
+        self.bus.publish('test', 2)
+        self.bus.waitUntilIdle()
+        self.assertListEqual([2], received)
+
+    def test_unsubscribeStopsDelivery(self):
+        received = []
+        subscriber = self.bus.subscribe('test', received.append)
+        self.bus.unsubscribe('test', subscriber)
+        self.assertEqual(0, self.bus.publish('test', 1))
+
+    def test_synchronousBusRunsCallbacksBeforePublishReturns(self):
+        received = []
+        self.bus.synchronous = True
+        self.bus.subscribe('test', lambda payload: received.append(threading.get_ident()))
+        self.bus.publish('test')
+        self.assertListEqual([threading.get_ident()], received)
+
+
+if __name__ == "__main__":
+    unittest.main()
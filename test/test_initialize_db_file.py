@@ -0,0 +1,92 @@
+# tests initialize_db_file.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest, shutil
+import sys, os, sqlite3
+
+sys.path.append('..')
+from initialize_db_file import *
+
+class UnitTestCases(unittest.TestCase):
+
+    TEST_DB_FILE = "basic_populated_database.db"
+
+    def setUp(self):
+        shutil.copyfile(self.TEST_DB_FILE, "temp_" + self.TEST_DB_FILE)
+
+    def tearDown(self):
+        os.remove("temp_" + self.TEST_DB_FILE)
+        shutil.rmtree(PageArchive.getDefaultDirectory("temp_" + self.TEST_DB_FILE), ignore_errors=True)
+
+    def query(self, command):
+        conn = sqlite3.connect("temp_" + self.TEST_DB_FILE)
+        result = conn.execute(command).fetchall()
+        conn.close()
+        return result
+
+    def test_getAggregateRowsSkipsPeriodsEndingAfterHorizon(self):
+        entries = [
+            ('2020-03-30', 10, 1, 5, None, None, None),
+            ('2020-04-05', 20, 10, None, 2, None, None),
+            ('2020-04-06', 30, 10, 5, 3, None, None)
+        ]
+        rows = getAggregateRows(entries, 'weekly', date(2020, 4, 8))
+        self.assertListEqual([('2020-03-30', '2020-04-05', 2, 20, 11, 5, 2, None, None, 10)], rows)
+
+    def test_rebuildFromArchiveReplacesEntriesOfArchivedPagesOnly(self):
+        with open("test_valid_data_website.html", 'rb') as f:
+            # page of 2020-04-24 as a fixed parser would read it
+            page = f.read().replace(b"2,943", b"2,900")
+        PageArchive(PageArchive.getDefaultDirectory("temp_" + self.TEST_DB_FILE)).store("https://example.gov/status.html", page)
+        stats = rebuildFromArchive("temp_" + self.TEST_DB_FILE, processes=1)
+        self.assertEqual(1, stats['entries'])
+        self.assertListEqual([], stats['failures'])
+        # new cases are recomputed from the previous day, fields missing from the page are kept
+        self.assertListEqual([('2020-04-23', 2826, 183, 3122), ('2020-04-24', 2900, 74, 1826), ('2020-04-25', 3043, 100, 1297)],
+            self.query("SELECT DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS from DATA WHERE DATE BETWEEN '2020-04-23' AND '2020-04-25' ORDER BY DAY"))
+
+    def test_rebuildFromArchiveRaisesWithoutArchive(self):
+        self.assertRaises(Exception, rebuildFromArchive, "temp_" + self.TEST_DB_FILE)
+
+    def test_compactDatabaseRollsUpAndPrunesOnlyCompletedPeriods(self):
+        stats = compactDatabase("temp_" + self.TEST_DB_FILE, retentionDays=20, longWindowDays=10)
+        # latest entry is 2020-04-26, so days before 2020-04-06 are rolled up
+        self.assertEqual(5, stats['weekly_rows'])
+        self.assertEqual(1, stats['monthly_rows'])
+        # april has not ended, so its days are kept even though their weeks were rolled up
+        self.assertEqual(25, stats['pruned_daily_rows'])
+        self.assertListEqual([('2020-04-01', 26)], self.query("SELECT MIN(DATE), COUNT(*) from DATA"))
+        self.assertListEqual([('2020-03-31', 25, 851, 131)], self.query("SELECT LAST_DATE, DAYS, NEW_CASES, MAX_NEW_CASES from DATA_MONTHLY"))
+
+    def test_compactDatabaseMigratesDatabasesWithoutDayColumn(self):
+        conn = sqlite3.connect("temp_" + self.TEST_DB_FILE)
+        conn.execute("DROP INDEX DATA_DAY_INDEX")
+        conn.execute("ALTER TABLE DATA DROP COLUMN DAY")
+        conn.close()
+        stats = compactDatabase("temp_" + self.TEST_DB_FILE, retentionDays=20, longWindowDays=10)
+        self.assertEqual(25, stats['pruned_daily_rows'])
+        self.assertListEqual([(date(2020, 4, 1).toordinal(), '2020-04-01')], self.query("SELECT DAY, DATE from DATA ORDER BY DAY LIMIT 1"))
+
+    def test_compactDatabaseTwiceDoesNotChangeRolledUpPeriods(self):
+        compactDatabase("temp_" + self.TEST_DB_FILE, retentionDays=20, longWindowDays=10)
+        monthly = self.query("SELECT * from DATA_MONTHLY")
+        stats = compactDatabase("temp_" + self.TEST_DB_FILE, retentionDays=20, longWindowDays=10)
+        self.assertEqual(0, stats['pruned_daily_rows'])
+        self.assertListEqual(monthly, self.query("SELECT * from DATA_MONTHLY"))
+
+    def test_compactDatabasePrunesWeeksPastWeeklyRetention(self):
+        stats = compactDatabase("temp_" + self.TEST_DB_FILE, retentionDays=20, weeklyRetentionDays=30, longWindowDays=10)
+        # weeks before march (the start of the month 30 days back) go, march is still covered by weeks
+        self.assertEqual(0, stats['pruned_weekly_rows'])
+        stats = compactDatabase("temp_" + self.TEST_DB_FILE, retentionDays=20, weeklyRetentionDays=20, longWindowDays=10)
+        self.assertEqual(5, stats['pruned_weekly_rows'])
+        self.assertListEqual([(1,)], self.query("SELECT COUNT(*) from DATA_MONTHLY"))
+
+    def test_compactDatabaseSwitchesToIncrementalVacuum(self):
+        compactDatabase("temp_" + self.TEST_DB_FILE)
+        self.assertListEqual([(2,)], self.query("PRAGMA auto_vacuum"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+# tests message_templates.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys
+
+sys.path.append('..')
+from message_templates import *
+
+class UnitTestCases(unittest.TestCase):
+
+    UPDATE = "LATEST SD COVID19 UPDATE:\nNew Cases: 1\nTotal Cases: 3044\nhttps://bit.ly/2W8uQJM"
+
+    FACTS = [
+        (30, 'Total cases are doubling every 16.1 days'),
+        (50, 'The 3-day trend of new cases is -9.50/day'),
+        (47, 'The 7-day average of new cases is up 71% from the period before')
+    ]
+
+    def setUp(self):
+        self.mt = MessageTemplates()
+
+    def test_renderMatchesTheDefaultUpdateText(self):
+        self.assertEqual(self.UPDATE, self.mt.render('update', date='2020-04-27', new_cases=1, total_cases=3044, link=self.mt.render('link')))
+        self.assertEqual("SD COVID19 DAILY DIGEST:\nNew Cases: None\nTotal Cases: 5", self.mt.render('digest', digest='DAILY', new_cases=None, total_cases=5))
+
+    def test_renderSkipsTheFormatSpecOfNone(self):
+        mt = MessageTemplates({'digest' : "{digest}: {new_cases:,} new, {total_cases:,} total"})
+        self.assertEqual("DAILY: 1,200 new, None total", mt.render('digest', digest='DAILY', new_cases=1200, total_cases=None))
+
+    def test_configuredTemplatesAndProfilesReplaceOnlyTheirDefaults(self):
+        mt = MessageTemplates({'fact' : "* {fact}"}, {'vtext.com' : {'max_segments' : 2}})
+        self.assertEqual("* x", mt.render('fact', fact='x'))
+        self.assertEqual("Analysis:", mt.render('analysis'))
+        self.assertDictEqual({'links' : True, 'max_segments' : 2}, mt.getProfile('5551234567@vtext.com'))
+        self.assertFalse(mt.getProfile('5551234567@tmomail.net')['links'])
+        self.assertEqual(MessageTemplates.DEFAULT_PROFILE, mt.getProfile('someone@example.com'))
+
+    def test_invalidTemplatesAreReported(self):
+        self.assertRaises(ValueError, MessageTemplates, {'update' : "{total_cases!r}"})
+        problems = MessageTemplates.getTemplateProblems({'update' : "{unknown}", 'fact' : "{fact", 'other' : "", 'digest' : "{digest}"})
+        self.assertEqual(3, len(problems))
+        self.assertListEqual(["recipient_profiles vtext.com has unknown field color"], MessageTemplates.getProfileProblems({'vtext.com' : {'color' : 1}}))
+
+    def test_packSegmentsMergesEverythingThatFits(self):
+        segments = self.mt.packSegments([self.UPDATE], self.FACTS, 1000)
+        self.assertEqual(1, len(segments))
+        # facts follow the header most important first
+        self.assertEqual(self.UPDATE + "\nAnalysis:\n- " + self.FACTS[1][1] + "\n- " + self.FACTS[2][1] + "\n- " + self.FACTS[0][1], segments[0])
+
+    def test_packSegmentsFillsGapsWithLessImportantFacts(self):
+        segments = self.mt.packSegments([self.UPDATE], self.FACTS, 160)
+        self.assertListEqual([
+            self.UPDATE + "\nAnalysis:\n- " + self.FACTS[1][1],
+            "- " + self.FACTS[2][1] + "\n- " + self.FACTS[0][1]
+        ], segments)
+        self.assertTrue(all(len(segment) <= 160 for segment in segments))
+
+    def test_packSegmentsDropsFactsPastMaxSegments(self):
+        segments = self.mt.packSegments([self.UPDATE], self.FACTS, 100, maxSegments=2)
+        # the second most important fact needs a third text, the least important one still fits the second
+        self.assertListEqual([self.UPDATE, "Analysis:\n- " + self.FACTS[1][1] + "\n- " + self.FACTS[0][1]], segments)
+
+    def test_packSegmentsKeepsFactsAfterEveryHead(self):
+        # room is left after the first head, but the analysis never comes before the second
+        segments = self.mt.packSegments(["a" * 80, "b" * 90], [(1, "short")], 100)
+        self.assertListEqual(["a" * 80, "b" * 90, "Analysis:\n- short"], segments)
+        segments = self.mt.packSegments(["a" * 60, "b" * 10], [(1, "short")], 100)
+        self.assertListEqual(["a" * 60 + "\n" + "b" * 10 + "\nAnalysis:\n- short"], segments)
+
+    def test_packSegmentsGivesAnOverlongFactATextOfItsOwn(self):
+        segments = self.mt.packSegments(["update"], [(1, "x" * 200)], 160)
+        self.assertListEqual(["update", "Analysis:\n- " + "x" * 200], segments)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+# tests notification_channels.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys, os, json, threading, smtplib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.append('..')
+from notification_channels import *
+from email_texter import EmailTexter
+
+# stands in for an smtplib server, recording what would have been sent
+class RecordingServer:
+
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, msg, to_addrs=None):
+        self.sent.append(to_addrs if to_addrs is not None else [msg['To']])
+        # like smtplib, the recipients the server refused
+        return {}
+
+    def close(self):
+        pass
+
+
+class UnitTestCases(unittest.TestCase):
+
+    SINK_FILE = "temp_notifications.jsonl"
+
+    RECIPIENTS = ["1234567890@vtext.com", "1234567891@vtext.com", "1234567892@vtext.com", "1234567893@tmomail.net"]
+
+    def tearDown(self):
+        if os.path.exists(self.SINK_FILE):
+            os.remove(self.SINK_FILE)
+
+    def test_smtpChannelBatchesRecipientsPerGateway(self):
+        channel = SmtpChannel(EmailTexter(), {}, maxRecipients={'vtext.com' : 2, 'tmomail.net' : 1})
+        channel.server = RecordingServer()
+        self.assertEqual(4, channel.send("hello", self.RECIPIENTS))
+        self.assertListEqual([
+            ["1234567890@vtext.com", "1234567891@vtext.com"],
+            ["1234567892@vtext.com"],
+            ["1234567893@tmomail.net"]
+        ], channel.server.sent)
+
+    def test_smtpChannelSkipsFailedBatchesAndRefusedRecipients(self):
+        class FailingServer(RecordingServer):
+            def send_message(self, msg, to_addrs=None):
+                if to_addrs is None:
+                    raise smtplib.SMTPServerDisconnected("connection closed")
+                RecordingServer.send_message(self, msg, to_addrs)
+                return {to_addrs[0] : (550, b"no such user")}
+        channel = SmtpChannel(EmailTexter(), {}, maxRecipients={'vtext.com' : 2, 'tmomail.net' : 1})
+        channel.server = FailingServer()
+        # the single recipient batches fail, the first address of the two recipient batch is refused
+        self.assertEqual(1, channel.send("hello", self.RECIPIENTS))
+        self.assertListEqual([["1234567890@vtext.com", "1234567891@vtext.com"]], channel.server.sent)
+
+    def test_fileSinkChannelAppendsOneLinePerMessage(self):
+        channel = FileSinkChannel(self.SINK_FILE)
+        self.assertEqual(4, channel.send("hello", self.RECIPIENTS))
+        self.assertEqual(4, channel.send("again", self.RECIPIENTS))
+        with open(self.SINK_FILE) as f:
+            lines = f.readlines()
+        self.assertEqual(2, len(lines))
+        self.assertEqual("hello", json.loads(lines[0])['message'])
+
+    def test_webhookChannelPostsBatches(self):
+        received = []
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            def log_message(self, format, *args):
+                pass
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            channel = WebhookChannel("http://127.0.0.1:" + str(server.server_address[1]) + "/", batchSize=3)
+            self.assertEqual(4, channel.send("hello", self.RECIPIENTS))
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(2, len(received))
+        self.assertListEqual(self.RECIPIENTS[:3], received[0]['recipients'])
+
+    def test_createChannelReturnsNoneOnInvalidConfig(self):
+        self.assertIsNone(createChannel({'type' : 'carrier_pigeon'}, EmailTexter(), {}))
+        self.assertIsNone(createChannel({'type' : 'webhook'}, EmailTexter(), {}))
+        self.assertIsInstance(createChannel({'type' : 'file', 'filename' : self.SINK_FILE}, EmailTexter(), {}), FileSinkChannel)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+# tests page_archive.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys, os, shutil
+
+sys.path.append('..')
+from page_archive import *
+from web_reader import WebReader
+
+class UnitTestCases(unittest.TestCase):
+
+    ARCHIVE_DIR = "temp_archive" + PageArchive.DIRECTORY_EXTENSION
+    VALID_WEBSITE_FILENAME = "test_valid_data_website.html"
+    URL = "https://example.gov/status.html"
+
+    def setUp(self):
+        with open(self.VALID_WEBSITE_FILENAME, 'rb') as f:
+            self.page = f.read()
+        # same page a day later
+        self.nextPage = self.page.replace(b"through April 24,", b"through April 25,").replace(b"2,943", b"3,043")
+        self.archive = PageArchive(self.ARCHIVE_DIR)
+
+    def tearDown(self):
+        shutil.rmtree(self.ARCHIVE_DIR, ignore_errors=True)
+
+    def countObjects(self):
+        return sum(len(filenames) for dirpath, dirnames, filenames in os.walk(os.path.join(self.ARCHIVE_DIR, "objects")))
+
+    def test_storeKeepsOnlyChangedPagesCompressed(self):
+        self.assertFalse(self.archive.exists())
+        digest = self.archive.store(self.URL, self.page, fetchedAt=100)
+        self.archive.store(self.URL, self.page, fetchedAt=160)
+        self.archive.store(self.URL, self.nextPage, fetchedAt=220)
+        # the county reverting to an earlier page is a new version, but not a new object
+        self.archive.store(self.URL, self.page, fetchedAt=280)
+        self.assertListEqual([100, 220, 280], [fetch[2] for fetch in self.archive.readFetches()])
+        self.assertEqual(2, self.countObjects())
+        self.assertEqual(self.page, self.archive.readPage(digest))
+        self.assertLess(os.path.getsize(self.archive.getObjectFilename(digest)), len(self.page) / 4)
+
+    def test_storeAfterRestartDoesNotRecordTheSamePageAgain(self):
+        self.archive.store(self.URL, self.page)
+        PageArchive(self.ARCHIVE_DIR).store(self.URL, self.page)
+        self.assertEqual(1, len(self.archive.readFetches()))
+
+    def test_webReaderArchivesFetchedPages(self):
+        url = "file:///" + os.path.dirname(os.path.abspath(__file__)) + '/' + self.VALID_WEBSITE_FILENAME
+        wr = WebReader(":memory:", archive=self.archive)
+        self.assertEqual('2020-04-24', wr.readLatestEntryFromWeb(url)['date'])
+        self.assertListEqual([url], [fetch[1] for fetch in self.archive.readFetches()])
+        wr.close()
+
+    def test_reparseParsesPagesInParallelAndReportsFailures(self):
+        self.archive.store(self.URL, self.page)
+        self.archive.store(self.URL, b"<html>maintenance</html>")
+        self.archive.store(self.URL, self.nextPage)
+        records, failures = self.archive.reparse(processes=2)
+        self.assertListEqual([('2020-04-24', 2943), ('2020-04-25', 3043)], [(record.date, record.total_cases) for record in records])
+        self.assertEqual(1, len(failures))
+
+if __name__ == "__main__":
+    unittest.main()
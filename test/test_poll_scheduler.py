@@ -0,0 +1,65 @@
+# tests poll_scheduler.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys, time
+
+sys.path.append('..')
+from poll_scheduler import *
+
+class UnitTestCases(unittest.TestCase):
+
+    # local timestamp of a time of day on a given day of april 2020
+    @staticmethod
+    def localTime(day, hour, minute=0):
+        return time.mktime((2020, 4, day, hour, minute, 0, 0, 0, -1))
+
+    def setUp(self):
+        self.scheduler = PollScheduler(baseInterval=60, maxInterval=3600, windowPadding=1800)
+        # county published between 16:00 and 17:00 the last few days
+        self.updateTimes = [
+            self.localTime(20, 16, 10),
+            self.localTime(21, 16, 45),
+            self.localTime(22, 16, 20),
+            self.localTime(23, 17, 0)
+        ]
+
+    def test_learnWindowNeedsMinimumHistory(self):
+        self.assertFalse(self.scheduler.learnWindow(self.updateTimes[:2]))
+        self.assertEqual(60, self.scheduler.getNextInterval(self.localTime(24, 3)))
+
+    def test_learnWindowCoversUpdateTimesWithPadding(self):
+        self.assertTrue(self.scheduler.learnWindow(self.updateTimes))
+        self.assertTrue(self.scheduler.isInWindow(self.localTime(24, 15, 45)))
+        self.assertTrue(self.scheduler.isInWindow(self.localTime(24, 17, 25)))
+        self.assertFalse(self.scheduler.isInWindow(self.localTime(24, 15, 30)))
+        self.assertFalse(self.scheduler.isInWindow(self.localTime(24, 18)))
+
+    def test_learnWindowHandlesWindowAcrossMidnight(self):
+        self.assertTrue(self.scheduler.learnWindow([self.localTime(20, 23, 50), self.localTime(21, 0, 10), self.localTime(22, 23, 55)]))
+        self.assertTrue(self.scheduler.isInWindow(self.localTime(24, 0, 30)))
+        self.assertTrue(self.scheduler.isInWindow(self.localTime(24, 23, 30)))
+        self.assertFalse(self.scheduler.isInWindow(self.localTime(24, 12)))
+
+    def test_getNextIntervalPollsAtBaseInsideWindow(self):
+        self.scheduler.learnWindow(self.updateTimes)
+        self.assertEqual(60, self.scheduler.getNextInterval(self.localTime(24, 16)))
+
+    def test_getNextIntervalBacksOffOutsideWindowWithoutPassingWindowStart(self):
+        self.scheduler.learnWindow(self.updateTimes)
+        intervals = [self.scheduler.getNextInterval(self.localTime(24, 3)) for x in range(8)]
+        self.assertListEqual([120, 240, 480, 960, 1920, 3600, 3600, 3600], intervals)
+        # 15:40 is the window start, so never waits past it
+        self.assertEqual(20 * 60, self.scheduler.getNextInterval(self.localTime(24, 15, 20)))
+
+    def test_markCaughtUpBacksOffForRestOfWindow(self):
+        self.scheduler.learnWindow(self.updateTimes)
+        self.scheduler.markCaughtUp(self.localTime(24, 16, 5))
+        self.assertEqual(120, self.scheduler.getNextInterval(self.localTime(24, 16, 6)))
+        # next day's window is polled at the base interval again
+        self.assertEqual(60, self.scheduler.getNextInterval(self.localTime(25, 16, 0)))
+
+
+if __name__ == "__main__":
+    unittest.main()
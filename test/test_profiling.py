@@ -0,0 +1,71 @@
+# tests profiling.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys, os, time, json
+
+sys.path.append('..')
+from profiling import *
+from web_reader import WebReader
+
+class UnitTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.outputPrefix = "temp_profile"
+
+    def tearDown(self):
+        for extension in [".pstats", ".collapsed"]:
+            if os.path.exists(self.outputPrefix + extension):
+                os.remove(self.outputPrefix + extension)
+        if os.path.exists("temp_config.json"):
+            os.remove("temp_config.json")
+
+    def test_profileCallWritesPstatsAndCollapsedStacks(self):
+        pstatsFilename, collapsedFilename = profileCall(self.outputPrefix, time.sleep, 0.05)
+        self.assertTrue(os.path.exists(pstatsFilename))
+        stats = pstats.Stats(pstatsFilename)
+        self.assertGreater(stats.total_calls, 0)
+        with open(collapsedFilename) as f:
+            lines = f.read().splitlines()
+        self.assertGreater(len(lines), 0)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+
+    def test_profileCallCatchesSystemExit(self):
+        def exitingFunction():
+            sys.exit(1)
+        pstatsFilename, collapsedFilename = profileCall(self.outputPrefix, exitingFunction)
+        self.assertTrue(os.path.exists(pstatsFilename))
+        self.assertTrue(os.path.exists(collapsedFilename))
+
+    def test_profileUpdateCycleReadsTheTestPageInsteadOfTheConfiguredSource(self):
+        with open("valid_configuration_file.json") as f:
+            configData = json.load(f)
+        configData['source'] = {'type' : 'csv', 'url' : 'https://example.invalid/feed.csv'}
+        with open("temp_config.json", 'w') as f:
+            json.dump(configData, f)
+        def failingGetResponse(webReader, url):
+            raise AssertionError("fetched " + url)
+        getResponse = WebReader.getResponse
+        WebReader.getResponse = failingGetResponse
+        try:
+            pstatsFilename, collapsedFilename = profileUpdateCycle("temp_config.json", "basic_populated_database.db", self.outputPrefix)
+        finally:
+            WebReader.getResponse = getResponse
+        # the html fixture was parsed, nothing was fetched over http
+        functionNames = [function[2] for function in pstats.Stats(pstatsFilename).stats]
+        self.assertIn('parsePage', functionNames)
+        self.assertNotIn('failingGetResponse', functionNames)
+
+    def test_profileUpdateCycleStoresAnalyzesAndSendsThePage(self):
+        # the database goes past the page's date, the profiled copy must not
+        pstatsFilename, collapsedFilename = profileUpdateCycle("valid_configuration_file.json", "basic_populated_database.db", self.outputPrefix)
+        functionNames = [function[2] for function in pstats.Stats(pstatsFilename).stats]
+        for functionName in ['addEntryToDatabase', 'sendUpdate', 'getRankedFactTuples', 'render', 'sendMessagePages']:
+            self.assertIn(functionName, functionNames)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+# tests region_analyzer.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys, os, shutil, sqlite3
+
+sys.path.append('..')
+from region_analyzer import *
+
+class UnitTestCases(unittest.TestCase):
+
+    POPULATED_DB_FILE = "basic_populated_database.db"
+    EMPTY_DB_FILE = "empty_test_database.db"
+    REGION_DB_FILES = ["temp_region_a.db", "temp_region_b.db", "temp_region_c.db"]
+
+    def setUp(self):
+        # same history in every region, then the latest day is changed so they rank differently
+        for dbFile in self.REGION_DB_FILES:
+            shutil.copyfile(self.POPULATED_DB_FILE, dbFile)
+        shutil.copyfile(self.EMPTY_DB_FILE, "temp_" + self.EMPTY_DB_FILE)
+        self.setLatestDay("temp_region_b.db", 3341, 298)
+        self.setLatestDay("temp_region_c.db", 3041, None)
+        self.ra = RegionAnalyzer({'a' : "temp_region_a.db", 'b' : "temp_region_b.db", 'c' : "temp_region_c.db"})
+
+    def tearDown(self):
+        self.ra.close()
+        for dbFile in self.REGION_DB_FILES + ["temp_" + self.EMPTY_DB_FILE]:
+            os.remove(dbFile)
+
+    # dbFile     : region database
+    # totalCases : total cases of the latest day
+    # newCases   : new cases of the latest day
+    def setLatestDay(self, dbFile, totalCases, newCases):
+        conn = sqlite3.connect(dbFile)
+        with conn:
+            conn.execute("UPDATE DATA SET TOTAL_CASES = ?, NEW_CASES = ? WHERE DAY = (SELECT MAX(DAY) from DATA)", (totalCases, newCases))
+        conn.close()
+
+    def test_getComparisonComputesRollingStatisticsPerRegion(self):
+        regions = self.ra.getComparison()['regions']
+        # 3141 cases on 4/26 against 2325 on 4/19
+        self.assertEqual('2020-04-26', regions['a']['date'])
+        self.assertAlmostEqual(100.0 * (3141 - 2325) / 2325, regions['a']['weekly_growth'])
+        self.assertAlmostEqual(816 / 7, regions['a']['mean_new_cases'])
+        self.assertGreater(regions['a']['week_over_week'], 0)
+        self.assertGreater(regions['a']['doubling_time'], 7)
+        # missing new cases fall back to the change in total cases (3041 - 3043)
+        self.assertAlmostEqual((816 - 98 - 2) / 7, regions['c']['mean_new_cases'])
+
+    def test_getComparisonRanksEveryRegionFastestFirst(self):
+        comparison = self.ra.getComparison()
+        self.assertDictEqual({'a' : 2, 'b' : 1, 'c' : 3}, {name: stats['ranks']['weekly_growth'] for name, stats in comparison['regions'].items()})
+        self.assertDictEqual({'a' : 50.0, 'b' : 100.0, 'c' : 0.0}, {name: stats['percentiles']['weekly_growth'] for name, stats in comparison['regions'].items()})
+        self.assertEqual('b', comparison['leaders']['weekly_growth'])
+
+    def test_getComparisonIsCachedUntilARegionChanges(self):
+        comparison = self.ra.getComparison()
+        self.assertIs(comparison, self.ra.getComparison())
+        self.setLatestDay("temp_region_c.db", 4000, 959)
+        changed = self.ra.getComparison()
+        self.assertIsNot(comparison, changed)
+        self.assertEqual(1, changed['regions']['c']['ranks']['weekly_growth'])
+
+    def test_getComparisonSplitsRegionsPastTheAttachLimit(self):
+        regions = {'region' + str(idx): "temp_region_a.db" for idx in range(12)}
+        ra = RegionAnalyzer(regions)
+        comparison = ra.getComparison()
+        self.assertEqual(12, len(comparison['regions']))
+        self.assertGreater(len(ra.connections), 1)
+        # every region ties for first
+        self.assertSetEqual({1}, {stats['ranks']['weekly_growth'] for stats in comparison['regions'].values()})
+        ra.close()
+
+    def test_getComparisonSkipsRankingRegionsWithoutData(self):
+        ra = RegionAnalyzer({'a' : "temp_region_a.db", 'empty' : "temp_" + self.EMPTY_DB_FILE})
+        comparison = ra.getComparison()
+        self.assertNotIn('empty', comparison['regions'])
+        self.assertListEqual([], ra.getRegionFacts('a'))
+        ra.close()
+
+    def test_getComparisonLeavesOutUnreadableDatabases(self):
+        # made before the DAY column, and a new file without any tables
+        conn = sqlite3.connect("temp_region_b.db")
+        with conn:
+            conn.execute("DROP INDEX DATA_DAY_INDEX")
+            conn.execute("ALTER TABLE DATA DROP COLUMN DAY")
+        conn.close()
+        os.remove("temp_region_c.db")
+        sqlite3.connect("temp_region_c.db").close()
+        comparison = self.ra.getComparison()
+        self.assertListEqual(['a'], list(comparison['regions']))
+        self.assertListEqual([], self.ra.getRegionFacts('a'))
+
+    def test_getRegionFacts(self):
+        self.assertEqual(60, self.ra.getRegionFacts('b')[0][0])
+        self.assertIn("fastest of 3 regions", self.ra.getRegionFacts('b')[0][1])
+        self.assertIn("2nd fastest of 3 regions", self.ra.getRegionFacts('a')[0][1])
+        self.assertIn("slowest of 3 regions", self.ra.getRegionFacts('c')[0][1])
+        self.assertListEqual([], self.ra.getRegionFacts('unknown'))
+
+    def test_getRegionFactsSignsFallingCases(self):
+        self.setLatestDay("temp_region_c.db", 2000, -1043)
+        self.assertIn("(-14.0%)", self.ra.getRegionFacts('c')[0][1])
+        self.assertIn("(+43.7%)", self.ra.getRegionFacts('b')[0][1])
+
+    def test_getOrdinal(self):
+        self.assertListEqual(['1st', '2nd', '3rd', '4th', '11th', '12th', '21st', '102nd'],
+            [RegionAnalyzer.getOrdinal(number) for number in [1, 2, 3, 4, 11, 12, 21, 102]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# tests resource_monitor.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys, io, contextlib
+
+sys.path.append('..')
+from resource_monitor import *
+
+class UnitTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [0.0]
+        self.monitor = ResourceMonitor(intervalSecs=60, clock=lambda: self.now[0])
+
+    def tearDown(self):
+        self.monitor.stop()
+
+    def addSample(self, secs, rssBytes, openFds, threads):
+        self.now[0] = secs
+        sample = self.monitor.takeSample()
+        sample.update({'rss_bytes' : rssBytes, 'open_fds' : openFds, 'threads' : threads})
+
+    def test_takeSampleReadsProcessResources(self):
+        sample = self.monitor.takeSample()
+        self.assertGreater(sample['rss_bytes'], 0)
+        self.assertGreater(sample['open_fds'], 0)
+        self.assertGreaterEqual(sample['threads'], 1)
+        self.assertEqual(3, len(sample['gc_collections']))
+        self.monitor.takeSample(keep=False)
+        self.assertEqual(1, len(self.monitor.history))
+
+    def test_takeSampleCountsOpenFiles(self):
+        before = self.monitor.takeSample()['open_fds']
+        files = [open(__file__) for idx in range(5)]
+        self.assertEqual(before + 5, self.monitor.takeSample()['open_fds'])
+        for f in files:
+            f.close()
+
+    def test_getLeakWarningsReportsGrowthAcrossTheHistory(self):
+        self.assertListEqual([], self.monitor.getLeakWarnings())
+        self.addSample(0, 100 * 1024 * 1024, 10, 5)
+        self.addSample(3600, 120 * 1024 * 1024, 11, 5)
+        self.assertListEqual([], self.monitor.getLeakWarnings())
+        self.addSample(7200, 200 * 1024 * 1024, 40, 30)
+        warnings = self.monitor.getLeakWarnings()
+        self.assertEqual(3, len(warnings))
+        self.assertEqual("memory grew 100 MB in 2.0 hours", warnings[0])
+
+    def test_getTopAllocatorsReportsAllocationsOnlyWhileTracing(self):
+        self.assertListEqual([], self.monitor.getTopAllocators())
+        self.monitor.startTracing()
+        try:
+            leaked = [bytearray(1024) for idx in range(1000)]
+            allocators = self.monitor.getTopAllocators(limit=3)
+            self.assertIn("test_resource_monitor.py", allocators[0]['location'])
+            self.assertGreater(allocators[0]['size_growth_bytes'], 1000 * 1024)
+        finally:
+            self.monitor.stopTracing()
+        self.assertListEqual([], self.monitor.getTopAllocators())
+
+    def test_startLogsASampleAndSchedulesTheNext(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.monitor.start()
+        self.assertTrue(output.getvalue().startswith("RESOURCES: rss="))
+        self.assertTrue(self.monitor.timer.is_alive())
+        self.monitor.stop()
+        self.assertIsNone(self.monitor.timer)
+
+if __name__ == "__main__":
+    unittest.main()
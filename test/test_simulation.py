@@ -0,0 +1,96 @@
+# tests simulation.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys
+
+sys.path.append('..')
+from simulation import *
+from web_reader import WebReader
+from email_texter import EmailTexter
+
+class UnitTestCases(unittest.TestCase):
+
+    DATASET_FILE = "../dataset_up_to_4_25.json"
+
+    RECORDS = [
+        EntryRecord('2020-04-20', 2325, 57, None, 601, 199, 87),
+        EntryRecord('2020-04-21', 2434, 109, None, 626, 202, 98),
+        EntryRecord('2020-04-22', 2491, 57, None, 643, 208, 100),
+        EntryRecord('2020-04-23', 2491, 0, None, 650, 210, 104)
+    ]
+
+    def setUp(self):
+        self.now = [1000.0]
+        self.county = SimulatedCounty(self.RECORDS, 10.0, firstDayIdx=1, clock=lambda: self.now[0])
+        self.sink = SmtpSink()
+
+    def tearDown(self):
+        self.county.stop()
+        self.sink.stop()
+
+    def test_readRecordsReturnsDatasetOldestFirst(self):
+        records = readRecords(self.DATASET_FILE)
+        self.assertEqual('2020-04-25', records[-1].date)
+        self.assertListEqual(sorted(record.date for record in records), [record.date for record in records])
+
+    def test_simulatedCountyPageIsReadByTheHtmlSourceAndAdvancesEveryStep(self):
+        self.county.start()
+        wr = WebReader(":memory:")
+        # the page only has the rows the county shows
+        self.assertEqual(self.RECORDS[1]._replace(new_cases=None).toDict(), wr.readLatestEntryFromWeb(self.county.url))
+        self.now[0] += 10.0
+        self.assertEqual('2020-04-22', wr.readLatestEntryFromWeb(self.county.url)['date'])
+        self.assertEqual(1010.0, self.county.getPublishTime(2))
+        # stays on the last day once it is reached
+        self.now[0] += 100.0
+        self.assertEqual(3, self.county.getDayIdx())
+        self.assertEqual('2020-04-23', wr.readLatestEntryFromWeb(self.county.url)['date'])
+        wr.close()
+
+    def test_smtpSinkCapturesBatchMessageSentWithoutSsl(self):
+        self.sink.start()
+        et = EmailTexter()
+        server = et.initializeEmailServer('user', 'pass', '127.0.0.1', port=self.sink.port, useSsl=False)
+        self.assertIsNotNone(server)
+        recipients = ['0010000000@vtext.com', '0010000001@tmomail.net']
+        self.assertTrue(et.sendBatchMessage(recipients, "Total Cases: 2434\n.hidden", server))
+        server.quit()
+        messages = self.sink.getMessages()
+        self.assertEqual(1, len(messages))
+        self.assertListEqual(recipients, messages[0]['recipients'])
+        self.assertEqual("Total Cases: 2434\n.hidden", messages[0]['text'])
+
+    def test_getLatencyReportMatchesTextsToTheirRegionAndDay(self):
+        publishTimes = {'2020-04-22' : 100.0, '2020-04-23' : 110.0}
+        totalCases = {'2020-04-22' : 2491, '2020-04-23' : 2491}
+        messages = [
+            {'time' : 102.0, 'recipients' : ['0010000000', '0010000001'], 'text' : "Total Cases: 2491"},
+            {'time' : 103.0, 'recipients' : ['0010000000', '0010000001'], 'text' : "Analysis"},
+            # same total on the next day belongs to the next day
+            {'time' : 111.0, 'recipients' : ['0010000000'], 'text' : "Total Cases: 2491"},
+            {'time' : 115.0, 'recipients' : ['0020000000'], 'text' : "Total Cases: 2491"}
+        ]
+        report = getLatencyReport(messages, publishTimes, totalCases, {'001' : 2, '002' : 1})
+        days = {(day['region'], day['date']): day for day in report['days']}
+        self.assertEqual(2, days[('001', '2020-04-22')]['delivered'])
+        self.assertEqual(2.0, days[('001', '2020-04-22')]['first_latency'])
+        self.assertEqual(3.0, days[('001', '2020-04-22')]['last_latency'])
+        self.assertEqual(1, days[('001', '2020-04-23')]['delivered'])
+        self.assertIsNone(days[('002', '2020-04-22')]['last_latency'])
+        self.assertEqual(5.0, days[('002', '2020-04-23')]['last_latency'])
+        self.assertEqual(4, report['summary']['delivered'])
+        self.assertEqual(6, report['summary']['expected'])
+        self.assertEqual(5.0, report['summary']['max_last_latency'])
+
+    def test_runDeliversEveryPublishedDayToEverySubscriber(self):
+        simulation = Simulation(readRecords(self.DATASET_FILE), regions=2, subscribers=2, stepSecs=1.0, days=1,
+            historyDays=3, interval=0.2, rateLimits=False, drainSecs=30.0)
+        report = simulation.run()
+        self.assertEqual(4, report['summary']['expected'])
+        self.assertEqual(4, report['summary']['delivered'])
+        self.assertGreater(report['summary']['max_last_latency'], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# tests subscriber_store.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys, os, shutil, sqlite3
+
+sys.path.append('..')
+from subscriber_store import *
+
+class UnitTestCases(unittest.TestCase):
+
+    EMPTY_DB_FILE = "empty_test_database.db"
+
+    SUBSCRIBERS = [
+        {'number' : '1234567890', 'carrier' : 'VERIZON'},
+        {'number' : '1234567891', 'carrier' : 'TMOBILE'},
+        {'number' : '1234567892', 'carrier' : 'VERIZON'},
+        {'number' : '1234567893', 'carrier' : 'VERIZON', 'digest' : 'daily'},
+        {'number' : '1234567894', 'carrier' : 'VERIZON'},
+        {'number' : '1234567895', 'carrier' : 'VERIZON'}
+    ]
+
+    def setUp(self):
+        shutil.copyfile(self.EMPTY_DB_FILE, "temp_" + self.EMPTY_DB_FILE)
+        self.assertTrue(SubscriberStore.createTable("temp_" + self.EMPTY_DB_FILE))
+        self.store = SubscriberStore("temp_" + self.EMPTY_DB_FILE, pageSize=2)
+
+    def tearDown(self):
+        os.remove("temp_" + self.EMPTY_DB_FILE)
+
+    def test_addSubscribersSkipsInvalidNumbersAndCarriers(self):
+        self.assertEqual(6, self.store.addSubscribers(self.SUBSCRIBERS + [{'number' : '123', 'carrier' : 'VERIZON'}, {'number' : '1234567899', 'carrier' : 'SPRINT'}]))
+        self.assertDictEqual({'' : {'VERIZON' : 4, 'TMOBILE' : 1}, 'daily' : {'VERIZON' : 1}}, self.store.countSubscribers())
+
+    def test_readPagesStreamsEachCarrierInPagesOfPageSize(self):
+        self.store.addSubscribers(self.SUBSCRIBERS)
+        pages = list(self.store.readPages())
+        self.assertListEqual([
+            ['1234567890@vtext.com', '1234567892@vtext.com'],
+            ['1234567894@vtext.com', '1234567895@vtext.com'],
+            ['1234567891@tmomail.net']
+        ], pages)
+        self.assertListEqual([['1234567893@vtext.com']], list(self.store.readPages('daily')))
+
+    def test_readPagesOnlyReturnsTheShardAndRegionOfTheStore(self):
+        self.store.addSubscribers(self.SUBSCRIBERS)
+        SubscriberStore("temp_" + self.EMPTY_DB_FILE, region='other').addSubscribers([{'number' : '5555555555', 'carrier' : 'VERIZON'}])
+        firstShard = SubscriberStore("temp_" + self.EMPTY_DB_FILE, shard=(0, 2))
+        secondShard = SubscriberStore("temp_" + self.EMPTY_DB_FILE, shard=(1, 2))
+        firstEmails = [email for page in firstShard.readPages() for email in page]
+        secondEmails = [email for page in secondShard.readPages() for email in page]
+        self.assertEqual(5, len(firstEmails) + len(secondEmails))
+        self.assertEqual(set(), set(firstEmails) & set(secondEmails))
+
+    def test_removeSubscriberStopsSendingUntilAddedAgain(self):
+        self.store.addSubscribers(self.SUBSCRIBERS[:1])
+        self.assertTrue(self.store.removeSubscriber('1234567890'))
+        self.assertFalse(self.store.removeSubscriber('1234567890'))
+        self.assertFalse(self.store.hasSubscribers())
+        self.assertListEqual([], list(self.store.readPages()))
+        # adding again reactivates the same row with the new digest
+        self.store.addSubscribers([dict(self.SUBSCRIBERS[0], digest='weekly')])
+        self.assertTrue(self.store.hasSubscribers('weekly'))
+        conn = sqlite3.connect("temp_" + self.EMPTY_DB_FILE)
+        self.assertEqual(1, conn.execute("SELECT COUNT(*) from SUBSCRIBERS").fetchone()[0])
+        conn.close()
+
+    def test_hasSubscribersReturnsFalseWithoutTable(self):
+        os.remove("temp_" + self.EMPTY_DB_FILE)
+        shutil.copyfile(self.EMPTY_DB_FILE, "temp_" + self.EMPTY_DB_FILE)
+        self.assertFalse(self.store.hasSubscribers())
+        self.assertListEqual([], list(self.store.readPages()))
+
+if __name__ == "__main__":
+    unittest.main()
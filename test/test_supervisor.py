@@ -0,0 +1,100 @@
+# tests supervisor.py
+# CB: Michael Kukar
+# Copyright Michael Kukar 2020.
+
+import unittest
+import sys, os, json, shutil, sqlite3, time
+
+sys.path.append('..')
+from supervisor import *
+
+# stand-in worker targets, run in the worker processes
+def crashingWorker(spec):
+    sys.exit(1)
+
+def sleepingWorker(spec):
+    time.sleep(60)
+
+def crashOrSleepWorker(spec):
+    if spec['name'].startswith('crashing'):
+        crashingWorker(spec)
+    sleepingWorker(spec)
+
+
+class UnitTestCases(unittest.TestCase):
+
+    SUPERVISOR_CONFIG = "temp_supervisor.json"
+    EMPTY_DB_FILE = "empty_test_database.db"
+
+    def setUp(self):
+        shutil.copyfile(self.EMPTY_DB_FILE, "temp_" + self.EMPTY_DB_FILE)
+        shutil.copyfile(self.EMPTY_DB_FILE, "temp_second_" + self.EMPTY_DB_FILE)
+        self.writeConfig([
+            {'name' : 'crashing', 'config' : 'valid_configuration_file.json', 'database' : "temp_" + self.EMPTY_DB_FILE},
+            {'name' : 'healthy', 'config' : 'valid_configuration_file.json', 'database' : "temp_second_" + self.EMPTY_DB_FILE, 'workers' : 2}
+        ])
+        self.supervisor = None
+
+    def tearDown(self):
+        if self.supervisor is not None:
+            self.supervisor.stop()
+        os.remove(self.SUPERVISOR_CONFIG)
+        for dbFile in ["temp_" + self.EMPTY_DB_FILE, "temp_second_" + self.EMPTY_DB_FILE]:
+            for suffix in ["", "-wal", "-shm"]:
+                if os.path.exists(dbFile + suffix):
+                    os.remove(dbFile + suffix)
+
+    def writeConfig(self, regions):
+        with open(self.SUPERVISOR_CONFIG, 'w') as f:
+            json.dump({'interval' : 5, 'regions' : regions}, f)
+
+    def test_constructorRaisesWithMissingRegionField(self):
+        self.writeConfig([{'name' : 'san_diego', 'config' : 'valid_configuration_file.json'}])
+        self.assertRaises(Exception, Supervisor, self.SUPERVISOR_CONFIG)
+
+    def test_constructorRaisesWithTwoRegionsSharingADatabase(self):
+        self.writeConfig([
+            {'name' : 'first', 'config' : 'valid_configuration_file.json', 'database' : "temp_" + self.EMPTY_DB_FILE},
+            {'name' : 'second', 'config' : 'valid_configuration_file.json', 'database' : "temp_" + self.EMPTY_DB_FILE}
+        ])
+        self.assertRaises(Exception, Supervisor, self.SUPERVISOR_CONFIG)
+
+    def test_getWorkerSpecsShardsEachRegionBySubscribers(self):
+        specs = Supervisor(self.SUPERVISOR_CONFIG).getWorkerSpecs()
+        self.assertListEqual(['crashing_0', 'healthy_0', 'healthy_1'], [spec['name'] for spec in specs])
+        self.assertListEqual([(0, 1), (0, 2), (1, 2)], [spec['shard'] for spec in specs])
+        self.assertEqual(5, specs[0]['interval'])
+
+    def test_startSwitchesDatabasesToWal(self):
+        self.supervisor = Supervisor(self.SUPERVISOR_CONFIG, target=sleepingWorker)
+        self.assertTrue(self.supervisor.start())
+        conn = sqlite3.connect("temp_" + self.EMPTY_DB_FILE)
+        self.assertEqual('wal', conn.execute("PRAGMA journal_mode").fetchone()[0])
+        conn.close()
+
+    def test_crashedWorkerIsRestartedWithoutStoppingOthers(self):
+        self.supervisor = Supervisor(self.SUPERVISOR_CONFIG, target=crashOrSleepWorker)
+        self.supervisor.RESTART_BACKOFF = 0.0
+        self.supervisor.start()
+        healthyPids = [self.supervisor.workers[name]['process'].pid for name in ['healthy_0', 'healthy_1']]
+        self.supervisor.workers['crashing_0']['process'].join(10)
+        self.assertListEqual(['crashing_0'], self.supervisor.checkWorkers())
+        self.assertEqual(1, self.supervisor.workers['crashing_0']['restarts'])
+        self.assertListEqual(healthyPids, [self.supervisor.workers[name]['process'].pid for name in ['healthy_0', 'healthy_1']])
+        self.assertTrue(self.supervisor.workers['healthy_0']['process'].is_alive())
+
+    def test_checkWorkersBacksOffOnRepeatedCrashes(self):
+        self.supervisor = Supervisor(self.SUPERVISOR_CONFIG, target=crashingWorker)
+        self.supervisor.start()
+        worker = self.supervisor.workers['crashing_0']
+        worker['process'].join(10)
+        now = time.monotonic()
+        self.assertNotIn('crashing_0', self.supervisor.checkWorkers(now))
+        self.assertIn('crashing_0', self.supervisor.checkWorkers(now + self.supervisor.RESTART_BACKOFF))
+        worker['process'].join(10)
+        self.assertNotIn('crashing_0', self.supervisor.checkWorkers(now + self.supervisor.RESTART_BACKOFF))
+        self.assertEqual(2 * self.supervisor.RESTART_BACKOFF, worker['restartAt'] - now - self.supervisor.RESTART_BACKOFF)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,10 +3,13 @@
 # Copyright Michael Kukar 2020.
 
 import unittest
-import sys, os, shutil
+import sys, os, shutil, threading, functools, csv
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 
 sys.path.append('..')
 from web_reader import *
+from entry_record import EntryRecord
+from datetime import date
 
 class WebTestCases(unittest.TestCase):
 
@@ -95,6 +98,66 @@ class WebTestCases(unittest.TestCase):
         self.assertIsNone(self.wr.readLatestEntryFromWeb(url="notarealwebsite"))
 
 
+class HttpTestCases(unittest.TestCase):
+
+    EMPTY_DB_FILE = "empty_test_database.db"
+    VALID_WEBSITE_FILENAME = "test_valid_data_website.html"
+
+    def setUp(self):
+        shutil.copyfile(self.EMPTY_DB_FILE, "temp_" + self.EMPTY_DB_FILE)
+        self.wr = WebReader("temp_" + self.EMPTY_DB_FILE)
+        # serves the test directory over local http, failing the first request of each path
+        self.failedPaths = set()
+        testCase = self
+        class FlakyHandler(SimpleHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in testCase.failedPaths:
+                    testCase.failedPaths.add(self.path)
+                    self.send_error(503)
+                    return
+                SimpleHTTPRequestHandler.do_GET(self)
+            def log_message(self, format, *args):
+                pass
+        handler = functools.partial(FlakyHandler, directory=os.path.dirname(os.path.abspath(__file__)))
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.baseUrl = "http://127.0.0.1:" + str(self.server.server_address[1]) + "/"
+        self.retryBackoff = WebReader.RETRY_BACKOFF
+        WebReader.RETRY_BACKOFF = 0.01
+
+    def tearDown(self):
+        WebReader.RETRY_BACKOFF = self.retryBackoff
+        self.server.shutdown()
+        self.server.server_close()
+        os.remove("temp_" + self.EMPTY_DB_FILE)
+
+    def test_readLatestEntryFromWebRetriesAndParsesHttpPage(self):
+        entry = self.wr.readLatestEntryFromWeb(url=self.baseUrl + self.VALID_WEBSITE_FILENAME)
+        self.assertIsNotNone(entry)
+        self.assertEqual(2943, entry['total_cases'])
+
+    def test_readPageLinesRetriesAndStreamsFeedWithoutByteOrderMark(self):
+        lines = list(self.wr.readPageLines(self.baseUrl + "test_valid_data_feed.csv"))
+        self.assertEqual(4, len(lines))
+        self.assertTrue(lines[0].startswith("Date,"))
+
+    def test_readPageLinesKeepsQuotedCsvFieldsWhole(self):
+        with open("temp_quoted_feed.csv", 'wb') as f:
+            f.write(b'Date,Note\r\n04/23/2020,"two\nlines"\r\n04/24/2020,"a\rb"\r\n')
+        try:
+            rows = list(csv.DictReader(self.wr.readPageLines(self.baseUrl + "temp_quoted_feed.csv")))
+        finally:
+            os.remove("temp_quoted_feed.csv")
+        self.assertListEqual(["two\nlines", "a\rb"], [row['Note'] for row in rows])
+
+    def test_fetchPageReusesSharedSession(self):
+        self.wr.fetchPage(self.baseUrl + self.VALID_WEBSITE_FILENAME)
+        self.assertIs(WebReader.getSession(), WebReader("another.db").getSession())
+
+    def test_fetchPageRaisesOnMissingPage(self):
+        self.assertRaises(Exception, self.wr.fetchPage, self.baseUrl + "not_a_page.html")
+
+
 class DatabaseTestCases(unittest.TestCase):
 
     EMPTY_DB_FILE = "empty_test_database.db"
@@ -159,6 +222,7 @@ class DatabaseTestCases(unittest.TestCase):
         self.wr = WebReader("temp_" + self.EMPTY_DB_FILE)
 
     def tearDown(self):
+        self.wr.close()
         # deletes our dummy database file
         os.remove("temp_" + self.EMPTY_DB_FILE)
 
@@ -169,6 +233,29 @@ class DatabaseTestCases(unittest.TestCase):
         self.assertEqual(1, len(dataset.fetchall()))
         conn.close()
     
+    def test_addEntryToDatabaseStoresDateAsDayOrdinal(self):
+        self.assertTrue(self.wr.addEntryToDatabase(self.VALID_DB_ENTRY))
+        conn = sqlite3.connect("temp_" + self.EMPTY_DB_FILE)
+        day = conn.execute("select DAY from DATA").fetchone()[0]
+        conn.close()
+        self.assertEqual(self.VALID_DB_ENTRY['date'], date.fromordinal(day).isoformat())
+
+    def test_migrateDatabaseAddsDayColumnToDatabasesWithOnlyStringDates(self):
+        conn = sqlite3.connect("temp_" + self.EMPTY_DB_FILE)
+        conn.execute("DROP INDEX DATA_DAY_INDEX")
+        conn.execute("ALTER TABLE DATA DROP COLUMN DAY")
+        conn.execute("INSERT INTO DATA (DATE, TOTAL_CASES) VALUES ('2020-04-20', 10), ('2020-03-01', 5)")
+        conn.commit()
+        conn.close()
+        self.assertTrue(WebReader.migrateDatabase("temp_" + self.EMPTY_DB_FILE))
+        # running it again leaves the database as is
+        self.assertTrue(WebReader.migrateDatabase("temp_" + self.EMPTY_DB_FILE))
+        self.assertEqual('2020-04-20', self.wr.readLatestEntryFromDatabase().date)
+        conn = sqlite3.connect("temp_" + self.EMPTY_DB_FILE)
+        days = conn.execute("select DATE, DAY from DATA ORDER BY DAY").fetchall()
+        conn.close()
+        self.assertListEqual([('2020-03-01', date(2020, 3, 1).toordinal()), ('2020-04-20', date(2020, 4, 20).toordinal())], days)
+
     def test_addEntryToDatabaseFailsWhenDatasetIsCorrupted(self):
         self.assertFalse(self.wr.addEntryToDatabase(None))
     
@@ -191,10 +278,135 @@ class DatabaseTestCases(unittest.TestCase):
         self.wr.addEntryToDatabase(self.VALID_DB_ENTRY_OLDER)
         self.wr.addEntryToDatabase(self.VALID_DB_ENTRY_OLDER_AGAIN)
         self.wr.addEntryToDatabase(self.VALID_DB_ENTRY_ANOTHER_OLDER)
-        self.assertDictEqual(self.VALID_DB_ENTRY, self.wr.readLatestEntryFromDatabase())
+        self.assertEqual(EntryRecord(**self.VALID_DB_ENTRY), self.wr.readLatestEntryFromDatabase())
     
+    def test_addEntryToDatabasePublishesEntryAddedOnlyOnSuccess(self):
+        bus = EventBus()
+        received = []
+        bus.subscribe(EventBus.ENTRY_ADDED, received.append)
+        wr = WebReader("temp_" + self.EMPTY_DB_FILE, eventBus=bus)
+        wr.addEntryToDatabase(self.VALID_DB_ENTRY)
+        wr.addEntryToDatabase(self.VALID_DB_ENTRY)
+        bus.waitUntilIdle()
+        bus.close()
+        self.assertListEqual([EntryRecord(**self.VALID_DB_ENTRY)], received)
+
+    def test_addEntriesToDatabasePublishesNewestStoredEntryOnly(self):
+        bus = EventBus()
+        received = []
+        bus.subscribe(EventBus.ENTRY_ADDED, received.append)
+        wr = WebReader("temp_" + self.EMPTY_DB_FILE, eventBus=bus)
+        stored = EntryRecord(**self.VALID_DB_ENTRY)
+        self.assertTrue(wr.addEntryToDatabase(stored))
+        self.assertEqual(stored, wr.getLatestEntry())
+        # the newest entry given is already stored, so only the older one is added and published
+        changed = EntryRecord(**dict(self.VALID_DB_ENTRY, total_cases=stored.total_cases + 1))
+        self.assertEqual(1, wr.addEntriesToDatabase([changed, EntryRecord(**self.VALID_DB_ENTRY_OLDER)]))
+        self.assertEqual(0, wr.addEntriesToDatabase([changed]))
+        bus.waitUntilIdle()
+        bus.close()
+        self.assertListEqual([stored, EntryRecord(**self.VALID_DB_ENTRY_OLDER)], received)
+        self.assertEqual(stored, wr.getLatestEntry())
+        wr.close()
+
+    def test_readUpdateTimesReturnsTimeOfEachAddedEntry(self):
+        self.assertListEqual([], self.wr.readUpdateTimes())
+        self.wr.addEntryToDatabase(self.VALID_DB_ENTRY)
+        self.wr.addEntryToDatabase(self.VALID_DB_ENTRY_OLDER)
+        self.assertEqual(2, len(self.wr.readUpdateTimes()))
+
     def test_readLatestEntryFromDatabaseReturnsNoneIfNoDataPresent(self):
         self.assertIsNone(self.wr.readLatestEntryFromDatabase())
 
+    def test_getLatestEntryOnlyChecksDataVersionAfterOwnInsert(self):
+        self.assertIsNone(self.wr.getLatestEntry())
+        self.wr.addEntryToDatabase(self.VALID_DB_ENTRY)
+        statements = []
+        self.wr.getConnection().set_trace_callback(statements.append)
+        self.assertEqual(EntryRecord(**self.VALID_DB_ENTRY), self.wr.getLatestEntry())
+        self.assertEqual(EntryRecord(**self.VALID_DB_ENTRY), self.wr.getLatestEntry())
+        self.assertListEqual(["PRAGMA data_version", "PRAGMA data_version"], statements)
+
+    def test_getLatestEntryRereadsAfterAnotherConnectionWrites(self):
+        self.wr.addEntryToDatabase(self.VALID_DB_ENTRY_OLDER)
+        self.assertEqual(EntryRecord(**self.VALID_DB_ENTRY_OLDER), self.wr.getLatestEntry())
+        otherWriter = WebReader("temp_" + self.EMPTY_DB_FILE)
+        otherWriter.addEntryToDatabase(self.VALID_DB_ENTRY)
+        otherWriter.close()
+        self.assertEqual(EntryRecord(**self.VALID_DB_ENTRY), self.wr.getLatestEntry())
+        self.assertEqual(self.VALID_DB_ENTRY['date'], self.wr.getLatestEntry().date)
+
+class ValidationTestCases(unittest.TestCase):
+
+    EMPTY_DB_FILE = "empty_test_database.db"
+
+    PREVIOUS_ENTRY = {
+        'date' : '2020-04-24',
+        'total_cases' : 2943,
+        'new_cases' : 100,
+        'new_tests' : None,
+        'hospitalizations' : 683,
+        'intensive_care' : 225,
+        'deaths' : 111
+    }
+    PLAUSIBLE_ENTRY = {
+        'date' : '2020-04-25',
+        'total_cases' : 3043,
+        'new_cases' : None,
+        'new_tests' : None,
+        'hospitalizations' : 690,
+        'intensive_care' : 225,
+        'deaths' : 114
+    }
+
+    def setUp(self):
+        shutil.copyfile(self.EMPTY_DB_FILE, "temp_" + self.EMPTY_DB_FILE)
+        self.wr = WebReader("temp_" + self.EMPTY_DB_FILE)
+
+    def tearDown(self):
+        os.remove("temp_" + self.EMPTY_DB_FILE)
+        if os.path.exists(self.wr.quarantineFilename):
+            os.remove(self.wr.quarantineFilename)
+
+    def test_validateEntryAcceptsPlausibleEntry(self):
+        self.assertListEqual([], self.wr.validateEntry(self.PLAUSIBLE_ENTRY, self.PREVIOUS_ENTRY))
+
+    def test_validateEntryRejectsUnparsedPage(self):
+        self.assertNotEqual([], self.wr.validateEntry(None, self.PREVIOUS_ENTRY))
+
+    def test_validateEntryRejectsMissingTotalCases(self):
+        entry = dict(self.PLAUSIBLE_ENTRY)
+        entry['total_cases'] = None
+        self.assertNotEqual([], self.wr.validateEntry(entry))
+
+    def test_validateEntryRejectsDecreasingTotals(self):
+        entry = dict(self.PLAUSIBLE_ENTRY)
+        entry['deaths'] = 100
+        self.assertNotEqual([], self.wr.validateEntry(entry, self.PREVIOUS_ENTRY))
+
+    def test_validateEntryRejectsImplausibleJump(self):
+        entry = dict(self.PLAUSIBLE_ENTRY)
+        entry['total_cases'] = 29430
+        self.assertNotEqual([], self.wr.validateEntry(entry, self.PREVIOUS_ENTRY))
+
+    def test_validateEntryRejectsDateOlderThanPrevious(self):
+        entry = dict(self.PLAUSIBLE_ENTRY)
+        entry['date'] = '2020-04-23'
+        self.assertNotEqual([], self.wr.validateEntry(entry, self.PREVIOUS_ENTRY))
+
+    def test_getLatestEntryFollowsAddedEntries(self):
+        self.assertIsNone(self.wr.getLatestEntry())
+        self.wr.addEntryToDatabase(self.PREVIOUS_ENTRY)
+        self.assertEqual(EntryRecord(**self.PREVIOUS_ENTRY), self.wr.getLatestEntry())
+        self.wr.addEntryToDatabase(self.PLAUSIBLE_ENTRY)
+        self.assertEqual(EntryRecord(**self.PLAUSIBLE_ENTRY), self.wr.getLatestEntry())
+
+    def test_quarantineEntryAppendsToQuarantineFile(self):
+        self.assertTrue(self.wr.quarantineEntry(None, ["page could not be parsed"]))
+        self.assertTrue(self.wr.quarantineEntry(self.PLAUSIBLE_ENTRY, ["test"]))
+        with open(self.wr.quarantineFilename) as f:
+            self.assertEqual(2, len(f.readlines()))
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
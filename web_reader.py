@@ -2,173 +2,501 @@
 # tailored for San Diego, may be adaptable to other websites
 # Copyright Michael Kukar 2020. MIT License.
 
-import sqlite3
-from collections import Mapping
-from bs4 import BeautifulSoup
-import urllib
-import requests
+import sqlite3, json, threading, random, time, codecs
 from datetime import datetime
 
+import data_cache
+from event_bus import EventBus
+from entry_record import EntryRecord
+from data_sources import HtmlPageSource
+
 class WebReader:
 
     dbFilename = "covid19.db"
 
     SD_COVID19_URL = "https://www.sandiegocounty.gov/content/sdc/hhsa/programs/phs/community_epidemiology/dc/2019-nCoV/status.html"
 
-    REQUIRED_ENTRY_FIELDS = ['date', 'total_cases', 'new_cases', 'new_tests', 'hospitalizations', 'intensive_care', 'deaths']
+    REQUIRED_ENTRY_FIELDS = list(EntryRecord._fields)
+
+    # positional, the day ordinal followed by the EntryRecord
+    ADD_ENTRY_COMMAND = "INSERT INTO DATA (DAY, DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS) VALUES (?, ?, ?, ?, ?, ?, ?, ?);"
+    ADD_ENTRY_IF_NEW_COMMAND = "INSERT OR IGNORE INTO DATA (DAY, DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS) VALUES (?, ?, ?, ?, ?, ?, ?, ?);"
+    LATEST_ENTRY_QUERY = "SELECT DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS from DATA ORDER BY DAY DESC LIMIT 1"
+    PREVIOUS_ENTRY_QUERY = "SELECT DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS from DATA WHERE DAY < ? ORDER BY DAY DESC LIMIT 1"
+    REVISE_ENTRY_COMMAND = "UPDATE DATA SET TOTAL_CASES = ?, NEW_CASES = ?, NEW_TESTS = ?, HOSPITALIZATIONS = ?, INTENSIVE_CARE = ?, DEATHS = ? WHERE DAY = ?;"
+
+    # DAY is the date as a day ordinal (date.toordinal()), so sorting, ranges and gaps are integer
+    # comparisons on an index, DATE is only kept for display
+    # NOTE - julianday('0001-01-01') is 1721425.5 and date(1, 1, 1).toordinal() is 1
+    ADD_DAY_COLUMN_COMMAND = "ALTER TABLE DATA ADD COLUMN DAY INTEGER;"
+    FILL_DAY_COLUMN_COMMAND = "UPDATE DATA SET DAY = CAST(julianday(DATE) - 1721424.5 AS INTEGER) WHERE DAY IS NULL;"
+    CREATE_DAY_INDEX_COMMAND = "CREATE UNIQUE INDEX IF NOT EXISTS DATA_DAY_INDEX ON DATA (DAY);"
+
+    # log of when each entry was stored, used to learn when the county publishes
+    # NOTE - created here as well since databases made before this table existed do not have it
+    CREATE_UPDATE_LOG_COMMAND = "CREATE TABLE IF NOT EXISTS UPDATE_LOG (ID INTEGER PRIMARY KEY, DATE CHAR(10) NOT NULL, INSERTED_AT INTEGER NOT NULL);"
+    ADD_UPDATE_LOG_COMMAND = "INSERT INTO UPDATE_LOG (DATE, INSERTED_AT) VALUES (:date, :inserted_at);"
+    UPDATE_TIMES_QUERY = "SELECT INSERTED_AT from UPDATE_LOG ORDER BY INSERTED_AT DESC LIMIT ?"
+
+    # running totals on the county page, these should never go down
+    CUMULATIVE_FIELDS = ['total_cases', 'hospitalizations', 'intensive_care', 'deaths']
+    # largest plausible daily increase of a running total is the bigger of these two bounds
+    MAX_DAILY_INCREASE = 1000
+    MAX_DAILY_INCREASE_RATIO = 0.5
+
+    QUARANTINE_EXTENSION = ".quarantine"
 
-    ADD_ENTRY_COMMAND = ("INSERT INTO DATA (DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS) VALUES ("
-        ":date, :total_cases, :new_cases, :new_tests, :hospitalizations, :intensive_care, :deaths);"
-    )
-    LATEST_ENTRY_QUERY = "SELECT DATE, TOTAL_CASES, NEW_CASES, NEW_TESTS, HOSPITALIZATIONS, INTENSIVE_CARE, DEATHS from DATA ORDER BY strftime('%Y-%m-%d', DATE) DESC"
+    # http session shared by every WebReader so connections are kept alive across polls and regions
+    session = None
+    sessionLock = threading.Lock()
+    CONNECT_TIMEOUT = 5
+    READ_TIMEOUT = 30
+    POOL_CONNECTIONS = 4
+    POOL_MAXSIZE = 8
+    # retries back off exponentially from RETRY_BACKOFF seconds with full jitter
+    MAX_RETRIES = 3
+    RETRY_BACKOFF = 1.0
+    RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+    # bytes read at a time when streaming a page
+    CHUNK_SIZE = 65536
 
 
-    def __init__(self, dbFilename):
+    # dbFilename : sqlite database file
+    # eventBus   : (optional) EventBus to publish ENTRY_ADDED on after each stored entry
+    # source     : (optional) DataSource to read entries from, defaults to the county status page
+    # archive    : (optional) PageArchive every fetched page is stored in
+    def __init__(self, dbFilename, eventBus=None, source=None, archive=None):
         # stores filename of database
         self.dbFilename = dbFilename
+        self.eventBus = eventBus
+        self.source = source if source is not None else HtmlPageSource()
+        self.archive = archive
+        # watermark of the latest stored entry, loaded on first use and then only re-read
+        # when PRAGMA data_version shows another connection wrote to the database
+        self.latestEntry = None
+        self.watermarkVersion = None
+        # kept open, as data_version only reports writes from other connections since this one's last check
+        self.conn = None
+        self.connLock = threading.RLock()
+        self.quarantineFilename = dbFilename + self.QUARANTINE_EXTENSION
+
+
+    # gets the persistent database connection, opening it on first use
+    # NOTE - callers must hold connLock, the connection is shared by the poll and api threads
+    # return : sqlite3 connection
+    def getConnection(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.dbFilename, check_same_thread=False)
+        return self.conn
+
+
+    # closes the persistent database connection
+    # return : None
+    def close(self):
+        with self.connLock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+                self.watermarkVersion = None
+
+
+    # adds the indexed DAY column to databases made before it existed
+    # NOTE - run once before any worker starts, the write lock is taken first so two processes
+    #        migrating the same file at once do not both add the column
+    # dbFilename : sqlite database file
+    # return     : true on success, false on error
+    @classmethod
+    def migrateDatabase(cls, dbFilename):
+        try:
+            conn = sqlite3.connect(dbFilename, isolation_level=None)
+        except sqlite3.Error as e:
+            print("ERROR: could not migrate " + dbFilename + ": " + str(e))
+            return False
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            columns = [row[1].lower() for row in conn.execute("PRAGMA table_info(DATA)")]
+            # nothing to migrate in a database without a DATA table yet
+            if len(columns) > 0:
+                if 'day' not in columns:
+                    conn.execute(cls.ADD_DAY_COLUMN_COMMAND)
+                    conn.execute(cls.FILL_DAY_COLUMN_COMMAND)
+                conn.execute(cls.CREATE_DAY_INDEX_COMMAND)
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print("ERROR: could not migrate " + dbFilename + ": " + str(e))
+            return False
+        finally:
+            conn.close()
+        return True
+
+
+    # gets the shared http session, creating it on first use
+    # NOTE - requests is only imported here so starting up (or --check) does not load the http stack
+    # return : requests session object
+    @classmethod
+    def getSession(cls):
+        with cls.sessionLock:
+            if cls.session is None:
+                import requests, urllib3
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=cls.POOL_CONNECTIONS, pool_maxsize=cls.POOL_MAXSIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                # only advertises encodings that can be decoded here (br needs the brotli package)
+                session.headers.update(urllib3.util.make_headers(accept_encoding=True))
+                cls.session = session
+        return cls.session
+
+
+    # requests a page through the shared session, retrying connection errors and busy servers
+    # url    : http(s) url to read from
+    # stream : (optional) leaves the body unread, to be read by the caller as it arrives
+    # return : requests response object, raises on error
+    def getResponse(self, url, stream=False):
+        import requests
+        session = self.getSession()
+        for attempt in range(self.MAX_RETRIES + 1):
+            try:
+                response = session.get(url, timeout=(self.CONNECT_TIMEOUT, self.READ_TIMEOUT), stream=stream)
+                if response.status_code not in self.RETRY_STATUS_CODES or attempt == self.MAX_RETRIES:
+                    response.raise_for_status()
+                    return response
+                response.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.MAX_RETRIES:
+                    raise
+            time.sleep(random.uniform(0, self.RETRY_BACKOFF * (2 ** attempt)))
+
+
+    # reads the raw contents of a page, storing it in the archive (if any) so it can be parsed again later
+    # NOTE - local file:// urls (test fixtures) are read directly without the http session
+    # url    : url to read from
+    # return : bytes of the (decompressed) page, raises on error
+    def fetchPage(self, url):
+        if url.startswith('file:'):
+            import urllib.request
+            body = urllib.request.urlopen(url).read()
+        else:
+            body = self.getResponse(url).content
+        if self.archive is not None:
+            self.archive.store(url, body)
+        return body
+
+
+    # reads a page a line at a time as it arrives, so large feeds are never held in memory whole
+    # NOTE - lines keep their line endings, like a file opened with newline='', so the csv module
+    #        can read quoted fields that span lines
+    # url    : url to read from
+    # return : iterator of decoded lines (a leading utf-8 byte order mark is dropped), raises on error
+    def readPageLines(self, url):
+        if url.startswith('file:'):
+            import urllib.request
+            with urllib.request.urlopen(url) as f:
+                yield from codecs.iterdecode(f, 'utf-8-sig')
+            return
+        response = self.getResponse(url, stream=True)
+        try:
+            yield from codecs.iterdecode(self.splitLines(response.iter_content(chunk_size=self.CHUNK_SIZE)), 'utf-8-sig')
+        finally:
+            response.close()
+
+
+    # splits chunks of a page into lines, only ever at a newline byte
+    # NOTE - unlike requests' iter_lines() the line endings are kept and a lone carriage return
+    #        (e.g. inside a quoted csv field) does not end a line
+    # chunks : iterator of bytes
+    # return : iterator of bytes lines, each ending in b'\n' except possibly the last
+    @staticmethod
+    def splitLines(chunks):
+        pending = b''
+        for chunk in chunks:
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line + b'\n'
+        if len(pending) > 0:
+            yield pending
 
 
     # adds the entry to the database
-    # entry  : dict entry of data to add
+    # entry  : EntryRecord, or dict entry of data to add
     # return : true if successful, false on error
     def addEntryToDatabase(self, entry):
-        # makes sure entry is a dictionary
-        if entry is None or not isinstance(entry, Mapping):
+        # makes sure entry has every field, a valid date and no negative or non-integer values
+        record, problems = EntryRecord.parse(entry)
+        if len(problems) > 0:
             return False
-        # makes sure entry contains all required fields (they can be None, but must exist)
-        for field in self.REQUIRED_ENTRY_FIELDS:
-            if field not in entry.keys():
+        # adds entry to database
+        # NOTE - written on the persistent connection so our own inserts do not move its data_version
+        with self.connLock:
+            try:
+                conn = self.getConnection()
+                with conn:
+                    conn.execute(self.ADD_ENTRY_COMMAND, (record.getDay(),) + record)
+                    conn.execute(self.CREATE_UPDATE_LOG_COMMAND)
+                    conn.execute(self.ADD_UPDATE_LOG_COMMAND, {'date' : record.date, 'inserted_at' : int(time.time())})
+            except Exception as e:
                 return False
-        # checks that fields are within bounds (not negative, etc.)
-        # all fields except DATE must be greater than 0
-        for field in self.REQUIRED_ENTRY_FIELDS:
-            if field == 'date': continue
-            if entry[field] is None: continue # none is allowed for non-date
-            # makes sure entry is able to be cast to an int type
+            # moves the watermark forward instead of re-reading it
+            if self.watermarkVersion is not None and (self.latestEntry is None or record.date >= self.latestEntry.date):
+                self.latestEntry = record
+        # invalidates anything cached from the previous state of the data
+        data_cache.bumpDataVersion(self.dbFilename)
+        if self.eventBus is not None:
+            # records are immutable, so every subscriber can share it
+            self.eventBus.publish(EventBus.ENTRY_ADDED, record)
+        return True
+
+
+    # adds many entries in one transaction, skipping invalid ones and dates already stored
+    # NOTE - imported entries are not written to the update log, only the newest stored entry is published
+    # entries : list of EntryRecords (or dict entries)
+    # return  : number of entries stored
+    def addEntriesToDatabase(self, entries):
+        records = []
+        for entry in entries:
+            record, problems = EntryRecord.parse(entry)
+            if record is not None:
+                records.append(record)
+        if len(records) == 0:
+            return 0
+        with self.connLock:
             try:
-                int(entry[field])
-            except:
+                conn = self.getConnection()
+                # one row at a time, so the rows ignored as already stored are known
+                storedRecords = []
+                with conn:
+                    cursor = conn.cursor()
+                    for record in records:
+                        cursor.execute(self.ADD_ENTRY_IF_NEW_COMMAND, (record.getDay(),) + record)
+                        if cursor.rowcount == 1:
+                            storedRecords.append(record)
+            except Exception as e:
+                print("ERROR: could not add entries: " + str(e))
+                return 0
+            if len(storedRecords) == 0:
+                return 0
+            # the newest entry given may have been ignored, its stored row is left as it was
+            newest = max(storedRecords, key=lambda record: record.date)
+            if self.watermarkVersion is not None and (self.latestEntry is None or newest.date >= self.latestEntry.date):
+                self.latestEntry = newest
+        data_cache.bumpDataVersion(self.dbFilename)
+        if self.eventBus is not None:
+            self.eventBus.publish(EventBus.ENTRY_ADDED, newest)
+        return len(storedRecords)
+
+
+    # replaces the stored entry of a day with a revision of it, e.g. a correction published after the update
+    # NOTE - published as ENTRY_ADDED like a new entry, so the update is sent (or its pending send replaced)
+    # entry  : EntryRecord, or dict entry, of a day already stored
+    # return : true if the day's row was replaced, false otherwise (or on error)
+    def reviseEntryInDatabase(self, entry):
+        record, problems = EntryRecord.parse(entry)
+        if len(problems) > 0:
+            return False
+        with self.connLock:
+            try:
+                conn = self.getConnection()
+                with conn:
+                    revised = conn.execute(self.REVISE_ENTRY_COMMAND, tuple(record[1:]) + (record.getDay(),)).rowcount
+            except Exception as e:
+                print("ERROR: could not revise entry: " + str(e))
                 return False
-            if int(entry[field]) < 0:
+            if revised == 0:
                 return False
-        # adds entry to database
-        try:
-            conn = sqlite3.connect(self.dbFilename)
-            res = conn.execute(self.ADD_ENTRY_COMMAND, entry)
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            return False
+            if self.watermarkVersion is not None and self.latestEntry is not None and self.latestEntry.date == record.date:
+                self.latestEntry = record
+        data_cache.bumpDataVersion(self.dbFilename)
+        if self.eventBus is not None:
+            self.eventBus.publish(EventBus.ENTRY_ADDED, record)
         return True
 
 
+    # reads the latest stored entry before a day, e.g. to validate a revision of the day against
+    # day    : day ordinal
+    # return : EntryRecord, or None if there is none (or on error)
+    def readEntryBefore(self, day):
+        with self.connLock:
+            try:
+                cursor = self.getConnection().cursor()
+                cursor.row_factory = EntryRecord.fromRow
+                return cursor.execute(self.PREVIOUS_ENTRY_QUERY, (day,)).fetchone()
+            except Exception as e:
+                return None
+
+
     # reads the most recent entry from the database
-    # return : dictionary of latest db entry
+    # return : EntryRecord of latest db entry
     def readLatestEntryFromDatabase(self):
-        res = None
+        with self.connLock:
+            try:
+                cursor = self.getConnection().cursor()
+                cursor.row_factory = EntryRecord.fromRow
+                self.latestEntry = cursor.execute(self.LATEST_ENTRY_QUERY).fetchone()
+            except Exception as e:
+                # retried on the next refresh
+                self.watermarkVersion = None
+                return None
+            return self.latestEntry
+
+
+    # reads the times the most recent entries were stored
+    # limit  : (optional) maximum number of times to read
+    # return : list of unix timestamps, newest first (empty if none are logged)
+    def readUpdateTimes(self, limit=30):
         try:
             conn = sqlite3.connect(self.dbFilename)
-            c = conn.cursor()
-            c.execute(self.LATEST_ENTRY_QUERY)
-            res = c.fetchone()
+            times = [row[0] for row in conn.execute(self.UPDATE_TIMES_QUERY, (limit,))]
             conn.close()
         except Exception as e:
+            return []
+        return times
+
+
+    # brings the watermark up to date, only reading the latest entry when another connection
+    # (e.g. another process or WebReader) has written since the last check
+    # return : true on success, false if the database could not be read
+    def refreshWatermark(self):
+        with self.connLock:
+            try:
+                dataVersion = self.getConnection().execute("PRAGMA data_version").fetchone()[0]
+            except Exception as e:
+                return False
+            if dataVersion != self.watermarkVersion:
+                self.watermarkVersion = dataVersion
+                self.readLatestEntryFromDatabase()
+        return True
+
+
+    # gets the latest stored entry from the watermark
+    # return : EntryRecord of latest db entry, or None if there is none
+    def getLatestEntry(self):
+        if not self.refreshWatermark():
             return None
-        if res is None:
-            return None
-        # now maps res to a dict
-        resDict = {}
-        for idx, field in enumerate(self.REQUIRED_ENTRY_FIELDS):
-            resDict[field] = res[idx]
-        return resDict
+        return self.latestEntry
+
+
+    # checks a parsed entry for plausibility against the previous stored entry
+    # NOTE - does no database or network calls, so it is cheap enough to run on every poll
+    # entry         : EntryRecord, or dict entry parsed from the web
+    # previousEntry : (optional) EntryRecord (or dict) of the latest stored entry to compare against
+    # return        : list of problem strings, empty if the entry looks valid
+    def validateEntry(self, entry, previousEntry=None):
+        record, problems = EntryRecord.parse(entry)
+        if record is not None and record.total_cases is None:
+            problems.append("missing total cases")
+        if len(problems) > 0 or previousEntry is None:
+            return problems
+        previousEntry = EntryRecord.parse(previousEntry)[0]
+
+        # compares against the previous entry, iso dates compare in date order
+        if record.date < previousEntry.date:
+            problems.append("date " + record.date + " is older than latest stored date " + previousEntry.date)
+            return problems
+        days = max(record.getDay() - previousEntry.getDay(), 1)
+        for field in self.CUMULATIVE_FIELDS:
+            value = getattr(record, field)
+            previousValue = getattr(previousEntry, field)
+            if value is None or previousValue is None: continue
+            increase = value - previousValue
+            maxIncrease = days * max(self.MAX_DAILY_INCREASE, self.MAX_DAILY_INCREASE_RATIO * previousValue)
+            if increase < 0:
+                problems.append(field + " went down from " + str(previousValue) + " to " + str(value))
+            elif increase > maxIncrease:
+                problems.append(field + " jumped from " + str(previousValue) + " to " + str(value))
+        return problems
+
+
+    # stores a rejected entry in the quarantine file instead of the database
+    # entry    : dict entry (or EntryRecord) that failed validation (may be None)
+    # problems : list of problem strings from validateEntry()
+    # return   : true on success, false on error
+    def quarantineEntry(self, entry, problems):
+        record = {
+            'time' : datetime.now().isoformat(timespec='seconds'),
+            'entry' : entry.toDict() if isinstance(entry, EntryRecord) else entry,
+            'problems' : problems
+        }
+        try:
+            with open(self.quarantineFilename, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except Exception as e:
+            return False
+        return True
+
+
+    # gets the url to read, falling back to the source's url and then SD_COVID19_URL
+    # url    : (optional) url to read from
+    # return : url string
+    def getSourceUrl(self, url=None):
+        if url is not None:
+            return url
+        if self.source.url is not None:
+            return self.source.url
+        return self.SD_COVID19_URL
 
 
     # checks if new data is available to be read
-    # url    : (optional) url to read from. Default is SD_COVID19_URL
+    # url    : (optional) url to read from. Default is the source's url or SD_COVID19_URL
     # return : true if current website date is newer than newest db entry, false otherwise
     def isNewDataAvailable(self, url=None):
-        if url is None:
-            url = self.SD_COVID19_URL
-        # gets latest db entry and extracts date
-        try:
-            dbDate = self.readLatestEntryFromDatabase()
-            if dbDate is None:
-                # no database entry, so we return True (anything is newer)
-                return True
-            dbDate = datetime.strptime(dbDate['date'], '%Y-%m-%d')
-        except:
+        url = self.getSourceUrl(url)
+        # gets latest db date from the watermark
+        if not self.refreshWatermark():
             return False
+        if self.latestEntry is None:
+            # no database entry, so we return True (anything is newer)
+            return True
 
-        webDate = None
-        # reads latest update field from the website and extracts date
+        # reads the date of the latest entry the source has
         try:
-            source = urllib.request.urlopen(url).read()
-            bs = BeautifulSoup(source, "lxml")
-            # location of date is in a string located at
-            # table -> tr -> td -> "table updated X, with date through Y"
-            table = bs.find("table")
-            # gets first td in the first tr
-            table_rows = table.tbody.find_all("tr")
-            td = table_rows[0].find_all("td")[0]
-            # extract the date after "with data through"
-            rawDateStr = str(td).split("with data through ")[1]
-            rawDateStr = rawDateStr.split(".</i>")[0]
-            webDate = datetime.strptime(rawDateStr, '%B %d, %Y')
+            webDate = self.source.readLatestDate(self, url)
         except:
             return False
 
-        # if date is newer, return True, else false
-        if webDate > dbDate:
+        # if date is newer, return True, else false (iso dates compare in date order)
+        if webDate > self.latestEntry.date:
             return True
         else:
             return False
 
 
-    # reads the current state of the website
-    # url    : (optional) url to read from. Default is SD_COVID19_URL
+    # reads the current state of the website (or feed)
+    # url    : (optional) url to read from. Default is the source's url or SD_COVID19_URL
     # return : dictionary of website data, or None on error
     def readLatestEntryFromWeb(self, url=None):
-        if url is None:
-            url = self.SD_COVID19_URL
-        
-        dataDict = {
-            'date' : None,
-            'total_cases' : None,
-            'new_cases' : None,
-            'new_tests' : None,
-            'hospitalizations' : None,
-            'intensive_care' : None,
-            'deaths' : None
-        }
-
         try:
-            # opens website
-            source = urllib.request.urlopen(url).read()
-            bs = BeautifulSoup(source, "lxml")
-
-            # reads the table data
-            table = bs.find("table")
-            # gets first td in the first tr
-            table_rows = table.tbody.find_all("tr")
-            td = table_rows[0].find_all("td")[0]
-            # extract the date after "with data through"
-            rawDateStr = str(td).split("with data through ")[1]
-            rawDateStr = rawDateStr.split(".</i>")[0]
-            dataDict['date'] = datetime.strptime(rawDateStr, '%B %d, %Y').strftime('%Y-%m-%d')
-            # extracts the rest of the data available
-            for row in table_rows:
-                tds = row.find_all("td")
-                if "Total Positives" in tds[0].text:
-                    dataDict['total_cases'] = int(tds[1].text.replace(',',''))
-                elif "Hospitalizations" in tds[0].text:
-                    dataDict['hospitalizations'] = int(tds[1].text.replace(',',''))
-                elif "Intensive Care" in tds[0].text:
-                    dataDict['intensive_care'] = int(tds[1].text.replace(',',''))
-                elif "Deaths" in tds[0].text:
-                    dataDict['deaths'] = int(tds[1].text.replace(',',''))
+            return self.source.readLatestEntry(self, self.getSourceUrl(url))
         except:
             return None
-            
-        # returns as a dictionary
-        return dataDict
+
+
+    # stores every entry of the source newer than the latest stored one, e.g. days missed while stopped
+    # NOTE - implausible entries are quarantined instead of stored, see validateEntry()
+    # url    : (optional) url to read from. Default is the source's url or SD_COVID19_URL
+    # return : number of entries stored, or None if the source could not be read
+    def backfillFromSource(self, url=None):
+        latestEntry = self.getLatestEntry()
+        try:
+            records = self.source.readEntries(self, self.getSourceUrl(url), sinceDate=latestEntry.date if latestEntry is not None else None)
+        except Exception as e:
+            print("ERROR: could not read source: " + str(e))
+            return None
+        # checked in date order against the last accepted entry, like entries read one poll at a time
+        acceptedRecords = []
+        previousEntry = latestEntry
+        for record in records:
+            problems = self.validateEntry(record, previousEntry)
+            if len(problems) > 0:
+                print("rejected entry of " + record.date + ", quarantined to " + self.quarantineFilename + ": " + "; ".join(problems))
+                self.quarantineEntry(record, problems)
+                continue
+            # sources without new cases get the change from the previous day, as the updater and --reparse store them
+            if record.new_cases is None and (previousEntry is None or previousEntry.total_cases is not None):
+                record = record._replace(new_cases=record.total_cases - (previousEntry.total_cases if previousEntry is not None else 0))
+            acceptedRecords.append(record)
+            previousEntry = record
+        return self.addEntriesToDatabase(acceptedRecords)
 